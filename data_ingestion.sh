@@ -60,9 +60,37 @@ curl -fsS -X POST http://localhost:${INGESTION_HOST_PORT}/ingest \
   -d "{\"csv_path\":\"${CSV_PATH}\",\"out_parquet\":\"${OUT_PARQUET}\"}"
 
 echo ">>> Indexing embeddings with LaBSE (include_langs=${INCLUDE_LANGS})"
-curl -fsS -X POST http://localhost:${EMBEDDING_HOST_PORT}/index \
+# Submitted as a background job: survives client timeouts, and an interrupted
+# run resumes from its last checkpoint when the embedding service restarts.
+JOB_ID=$(curl -fsS -X POST http://localhost:${EMBEDDING_HOST_PORT}/jobs/index \
   -H "Content-Type: application/json" \
-  -d "{\"parquet_path\":\"${OUT_PARQUET}\",\"include_langs\":${INCLUDE_LANGS}}"
+  -d "{\"parquet_path\":\"${OUT_PARQUET}\",\"include_langs\":${INCLUDE_LANGS}}" \
+  | sed -n 's/.*"job_id":"\([^"]*\)".*/\1/p')
+if [ -z "$JOB_ID" ]; then
+  echo "❌ /jobs/index returned no job_id" >&2
+  exit 1
+fi
+echo "    job ${JOB_ID} (cancel: curl -X POST http://localhost:${EMBEDDING_HOST_PORT}/jobs/${JOB_ID}/cancel)"
+
+INDEX_TIMEOUT=${INDEX_TIMEOUT:-21600}  # seconds; the job keeps running (and can be resumed) after the script gives up
+waited=0
+while true; do
+  JOB=$(curl -fsS http://localhost:${EMBEDDING_HOST_PORT}/jobs/${JOB_ID})
+  STATUS=$(echo "$JOB" | sed -n 's/.*"status":"\([^"]*\)".*/\1/p')
+  DONE=$(echo "$JOB" | sed -n 's/.*"next_row":\([0-9]*\).*/\1/p')
+  TOTAL=$(echo "$JOB" | sed -n 's/.*"rows_total":\([0-9]*\).*/\1/p')
+  echo "    ${STATUS}: ${DONE:-0}/${TOTAL:-?} rows"
+  case "$STATUS" in
+    succeeded) echo "$JOB"; break ;;
+    failed|cancelled) echo "$JOB" >&2; exit 1 ;;
+  esac
+  if [ "$waited" -ge "$INDEX_TIMEOUT" ]; then
+    echo "❌ Timeout: job ${JOB_ID} still ${STATUS:-unknown} after ${INDEX_TIMEOUT}s" >&2
+    exit 1
+  fi
+  sleep 5
+  waited=$((waited+5))
+done
 
 
 
@@ -0,0 +1,95 @@
+# services/common/batcher.py
+import threading
+import queue
+import time
+from concurrent.futures import Future
+import numpy as np
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-text encode requests into one model call.
+
+    Callers block on `encode(text)`; a background thread drains the queue,
+    waiting at most `max_wait_ms` for up to `max_batch` texts, and runs them
+    through `encode_fn(list[str]) -> np.ndarray` in one forward pass.
+    """
+
+    def __init__(self, encode_fn, max_batch: int = 32, max_wait_ms: float = 5.0, name: str = "embed-batcher"):
+        self.encode_fn = encode_fn
+        self.name = name
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue[tuple[str, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        # stats
+        self._batches = 0
+        self._items = 0
+        self._max_seen = 0
+        self._last_size = 0
+        self._sizes: dict[int, int] = {}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        fut: Future = Future()
+        self._ensure_started()
+        self._queue.put((text, fut))
+        return fut
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]  # block until there is work
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [t for t, _ in batch]
+            try:
+                vecs = self.encode_fn(texts)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for i, (_, fut) in enumerate(batch):
+                fut.set_result(vecs[i])
+            self._record(len(batch))
+
+    def _record(self, size: int):
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            self._last_size = size
+            self._max_seen = max(self._max_seen, size)
+            self._sizes[size] = self._sizes.get(size, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 3) if self._batches else 0.0,
+                "max_batch_size_seen": self._max_seen,
+                "last_batch_size": self._last_size,
+                "batch_size_histogram": dict(sorted(self._sizes.items())),
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
@@ -0,0 +1,27 @@
+# services/common/index_version.py
+"""
+Index version shared through a small JSON file on the data volume. Indexers (/index,
+load_shards, snapshot restore, the ETL's BM25 build) bump it after changing what search
+sees; the search service polls it and drops cached results from older versions.
+Versions are nanosecond timestamps, so they stay unique even after data/out/ is wiped.
+"""
+import os
+import json
+import time
+
+DEFAULT_PATH = "data/out/index_version.json"
+
+def read_index_version(path: str = DEFAULT_PATH) -> int:
+    try:
+        with open(path) as f:
+            return int(json.load(f)["version"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+def bump_index_version(path: str = DEFAULT_PATH, source: str = "") -> int:
+    version = max(read_index_version(path) + 1, time.time_ns())
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"version": version, "updated_at": time.time(), "source": source}, f)
+    os.replace(path + ".tmp", path)
+    return version
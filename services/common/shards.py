@@ -0,0 +1,94 @@
+# services/common/shards.py
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+
+def shard_name(i: int) -> str:
+    return f"shard-{i:05d}"
+
+class ShardSet:
+    """
+    A directory of reusable vector shards:
+
+      meta.json            model / backend / dim / dtype / windowing settings + list of finished shards
+      shard-NNNNN.npy      (rows, dim) float32 or float16 vectors, opened memory-mapped
+      shard-NNNNN.parquet  one sidecar row per vector: doc_id, window, windows, hash + payload columns
+
+    A shard is listed in meta.json only after both of its files were written (atomically),
+    so an interrupted writer leaves a consistent set that can be resumed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta: dict | None = None
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+
+    @classmethod
+    def create(cls, path: str, meta: dict) -> "ShardSet":
+        """Start an empty set at `path` (removing any previous shards there)."""
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.startswith("shard-") or name == "meta.json":
+                os.remove(os.path.join(path, name))
+        shards = cls(path)
+        shards.meta = {"format": FORMAT_VERSION, **meta, "shards": [], "created_at": time.time()}
+        shards._save_meta()
+        return shards
+
+    def _save_meta(self):
+        target = os.path.join(self.path, "meta.json")
+        with open(target + ".tmp", "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(target + ".tmp", target)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self.meta["dtype"])
+
+    def shards(self) -> list[dict]:
+        return list((self.meta or {}).get("shards", []))
+
+    def write_shard(self, index: int, vectors: np.ndarray, sidecar: pd.DataFrame):
+        if len(vectors) != len(sidecar):
+            raise ValueError(f"shard {index}: {len(vectors)} vectors but {len(sidecar)} sidecar rows")
+        name = shard_name(index)
+        base = os.path.join(self.path, name)
+        arr = np.lib.format.open_memmap(base + ".npy.tmp", mode="w+", dtype=self.dtype,
+                                        shape=(len(vectors), self.meta["dim"]))
+        arr[:] = vectors
+        arr.flush()
+        del arr
+        os.replace(base + ".npy.tmp", base + ".npy")
+        sidecar.to_parquet(base + ".parquet.tmp", index=False)
+        os.replace(base + ".parquet.tmp", base + ".parquet")
+        first = sidecar["window"].fillna(0).eq(0).sum() if "window" in sidecar.columns else len(sidecar)
+        self.meta["shards"].append({"name": name, "rows": int(len(sidecar)), "source_rows": int(first)})
+        self.meta["updated_at"] = time.time()
+        self._save_meta()
+
+    def update_meta(self, **fields):
+        self.meta.update(fields)
+        self._save_meta()
+
+    def read(self, entry: dict) -> tuple[np.ndarray, pd.DataFrame]:
+        """(memory-mapped vectors, sidecar) of one shard."""
+        base = os.path.join(self.path, entry["name"])
+        return np.load(base + ".npy", mmap_mode="r"), pd.read_parquet(base + ".parquet")
+
+    def stats(self) -> dict:
+        shards = self.shards()
+        return {
+            "path": self.path,
+            "shards": len(shards),
+            "vectors": sum(s["rows"] for s in shards),
+            "source_rows": sum(s["source_rows"] for s in shards),
+            "model_id": (self.meta or {}).get("model_id"),
+            "dtype": (self.meta or {}).get("dtype"),
+        }
@@ -0,0 +1,12 @@
+# services/common/text.py
+import re
+import unicodedata
+
+_TOKEN = re.compile(r"\w+")
+
+def fold_tokens(text: str | None) -> list[str]:
+    """Lowercased, diacritic-free word tokens; queries and documents go through the same folding."""
+    if not text:
+        return []
+    nfkd = unicodedata.normalize("NFKD", text)
+    return _TOKEN.findall("".join(ch for ch in nfkd if not unicodedata.combining(ch)).casefold())
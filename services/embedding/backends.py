@@ -0,0 +1,173 @@
+# services/embedding/backends.py
+import os
+import re
+import glob
+import numpy as np
+import pandas as pd
+from sentence_transformers import SentenceTransformer
+
+# EMBED_BACKEND values:
+#   torch      PyTorch fp32 (reference)
+#   int8       PyTorch with dynamic int8 quantization of the Linear layers (CPU)
+#   onnx       exported ONNX graph run by ONNX Runtime (CPU)
+#   onnx-int8  the same graph with ONNX Runtime dynamic int8 weights
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+
+# Used when the bundled CSVs are not available (e.g. a slim image)
+_FALLBACK_TEXTS = [
+    "Evaṃ me sutaṃ.",
+    "Thus have I heard.",
+    "Namo tassa bhagavato arahato sammāsambuddhassa",
+    "Homage to the Blessed One, the Arahant, the Perfectly Self-Enlightened One.",
+    "Sabbe sattā bhavantu sukhitattā.",
+    "May all beings be happy.",
+]
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name)
+
+class OnnxEncoder:
+    """
+    ONNX Runtime stand-in for SentenceTransformer.encode: same tokenizer and max length,
+    the whole ST pipeline (transformer + pooling + dense) exported as one graph.
+    Inputs are sorted by length before batching, like ST does.
+    """
+
+    def __init__(self, st_model: SentenceTransformer, path: str, threads: int | None = None):
+        import onnxruntime as ort
+        self.tokenizer = st_model.tokenizer
+        self.max_seq_length = st_model.max_seq_length
+        self.dim = st_model.get_sentence_embedding_dimension()
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, convert_to_numpy=True,
+               show_progress_bar=False, **kw):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for s in range(0, len(texts), batch_size):
+            idx = order[s:s + batch_size]
+            enc = self.tokenizer([texts[i] for i in idx], padding=True, truncation=True,
+                                 max_length=self.max_seq_length, return_tensors="np")
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+            out[idx] = self.session.run(None, feeds)[0]
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out[0] if single else out
+
+def export_onnx(st_model: SentenceTransformer, path: str, quantize: bool = False):
+    """Export the full ST pipeline to `path` (atomically); with `quantize`, int8 weights."""
+    import torch
+
+    class _Graph(torch.nn.Module):
+        def __init__(self, m):
+            super().__init__()
+            self.m = m
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            feats = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+            return self.m(feats)["sentence_embedding"]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    enc = st_model.tokenizer(["export sample"], padding=True, return_tensors="pt")
+    ids = enc["input_ids"]
+    args = (ids, enc["attention_mask"], enc.get("token_type_ids", torch.zeros_like(ids)))
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = path if not quantize else path.replace(".onnx", ".fp32.onnx")
+    tmp = fp32_path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            _Graph(st_model.cpu()).eval(), args, tmp,
+            input_names=names, output_names=["sentence_embedding"],
+            dynamic_axes={**{n: {0: "batch", 1: "seq"} for n in names}, "sentence_embedding": {0: "batch"}},
+            opset_version=14,
+        )
+    os.replace(tmp, fp32_path)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, path + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(path + ".tmp", path)
+
+def load_encoder(model_name: str, backend: str = "torch", device: str | None = None,
+                 onnx_dir: str | None = None, threads: int | None = None):
+    """
+    Return an object with SentenceTransformer's `encode()` for the chosen backend.
+    ONNX graphs are exported once to `onnx_dir/<model>/` and reused on later starts.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND {backend!r}; expected one of {BACKENDS}")
+    if backend == "torch":
+        return SentenceTransformer(model_name, device=device)
+
+    model = SentenceTransformer(model_name, device="cpu")  # int8 / ORT paths are CPU-only
+    if backend == "int8":
+        import torch
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    onnx_dir = onnx_dir or os.getenv("EMBED_ONNX_DIR", "data/cache/onnx")
+    path = os.path.join(onnx_dir, _slug(model_name), f"{backend}.onnx")
+    if not os.path.exists(path):
+        print(f"[backend] exporting {model_name} to {path} ...")
+        export_onnx(model, path, quantize=(backend == "onnx-int8"))
+    return OnnxEncoder(model, path, threads=threads)
+
+def parity_texts(data_dir: str, limit: int) -> list[str]:
+    """Up to `limit` pali + translation paragraphs from the bundled CSVs."""
+    texts = []
+    if limit <= 0:
+        return []
+    for p in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        df = pd.read_csv(p)
+        for col in ("pali_paragraph", "translation_paragraph"):
+            if col in df.columns:
+                texts += [t for t in df[col].dropna().astype(str).tolist() if t.strip()]
+    if not texts:
+        return list(_FALLBACK_TEXTS)
+    step = max(1, len(texts) // max(1, limit))  # spread over the files, not just the first rows
+    return texts[::step][:limit]
+
+def check_parity(encoder, model_name: str, backend: str, texts: list[str],
+                 threshold: float, reference=None) -> dict:
+    """
+    Compare `encoder` with the fp32 model on `texts`. Raises RuntimeError if the
+    mean cosine agreement is below `threshold`, so a bad export/quantization never serves.
+    """
+    if backend == "torch":
+        return {"backend": backend, "checked": False, "reason": "reference backend"}
+    if not texts:
+        return {"backend": backend, "checked": False, "reason": "EMBED_PARITY_SAMPLES=0"}
+    reference = reference or SentenceTransformer(model_name, device="cpu")
+    ref = reference.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    got = encoder.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    cos = np.sum(np.asarray(ref, np.float32) * np.asarray(got, np.float32), axis=1)
+    report = {
+        "backend": backend,
+        "checked": True,
+        "texts": len(texts),
+        "threshold": threshold,
+        "mean_cosine": round(float(cos.mean()), 5),
+        "min_cosine": round(float(cos.min()), 5),
+        "p05_cosine": round(float(np.percentile(cos, 5)), 5),
+    }
+    print(f"[backend] parity vs fp32: {report}")
+    if report["mean_cosine"] < threshold:
+        raise RuntimeError(
+            f"EMBED_BACKEND={backend} disagrees with fp32 (mean cosine {report['mean_cosine']} < {threshold}); refusing to serve"
+        )
+    return report
+
+def load_checked_encoder(model_name: str, backend: str, device: str | None = None, threads: int | None = None):
+    """load_encoder + check_parity with the EMBED_PARITY_* settings; returns (encoder, report)."""
+    encoder = load_encoder(model_name, backend, device=device, threads=threads)
+    texts = parity_texts(os.getenv("EMBED_PARITY_DATA", "data"), int(os.getenv("EMBED_PARITY_SAMPLES", "200")))
+    report = check_parity(encoder, model_name, backend, texts, float(os.getenv("EMBED_PARITY_MIN_COSINE", "0.98")))
+    return encoder, report
@@ -0,0 +1,58 @@
+# services/embedding/bench_encode_pool.py
+"""
+Rows/sec of bulk encoding with EncodePool from 1 to N processes.
+
+    python -m services.embedding.bench_encode_pool --max-processes 8 --rows 4000
+
+Each process gets `--threads` torch threads (default 1, so N processes = N cores).
+Texts come from the bundled CSVs (pali + translation, like multilingual_concat).
+Model loading happens in warmup and is not timed. Every run is also checked
+against the 1-process vectors, so a sharding/ordering bug shows up as max_abs_diff > 0.
+"""
+import os
+import glob
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from services.embedding.encode_pool import EncodePool
+
+def load_texts(data_dir: str, rows: int) -> list[str]:
+    frames = [pd.read_csv(p) for p in sorted(glob.glob(os.path.join(data_dir, "*.csv")))]
+    df = pd.concat(frames, ignore_index=True)
+    texts = (df["pali_paragraph"].fillna("") + " \n " + df["translation_paragraph"].fillna("")).tolist()
+    # repeat the corpus if more rows are asked for than the CSVs hold
+    return (texts * (rows // max(1, len(texts)) + 1))[:rows]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=os.getenv("EMBED_MODEL", "sentence-transformers/LaBSE"))
+    ap.add_argument("--data-dir", default="data")
+    ap.add_argument("--rows", type=int, default=2000)
+    ap.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--backend", default=os.getenv("EMBED_BACKEND", "torch"))
+    ap.add_argument("--threads", type=int, default=1, help="torch threads per process")
+    ap.add_argument("--token-budget", type=int, default=8192, help="padded tokens per forward pass")
+    ap.add_argument("--shard-size", type=int, default=256)
+    args = ap.parse_args()
+
+    texts = load_texts(args.data_dir, args.rows)
+    print(f"{len(texts)} rows, model={args.model}, backend={args.backend}, threads/process={args.threads}")
+    print(f"{'processes':>9} {'cores':>5} {'seconds':>8} {'rows/sec':>9} {'speedup':>7} {'max_abs_diff':>12}")
+
+    base_rate = base_vecs = None
+    for n in range(1, args.max_processes + 1):
+        with EncodePool(args.model, n, threads=args.threads,
+                        token_budget=args.token_budget, shard_size=args.shard_size, backend=args.backend) as pool:
+            pool.warmup()
+            t0 = time.perf_counter()
+            vecs = pool.encode(texts)
+            dt = time.perf_counter() - t0
+        rate = len(texts) / dt
+        if base_rate is None:
+            base_rate, base_vecs = rate, vecs
+        diff = float(np.abs(vecs - base_vecs).max())
+        print(f"{n:>9} {n * args.threads:>5} {dt:>8.2f} {rate:>9.1f} {rate / base_rate:>6.2f}x {diff:>12.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# services/embedding/bucketing.py
+import time
+import threading
+import numpy as np
+
+def token_lengths(tokenizer, texts: list[str], max_length: int) -> np.ndarray:
+    """Tokenized length of each text (special tokens included, truncated like the model does)."""
+    ids = tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=max_length)["input_ids"]
+    return np.fromiter((len(x) for x in ids), dtype=np.int64, count=len(texts))
+
+def plan_batches(lengths: np.ndarray, token_budget: int, max_batch: int) -> list[np.ndarray]:
+    """
+    Sort by token length (longest first) and cut greedily so each batch's padded size,
+    len(batch) * longest member, stays within `token_budget`: one-line headings go in
+    large batches, long commentary paragraphs in small ones.
+    """
+    order = np.argsort(-lengths, kind="stable")
+    batches, start = [], 0
+    while start < len(order):
+        longest = max(1, int(lengths[order[start]]))  # sorted, so the first one is the longest
+        size = int(min(max_batch, max(1, token_budget // longest), len(order) - start))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+def padding_ratio(lengths: np.ndarray, batches: list[np.ndarray]) -> float:
+    padded = sum(len(b) * int(lengths[b].max()) for b in batches if len(b))
+    return 1.0 - float(lengths.sum()) / padded if padded else 0.0
+
+def encode_bucketed(model, texts: list[str], token_budget: int = 8192, max_batch: int = 256,
+                    baseline_batch: int = 32) -> tuple[np.ndarray, dict]:
+    """
+    Encode `texts` in length buckets sized by `token_budget` and return the normalized
+    float32 vectors in input order, plus per-call stats: padding_ratio (padded tokens
+    that carry no text), baseline_padding_ratio (the same texts in input order with
+    fixed batches of `baseline_batch`), and tokens_per_sec.
+    """
+    dim = model.get_sentence_embedding_dimension()
+    if not texts:
+        return np.empty((0, dim), dtype=np.float32), {"texts": 0}
+    t0 = time.perf_counter()
+    lengths = token_lengths(model.tokenizer, texts, model.max_seq_length)
+    batches = plan_batches(lengths, token_budget, max_batch)
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    for b in batches:
+        out[b] = model.encode([texts[i] for i in b], batch_size=len(b), normalize_embeddings=True,
+                              convert_to_numpy=True, show_progress_bar=False)
+    seconds = time.perf_counter() - t0
+    file_order = [np.arange(i, min(i + baseline_batch, len(texts))) for i in range(0, len(texts), baseline_batch)]
+    tokens = int(lengths.sum())
+    return out, {
+        "texts": len(texts),
+        "batches": len(batches),
+        "tokens": tokens,
+        "padded_tokens": int(sum(len(b) * int(lengths[b].max()) for b in batches)),
+        "padding_ratio": round(padding_ratio(lengths, batches), 4),
+        "baseline_padding_ratio": round(padding_ratio(lengths, file_order), 4),
+        "seconds": round(seconds, 4),
+        "tokens_per_sec": round(tokens / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+class EncodeStats:
+    """Running totals of encode_bucketed stats (thread-safe), for /stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {"calls": 0, "texts": 0, "batches": 0, "tokens": 0, "padded_tokens": 0, "seconds": 0.0}
+        self.last: dict | None = None
+
+    def add(self, stats: dict):
+        if not stats.get("texts"):
+            return
+        with self._lock:
+            self.totals["calls"] += 1
+            for k in ("texts", "batches", "tokens", "padded_tokens", "seconds"):
+                self.totals[k] += stats[k]
+            self.last = stats
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            t = dict(self.totals)
+            last = self.last
+        t["seconds"] = round(t["seconds"], 3)
+        t["padding_ratio"] = round(1.0 - t["tokens"] / t["padded_tokens"], 4) if t["padded_tokens"] else 0.0
+        t["tokens_per_sec"] = round(t["tokens"] / t["seconds"], 1) if t["seconds"] else 0.0
+        t["last"] = last
+        return t
@@ -0,0 +1,111 @@
+# services/embedding/embed_shards.py
+"""
+Offline bulk stage: normalized parquet -> vector shards (no Weaviate involved).
+
+    python -m services.embedding.embed_shards --parquet data/out/normalized.parquet \\
+        --out data/out/shards --shard-rows 50000 --dtype float16 --processes 4
+
+Encodes `multilingual_concat` exactly like /index (same backend, windowing and bucketing
+settings, read from the same EMBED_* env vars) and writes one shard per `--shard-rows`
+source rows. Re-running with the same settings resumes after the last finished shard;
+different settings need `--overwrite`. Load the result with `load_shards`.
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from services.embedding.backends import load_checked_encoder
+from services.embedding.bucketing import encode_bucketed
+from services.embedding.encode_pool import EncodePool
+from services.embedding.manifest import index_key, text_hash
+from services.embedding.pipeline import PAYLOAD_COLUMNS, iter_parquet_chunks
+from services.common.shards import ShardSet
+from services.embedding.uploader import build_payloads
+from services.embedding.windows import token_windows
+
+SIDECAR_COLUMNS = ["doc_id", "window", "windows", "hash"] + [c for c in PAYLOAD_COLUMNS if c != "doc_id"]
+
+def embed_to_shards(args) -> dict:
+    # the in-process encoder also provides the tokenizer for windowing and runs the parity check
+    encoder, _ = load_checked_encoder(args.model, args.backend)
+    windowing = os.getenv("EMBED_WINDOWING", "1") == "1"
+    window_tokens = int(os.getenv("EMBED_WINDOW_TOKENS", "0")) or encoder.max_seq_length
+    overlap = int(os.getenv("EMBED_WINDOW_OVERLAP", "32"))
+    model_id = args.model if args.backend == "torch" else f"{args.model}@{args.backend}"
+    key = index_key(model_id, windowing, window_tokens, overlap)
+
+    pf = pq.ParquetFile(args.parquet)
+    meta = {
+        "model_name": args.model,
+        "backend": args.backend,
+        "model_id": model_id,
+        "index_key": key,
+        "dim": encoder.get_sentence_embedding_dimension(),
+        "dtype": args.dtype,
+        "normalized": True,
+        "windowing": {"enabled": windowing, "max_tokens": window_tokens, "overlap": overlap},
+        "source": args.parquet,
+        "source_rows_total": pf.metadata.num_rows,
+        "shard_rows": args.shard_rows,
+    }
+    shards = ShardSet(args.out)
+    settings = {k: v for k, v in (shards.meta or {}).items() if k in meta}
+    if shards.meta is not None and settings == meta:
+        print(f"[shards] resuming after {len(shards.shards())} finished shards in {args.out}")
+    elif shards.meta is not None and shards.shards() and not args.overwrite:
+        raise SystemExit(f"{args.out} holds shards with other settings; pass --overwrite to replace them")
+    else:
+        shards = ShardSet.create(args.out, meta)
+
+    pool = None
+    if args.processes > 1:
+        pool = EncodePool(args.model, args.processes, token_budget=args.token_budget, backend=args.backend)
+        pool.warmup()
+
+    def encode(texts):
+        if pool is not None:
+            return pool.encode(texts)
+        return encode_bucketed(encoder, texts, token_budget=args.token_budget)[0]
+
+    done = len(shards.shards())
+    t0, rows = time.time(), 0
+    try:
+        for i, df in enumerate(iter_parquet_chunks(pf, PAYLOAD_COLUMNS, args.shard_rows)):
+            if i < done:
+                continue
+            texts = df["multilingual_concat"].fillna("").tolist()
+            wins = [token_windows(encoder.tokenizer, t, window_tokens, overlap) if windowing else [t] for t in texts]
+            owner = [(r, k) for r, w in enumerate(wins) for k in range(len(w))]
+            vecs = encode([wins[r][k] for r, k in owner])
+            payloads = build_payloads(df, PAYLOAD_COLUMNS)
+            hashes = [text_hash(key, t) for t in texts]
+            sidecar = pd.DataFrame.from_records([
+                {**payloads[r], "doc_id": str(payloads[r]["doc_id"]), "window": k, "windows": len(wins[r]), "hash": hashes[r]}
+                for r, k in owner
+            ], columns=SIDECAR_COLUMNS)
+            shards.write_shard(i, np.asarray(vecs, dtype=np.float32), sidecar)
+            rows += len(df)
+            print(f"[shards] shard {i}: {len(df)} rows -> {len(owner)} vectors ({rows / max(1e-6, time.time() - t0):.1f} rows/s)")
+    finally:
+        if pool is not None:
+            pool.close()
+    print(f"[shards] done: {shards.stats()}")
+    return shards.stats()
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--parquet", default="data/out/normalized.parquet")
+    ap.add_argument("--out", default="data/out/shards")
+    ap.add_argument("--shard-rows", type=int, default=50000, help="source rows per shard")
+    ap.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    ap.add_argument("--model", default=os.getenv("EMBED_MODEL", "sentence-transformers/LaBSE"))
+    ap.add_argument("--backend", default=os.getenv("EMBED_BACKEND", "torch"))
+    ap.add_argument("--processes", type=int, default=int(os.getenv("EMBED_INDEX_PROCESSES", "0")))
+    ap.add_argument("--token-budget", type=int, default=int(os.getenv("EMBED_TOKEN_BUDGET", "8192")))
+    ap.add_argument("--overwrite", action="store_true", help="discard existing shards with other settings")
+    return ap.parse_args(argv)
+
+if __name__ == "__main__":
+    embed_to_shards(parse_args())
@@ -0,0 +1,112 @@
+# services/embedding/encode_pool.py
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+try:
+    from services.embedding.bucketing import EncodeStats, encode_bucketed
+except ImportError:  # imported script-style from worker.py
+    from bucketing import EncodeStats, encode_bucketed
+
+# Per-process state, set by _init_worker in each pool process
+_model = None
+_budget = (8192, 256)
+_barrier = None
+
+def _init_worker(model_name: str, threads: int, token_budget: int, max_batch: int, backend: str, barrier=None):
+    # Pin intra-op threads before torch spins up its pools, so N processes x T threads
+    # never oversubscribe the cores.
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+    try:
+        from services.embedding.backends import load_encoder
+    except ImportError:  # imported script-style from worker.py
+        from backends import load_encoder
+    global _model, _budget, _barrier
+    # the parent has already run the parity check (and any ONNX export) for this backend
+    _model = load_encoder(model_name, backend, device="cpu", threads=threads)
+    _budget = (token_budget, max_batch)
+    _barrier = barrier
+
+def _encode_shard(texts: list[str]):
+    return encode_bucketed(_model, texts, token_budget=_budget[0], max_batch=_budget[1])
+
+def _warmup(timeout: float):
+    # runs after _init_worker, so the model is loaded; blocking on the barrier keeps this
+    # worker from taking a second warmup task, so each of the N tasks lands on a different worker
+    _barrier.wait(timeout)
+    return os.getpid()
+
+class EncodePool:
+    """
+    Bulk CPU encoding across `processes` worker processes, each holding its own copy
+    of the model with torch pinned to `threads` intra-op threads (default: cores / processes).
+
+    `encode()` cuts the texts into contiguous shards of `shard_size`, spreads them over
+    the pool and concatenates the results in input order. Workers are started with
+    `spawn` (torch is not fork-safe) and load the model once; reuse the pool across calls.
+    Memory cost is one model per process (~1.9 GB for LaBSE, about a quarter with int8).
+    """
+
+    def __init__(self, model_name: str, processes: int, threads: int | None = None,
+                 token_budget: int = 8192, max_batch: int = 256, shard_size: int = 256, backend: str = "torch"):
+        self.model_name = model_name
+        self.processes = max(1, int(processes))
+        self.threads = max(1, int(threads or (os.cpu_count() or 1) // self.processes))
+        self.shard_size = max(1, int(shard_size))
+        ctx = mp.get_context("spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(model_name, self.threads, int(token_budget), int(max_batch), backend,
+                      ctx.Barrier(self.processes)),
+        )
+        self.backend = backend
+        self.rows = 0
+        self.encode_stats = EncodeStats()
+
+    def warmup(self, timeout: float = 600.0) -> list[int]:
+        """
+        Start every worker and wait until each one has loaded its model, instead of paying
+        for it on the first chunk. Returns the worker pids; raises if one is not up in `timeout`s.
+        """
+        return list(self._executor.map(_warmup, [timeout] * self.processes))
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        shards = [texts[i:i + self.shard_size] for i in range(0, len(texts), self.shard_size)]
+        parts = list(self._executor.map(_encode_shard, shards))
+        for _, info in parts:
+            self.encode_stats.add(info)
+        vecs = np.concatenate([v for v, _ in parts])
+        self.rows += len(texts)
+        return vecs
+
+    def stats(self) -> dict:
+        return {
+            "processes": self.processes,
+            "backend": self.backend,
+            "threads_per_process": self.threads,
+            "shard_size": self.shard_size,
+            "rows": self.rows,
+            "encode": self.encode_stats.snapshot(),
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "EncodePool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
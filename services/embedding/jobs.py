@@ -0,0 +1,182 @@
+# services/embedding/jobs.py
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+
+TERMINAL = ("succeeded", "failed", "cancelled")
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """
+    Handle passed to a running job. Progress fields are updated in memory;
+    `commit()` additionally writes the checkpoint so a restart resumes from
+    `next_row` instead of row 0.
+    """
+
+    def __init__(self, manager: "JobManager", state: dict):
+        self._manager = manager
+        self.state = state
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        self._t0 = time.time()
+        self._row0 = state.get("next_row", 0)
+
+    @property
+    def id(self) -> str:
+        return self.state["job_id"]
+
+    @property
+    def start_row(self) -> int:
+        return self.state.get("next_row", 0)
+
+    def remember(self, key: str, value):
+        """Record `value` on the first run (durably); on resume return what was recorded."""
+        with self.lock:
+            fresh = key not in self.state
+            value = self.state.setdefault(key, value)
+        if fresh:
+            self._manager._save(self)
+        return value
+
+    def update(self, **fields):
+        with self.lock:
+            self.state.update(fields)
+            self.state["updated_at"] = time.time()
+
+    def add(self, **deltas):
+        with self.lock:
+            for k, v in deltas.items():
+                self.state[k] = self.state.get(k, 0) + v
+
+    def commit(self, next_row: int, **fields):
+        self.update(next_row=next_row, **fields)
+        self._manager._save(self)
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.id)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            s = dict(self.state)
+        done = s.get("next_row", 0)
+        total = s.get("rows_total") or 0
+        elapsed = max(1e-6, time.time() - self._t0)
+        rate = (done - self._row0) / elapsed if s.get("status") == "running" else 0.0
+        s["rows_per_sec"] = round(rate, 2)
+        s["eta_sec"] = round((total - done) / rate, 1) if rate > 0 and total else None
+        return s
+
+class JobManager:
+    """
+    Runs jobs one at a time on a background worker thread and persists each
+    job's state as JSON under `path`, so queued/running jobs survive restarts
+    and can be resumed from their last committed checkpoint.
+    """
+
+    def __init__(self, run_fn, path: str):
+        self.run_fn = run_fn  # run_fn(params: dict, job: Job) -> dict
+        self.path = path
+        self._jobs: dict[str, Job] = {}
+        self._queue: "queue.Queue[Job]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        os.makedirs(path, exist_ok=True)
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json"):
+                with open(os.path.join(path, name)) as f:
+                    state = json.load(f)
+                self._jobs[state["job_id"]] = Job(self, state)
+
+    # ---- persistence ----
+    def _save(self, job: Job):
+        with job.lock:
+            data = json.dumps(job.state)
+        target = os.path.join(self.path, f"{job.id}.json")
+        with open(target + ".tmp", "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(target + ".tmp", target)
+
+    # ---- execution ----
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="index-jobs", daemon=True)
+                self._worker.start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job.cancel_event.is_set():
+                job.update(status="cancelled")
+                self._save(job)
+                continue
+            job._t0, job._row0 = time.time(), job.start_row
+            job.update(status="running", error=None)
+            self._save(job)
+            try:
+                result = self.run_fn(job.state["params"], job)
+                job.update(status="succeeded", result=result, finished_at=time.time())
+            except JobCancelled:
+                job.update(status="cancelled", finished_at=time.time())
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                job.update(status="failed", error=str(e), finished_at=time.time())
+            self._save(job)
+
+    def _enqueue(self, job: Job):
+        job.cancel_event.clear()
+        job.update(status="queued")
+        self._save(job)
+        self._queue.put(job)
+        self._ensure_worker()
+
+    # ---- API ----
+    def submit(self, kind: str, params: dict) -> dict:
+        state = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "next_row": 0,
+            "created_at": time.time(),
+        }
+        job = Job(self, state)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._enqueue(job)
+        return job.snapshot()
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def list(self) -> list[dict]:
+        return [j.snapshot() for j in sorted(self._jobs.values(), key=lambda j: j.state.get("created_at", 0))]
+
+    def cancel(self, job_id: str) -> Job | None:
+        job = self._jobs.get(job_id)
+        if job is not None and job.state.get("status") not in TERMINAL:
+            job.cancel_event.set()
+        return job
+
+    def resume(self, job_id: str) -> Job | None:
+        """Re-queue a cancelled or failed job from its last checkpoint."""
+        job = self._jobs.get(job_id)
+        if job is not None and job.state.get("status") in ("cancelled", "failed"):
+            self._enqueue(job)
+        return job
+
+    def resume_pending(self):
+        """Called on start-up: jobs that were queued/running when the process died are re-queued."""
+        for job in list(self._jobs.values()):
+            if job.state.get("status") in ("queued", "running"):
+                print(f"[jobs] resuming {job.id} from row {job.start_row}")
+                self._enqueue(job)
@@ -0,0 +1,92 @@
+# services/embedding/load_shards.py
+"""
+Bulk-load vector shards written by `embed_shards` into Weaviate (no model needed).
+
+    python -m services.embedding.load_shards --shards data/out/shards
+
+Objects get the same UUIDs as /index (doc_id, plus "#w<k>" for windows after the first),
+so loading over an existing index upserts in place. The index manifest next to the source
+parquet is then updated with the shard hashes (entries of doc_ids not in the shards are kept,
+windows a doc_id no longer has are deleted), so a following incremental /index only touches
+rows that changed since the shards were made (when the service runs the same
+model/backend/windowing as the shards).
+"""
+import os
+import time
+import argparse
+import numpy as np
+import weaviate
+from weaviate.exceptions import UnexpectedStatusCodeError
+from services.common.index_version import DEFAULT_PATH, bump_index_version
+from services.embedding.manifest import IndexManifest, manifest_path_for
+from services.embedding.pipeline import PAYLOAD_COLUMNS
+from services.common.shards import ShardSet
+from services.embedding.uploader import BatchUploader, build_payloads
+from services.embedding.weaviate_schema import CLASS, ensure_schema
+from services.embedding.windows import window_uuid
+
+def load_shards(client, shards: ShardSet, class_name: str = CLASS, batch_rows: int = 5000,
+                workers: int = 4, retries: int = 3, manifest_path: str | None = None) -> dict:
+    if shards.meta is None:
+        raise FileNotFoundError(f"No shards (meta.json) under {shards.path}")
+    ensure_schema(client, named_vectors=False)
+    manifest = IndexManifest.load(manifest_path) if manifest_path else None
+    stale = []  # windows past a doc_id's new window count
+    t0 = time.time()
+    uploader = BatchUploader(client, class_name, num_workers=workers, max_retries=retries)
+    with uploader:
+        for entry in shards.shards():
+            vecs, side = shards.read(entry)
+            for a in range(0, len(side), batch_rows):
+                part = side.iloc[a:a + batch_rows]
+                payloads = build_payloads(part, PAYLOAD_COLUMNS + ["window", "windows"])
+                uuids = [window_uuid(d, int(k)) for d, k in zip(part["doc_id"], part["window"])]
+                uploader.add(payloads, np.asarray(vecs[a:a + batch_rows], dtype=np.float32), uuids)
+            if manifest is not None:
+                first = side[side["window"] == 0]
+                counts = first["windows"].astype(int)
+                stale += [window_uuid(d, k) for d, n in zip(first["doc_id"], counts)
+                          for k in range(n, manifest.window_count(d)) if d in manifest.entries]
+                manifest.entries.update(zip(first["doc_id"], first["hash"]))
+                manifest.windows.update(zip(first["doc_id"], counts))
+            print(f"[load] {entry['name']}: {entry['rows']} vectors ({uploader.stats()['objects_per_sec']} obj/s)")
+    for u in stale:
+        try:
+            client.data_object.delete(uuid=u, class_name=class_name)
+        except UnexpectedStatusCodeError as e:
+            if e.status_code != 404:
+                raise
+    if manifest is not None:
+        for err in uploader.errors.values():
+            manifest.entries.pop(str(err["doc_id"]), None)
+        manifest.save()
+    return {
+        **shards.stats(),
+        "seconds": round(time.time() - t0, 2),
+        "upload": uploader.stats(),
+        "errors": uploader.error_list(),
+        "deleted": len(stale),
+        "manifest": manifest_path,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--shards", default="data/out/shards")
+    ap.add_argument("--weaviate-url", default=os.getenv("WEAVIATE_URL", "http://localhost:8090"))
+    ap.add_argument("--batch-rows", type=int, default=5000)
+    ap.add_argument("--workers", type=int, default=int(os.getenv("EMBED_UPLOAD_WORKERS", "4")))
+    ap.add_argument("--retries", type=int, default=int(os.getenv("EMBED_UPLOAD_RETRIES", "3")))
+    ap.add_argument("--no-manifest", action="store_true", help="do not update the index manifest")
+    args = ap.parse_args()
+
+    shards = ShardSet(args.shards)
+    meta = shards.meta or {}
+    print(f"[load] {shards.stats()} (model {meta.get('model_id')}, windowing {meta.get('windowing')})")
+    manifest_path = None if args.no_manifest or not meta.get("source") else manifest_path_for(meta["source"])
+    client = weaviate.Client(args.weaviate_url, timeout_config=(5, 120))
+    print(load_shards(client, shards, batch_rows=args.batch_rows, workers=args.workers,
+                      retries=args.retries, manifest_path=manifest_path))
+    bump_index_version(os.getenv("INDEX_VERSION_FILE", DEFAULT_PATH), "load_shards")
+
+if __name__ == "__main__":
+    main()
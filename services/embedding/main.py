@@ -1,46 +1,179 @@
 # services/embedding/main.py
 import os
 import numpy as np
-import pandas as pd
+import pyarrow.parquet as pq
 import weaviate
-import uuid
-from fastapi import FastAPI
+from weaviate.exceptions import UnexpectedStatusCodeError
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
 from functools import lru_cache
 from services.embedding.weaviate_schema import ensure_schema
+from services.common.batcher import MicroBatcher
+from services.embedding.vector_cache import VectorCache
+from services.embedding.pipeline import PAYLOAD_COLUMNS, iter_parquet_chunks, prefetch
+from services.embedding.manifest import IndexManifest, index_key, manifest_path_for, text_hash
+from services.embedding.jobs import Job, JobManager
+from services.embedding.uploader import BatchUploader, build_payloads
+from services.embedding.encode_pool import EncodePool
+from services.embedding.backends import load_checked_encoder
+from services.embedding.bucketing import EncodeStats, encode_bucketed
+from services.embedding.windows import token_windows, window_uuid
+from services.common.index_version import bump_index_version, read_index_version
 
 WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://weaviate:8080")
+MODEL_NAME = os.getenv("EMBED_MODEL", "sentence-transformers/LaBSE")
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")  # torch | int8 | onnx | onnx-int8
+# identifies the vector space in cache keys and index manifests (switching backend re-encodes)
+MODEL_ID = MODEL_NAME if EMBED_BACKEND == "torch" else f"{MODEL_NAME}@{EMBED_BACKEND}"
 CLASS = "Paragraph"
+INDEX_QUEUE_DEPTH = int(os.getenv("EMBED_INDEX_QUEUE_DEPTH", "2"))
+UPLOAD_WORKERS = int(os.getenv("EMBED_UPLOAD_WORKERS", "4"))
+UPLOAD_BATCH_SIZE = int(os.getenv("EMBED_UPLOAD_BATCH_SIZE", "100"))  # initial size; dynamic afterwards
+UPLOAD_RETRIES = int(os.getenv("EMBED_UPLOAD_RETRIES", "3"))
+UPLOAD_BACKOFF = float(os.getenv("EMBED_UPLOAD_BACKOFF", "0.5"))
+INDEX_PROCESSES = int(os.getenv("EMBED_INDEX_PROCESSES", "0"))  # >1: bulk-encode /index chunks in a process pool
+INDEX_THREADS = int(os.getenv("EMBED_INDEX_THREADS", "0"))  # torch threads per pool process (0 = cores / processes)
+TOKEN_BUDGET = int(os.getenv("EMBED_TOKEN_BUDGET", "8192"))  # padded tokens per forward pass
+MAX_ENCODE_BATCH = int(os.getenv("EMBED_MAX_ENCODE_BATCH", "256"))
+INDEX_VERSION_FILE = os.getenv("INDEX_VERSION_FILE", "data/out/index_version.json")  # polled by search to drop cached results
 
 app = FastAPI(title="Embedding & Indexer Service")
 
 # Load once; cache vectors in-memory to avoid recompute for repeated queries
-labse = SentenceTransformer("sentence-transformers/LaBSE")
+# Non-fp32 backends must pass a parity check against fp32 on the bundled CSVs, or start-up fails
+labse, BACKEND_PARITY = load_checked_encoder(MODEL_NAME, EMBED_BACKEND)
+EMBED_DIM = labse.get_sentence_embedding_dimension()
+
+# Paragraphs longer than the model's max sequence length are indexed as overlapping token
+# windows (one object per window) instead of being truncated; search pools them per doc_id
+WINDOWING = os.getenv("EMBED_WINDOWING", "1") == "1"
+WINDOW_TOKENS = int(os.getenv("EMBED_WINDOW_TOKENS", "0")) or labse.max_seq_length
+WINDOW_OVERLAP = int(os.getenv("EMBED_WINDOW_OVERLAP", "32"))
+# manifest hashes cover the windowing settings too, so changing them re-indexes long paragraphs
+INDEX_KEY = index_key(MODEL_ID, WINDOWING, WINDOW_TOKENS, WINDOW_OVERLAP)
+
+def split_windows(text: str) -> list[str]:
+    return token_windows(labse.tokenizer, text, WINDOW_TOKENS, WINDOW_OVERLAP) if WINDOWING else [text]
+
+# Persistent vector cache (survives restarts; lives on the ./data bind mount in docker; "" = memory only)
+VECTOR_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "data/cache/vectors") or None
+
+@lru_cache(maxsize=1)
+def get_vector_cache() -> VectorCache:
+    """Opened at startup (or on first use), not at import: the disk tier maps a max_bytes slab."""
+    return VectorCache(
+        VECTOR_CACHE_DIR,
+        model_id=MODEL_ID,
+        dim=EMBED_DIM,
+        dtype=os.getenv("EMBED_CACHE_DTYPE", "float32"),
+        max_bytes=int(os.getenv("EMBED_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+        hot_bytes=int(os.getenv("EMBED_CACHE_HOT_BYTES", str(16 * 1024 * 1024))),
+        casefold=os.getenv("EMBED_CACHE_CASEFOLD", "1") == "1",
+    )
+
+encode_stats = EncodeStats()
+
+def encode_list(texts):
+    # length-bucketed, token-budget batches; padding ratio and tokens/sec go to /stats
+    vecs, info = encode_bucketed(labse, texts, token_budget=TOKEN_BUDGET, max_batch=MAX_ENCODE_BATCH)
+    encode_stats.add(info)
+    if len(texts) >= 256:
+        print(f"[encode] {info['texts']} texts in {info['batches']} batches, padding {info['padding_ratio']:.1%} "
+              f"(input order {info['baseline_padding_ratio']:.1%}), {info['tokens_per_sec']} tok/s")
+    return vecs
+
+# Concurrent single-text misses are coalesced into one labse.encode call
+# (window: EMBED_BATCH_MAX_WAIT_MS, cap: EMBED_BATCH_MAX_SIZE)
+batcher = MicroBatcher(
+    encode_list,
+    max_batch=int(os.getenv("EMBED_BATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5")),
+)
 
 def _encode(text: str) -> np.ndarray: # write a unit test for this function
     if text == "": raise ValueError("Input text cannot be empty")
-    return labse.encode([text or ""], normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)[0]
+    return batcher.encode(text)
 
-# LRU cache for single-text vectors (default maxsize=4096; override via env)
+# LRU cache for single-text vectors (default maxsize=4096; override via env);
+# misses fall through to the persistent vector cache before running the model
 @lru_cache(maxsize=int(os.getenv("EMBED_CACHE_SIZE", "4096")))
 def encode_text_cached(text: str) -> bytes:
     # store as bytes to be cacheable; caller converts back to float32
-    vec = _encode(text)
+    cache = get_vector_cache()
+    vec = cache.get(text)
+    if vec is None:
+        vec = _encode(text)
+        cache.put(text, vec)
     return vec.tobytes()
 
-def encode_list(texts):
-    return labse.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+def encode_texts(texts: list[str], encode_fn=None) -> tuple[np.ndarray, int]:
+    """
+    Batch encode with per-item cache lookup and in-batch dedup: texts that share a
+    cache key are encoded once, cached ones not at all, and the vectors are scattered
+    back into input order. Returns (vectors, number of texts actually encoded).
+    Misses go through `encode_fn` (default: encode_list in this process).
+    """
+    cache = get_vector_cache()
+    slot_of: dict[bytes, int] = {}
+    uniq_texts, uniq_keys = [], []
+    inverse = np.empty(len(texts), dtype=np.int64)
+    for i, t in enumerate(texts):
+        k = cache.key(t)
+        j = slot_of.get(k)
+        if j is None:
+            j = slot_of[k] = len(uniq_texts)
+            uniq_texts.append(t)
+            uniq_keys.append(k)
+        inverse[i] = j
+
+    uniq_vecs = np.empty((len(uniq_texts), EMBED_DIM), dtype=np.float32)
+    misses = []
+    for j, k in enumerate(uniq_keys):
+        vec = cache.get_key(k)
+        if vec is None:
+            misses.append(j)
+        else:
+            uniq_vecs[j] = vec
+    if misses:
+        fresh = (encode_fn or encode_list)([uniq_texts[j] for j in misses])
+        uniq_vecs[misses] = fresh
+        for j, vec in zip(misses, fresh):
+            cache.put_key(uniq_keys[j], vec)
+    return uniq_vecs[inverse], len(misses)
 
 class IndexBody(BaseModel):
     parquet_path: str
     batch_size: int = 5000
     include_langs: list[str] = ["multilingual"]  # keep default light
+    full_reindex: bool = False  # ignore the manifest and re-encode every row
 
 class EmbedBody(BaseModel):
     texts: list[str]
     normalize: bool = True
 
+# Multi-process bulk encoder for /index (EMBED_INDEX_PROCESSES > 1); started on first use
+@lru_cache(maxsize=1)
+def get_encode_pool() -> EncodePool:
+    pool = EncodePool(MODEL_NAME, INDEX_PROCESSES, threads=INDEX_THREADS or None, backend=EMBED_BACKEND,
+                      token_budget=TOKEN_BUDGET, max_batch=MAX_ENCODE_BATCH)
+    pool.warmup()
+    print(f"[index] encode pool ready: {pool.stats()}")
+    return pool
+
+def index_encode_fn():
+    return get_encode_pool().encode if INDEX_PROCESSES > 1 else encode_list
+
+@app.on_event("startup")
+def _open_vector_cache():
+    get_vector_cache()
+
+@app.on_event("shutdown")
+def _flush_caches():
+    if get_vector_cache.cache_info().currsize:
+        get_vector_cache().flush()
+    if get_encode_pool.cache_info().currsize:
+        get_encode_pool().close()
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -49,10 +182,24 @@ def health():
 def root():
     return {"service": "embedding", "status": "ok"}
 
+@app.get("/stats")
+def stats():
+    info = encode_text_cached.cache_info()
+    return {
+        "batcher": batcher.stats(),
+        "lru": {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize},
+        "vector_cache": get_vector_cache().stats(),
+        "backend": BACKEND_PARITY,
+        "encode": encode_stats.snapshot(),
+        "encode_pool": get_encode_pool().stats() if get_encode_pool.cache_info().currsize else None,
+    }
+
 @app.post("/embed")
 def embed(body: EmbedBody):
     """
     Returns vectors for input texts; uses LRU cache for single-item calls.
+    Batch calls are deduplicated and served per item from the vector cache;
+    `encoded` reports how many texts actually went through the model.
     """
     if not body.texts:
         return {"vectors": []}
@@ -60,42 +207,186 @@ def embed(body: EmbedBody):
         raw = encode_text_cached(body.texts[0])
         vec = np.frombuffer(raw, dtype=np.float32).tolist()
         return {"vectors": [vec]}
-    # batch path (uncached)
-    vecs = encode_list(body.texts).tolist()
-    return {"vectors": vecs}
+    vecs, encoded = encode_texts(body.texts)
+    return {"vectors": vecs.tolist(), "encoded": encoded}
 
-@app.post("/index")
-def index(body: IndexBody):
-    df = pd.read_parquet(body.parquet_path)
+def new_client() -> weaviate.Client:
+    return weaviate.Client(WEAVIATE_URL, timeout_config=(5, 120))
+
+# One pooled client per process (keep-alive connections reused across index runs)
+@lru_cache(maxsize=1)
+def get_client() -> weaviate.Client:
+    return new_client()
+
+def delete_objects(client, uuids: list[str]):
+    """Delete by uuid; objects already gone (e.g. the class was recreated) are not an error."""
+    for u in uuids:
+        try:
+            client.data_object.delete(uuid=u, class_name=CLASS)
+        except UnexpectedStatusCodeError as e:
+            if e.status_code != 404:
+                raise
+
+def run_index(body: IndexBody, job: Job | None = None) -> dict:
+    """
+    Streams the parquet in `batch_size`-row chunks: chunk N+1 is read and encoded
+    on a background thread while chunk N is uploaded, with at most
+    EMBED_INDEX_QUEUE_DEPTH encoded chunks held in memory at any time.
+
+    Incremental: rows whose (model, multilingual_concat) hash matches the manifest
+    next to the parquet are skipped, and doc_ids that disappeared are deleted.
+    `full_reindex=true` (or a freshly created class) re-uploads every row; the old
+    manifest is still read, so vanished doc_ids and stale windows are deleted either way.
+
+    Over-length paragraphs are split into overlapping token windows, each uploaded
+    as its own object (same doc_id, `window` = 0..n-1); windows left over from a
+    longer previous version of a paragraph are deleted.
+
+    With a `job`, progress is reported on it, cancellation is honoured between
+    chunks, and each uploaded chunk is checkpointed; a resumed job only re-scans
+    (hashes) the rows before its checkpoint instead of re-encoding them.
+    """
+    pf = pq.ParquetFile(body.parquet_path)
     print("Connecting to Weaviate...")
-    client = weaviate.Client(WEAVIATE_URL)
+    client = get_client()
     print("Connected. Ensuring schema...")
-    ensure_schema(client, named_vectors=False)
+    created = ensure_schema(client, named_vectors=False)
     print("Schema setup complete.")
 
-    text_for_vec = df["multilingual_concat"].fillna("").tolist()
-    vecs = encode_list(text_for_vec)
-
-    total = len(df)
-    with client.batch as batch:
-        batch.batch_size = 256
-        for i in range(total):
-            payload = {
-                "doc_id": df.loc[i, "doc_id"],
-                "book_id": df.loc[i, "book_id"],
-                "para_id": df.loc[i, "para_id"],
-                "pali_paragraph": df.loc[i, "pali_paragraph"] if "pali_paragraph" in df.columns else None,
-                "pali_paragraph_ascii": df.loc[i, "pali_paragraph_ascii"] if "pali_paragraph_ascii" in df.columns else None,
-                "translation_paragraph": df.loc[i, "translation_paragraph"] if "translation_paragraph" in df.columns else None,
-                "translation_paragraph_ascii": df.loc[i, "translation_paragraph_ascii"] if "translation_paragraph_ascii" in df.columns else None,
-                "multilingual_concat": df.loc[i, "multilingual_concat"],
-            }
-            stable_uuid = uuid.uuid5(uuid.NAMESPACE_DNS, str(payload["doc_id"]))
-            batch.add_data_object(
-                data_object=payload,
-                class_name=CLASS,
-                uuid=str(stable_uuid),
-                vector=vecs[i]
-            )
-
-    return {"message": "Index upsert complete", "count": total, "vector": "multilingual"}
\ No newline at end of file
+    force = bool(body.full_reindex or created)  # re-upload unchanged rows too
+    start_row = 0
+    counts = {"added": 0, "updated": 0, "skipped": 0, "deleted": 0, "windowed": 0}
+    if job is not None:
+        force = job.remember("ignore_manifest", force)
+        start_row = job.start_row
+        counts.update(job.state.get("counts") or {})
+        job.update(rows_total=pf.metadata.num_rows)
+
+    manifest_path = manifest_path_for(body.parquet_path)
+    old = IndexManifest.load(manifest_path)
+    new = IndexManifest(manifest_path)
+    encode_fn = index_encode_fn()
+
+    def encode_chunk(item):
+        offset, df = item
+        if job is not None:
+            job.check_cancelled()
+        ids = df["doc_id"].astype(str).tolist()
+        texts = df["multilingual_concat"].fillna("").tolist()
+        hashes = [text_hash(INDEX_KEY, t) for t in texts]
+        prev = [old.get(d) for d in ids]
+        done = min(len(ids), max(0, start_row - offset))  # already uploaded before a resume
+        changed = [i >= done and (force or p != h) for i, (p, h) in enumerate(zip(prev, hashes))]
+        # window counts: re-split what is (or was, before a resume) uploaded, keep the rest
+        wins = {i: split_windows(texts[i]) for i in range(len(ids)) if changed[i] or i < done}
+        n_windows = [len(wins[i]) if i in wins else old.window_count(ids[i]) for i in range(len(ids))]
+        rows = [i for i in range(len(ids)) if changed[i]]
+        owner = [(j, k) for j, r in enumerate(rows) for k in range(n_windows[r])]  # (row in df, window)
+        vecs, n = encode_texts([wins[rows[j]][k] for j, k in owner], encode_fn)
+        if job is not None:
+            job.add(rows_encoded=len(ids) - done, texts_encoded=n)
+        return offset, df.iloc[rows].reset_index(drop=True), owner, vecs, n, ids, hashes, prev, changed, done, n_windows
+
+    def numbered(chunks):
+        offset = 0
+        for df in chunks:
+            yield offset, df
+            offset += len(df)
+
+    chunks = numbered(iter_parquet_chunks(pf, PAYLOAD_COLUMNS, body.batch_size))
+    total = encoded = 0
+    # client.batch is per-client state: each run batches on its own client so concurrent runs never share a batch
+    uploader = BatchUploader(new_client(), CLASS, batch_size=UPLOAD_BATCH_SIZE, num_workers=UPLOAD_WORKERS,
+                             max_retries=UPLOAD_RETRIES, backoff=UPLOAD_BACKOFF)
+    with uploader:
+        for item in prefetch(chunks, encode_chunk, depth=INDEX_QUEUE_DEPTH):
+            offset, df, owner, vecs, n, ids, hashes, prev, changed, done, n_windows = item
+            rows = [i for i, c in enumerate(changed) if c]
+            base = build_payloads(df, PAYLOAD_COLUMNS)
+            payloads = [{**base[j], "window": k, "windows": n_windows[rows[j]]} for j, k in owner]
+            uuids = [window_uuid(p["doc_id"], p["window"]) for p in payloads]
+            uploader.add(payloads, vecs, uuids)  # returns once the chunk is flushed
+            stale = []  # windows left over from a longer previous version of a paragraph
+            for i, (d, h, p, c) in enumerate(zip(ids, hashes, prev, changed)):
+                new.entries[d] = h
+                new.windows[d] = n_windows[i]
+                if c:  # a doc the manifest never saw counts 1 window, so nothing is stale
+                    stale += [window_uuid(d, k) for k in range(n_windows[i], old.window_count(d))]
+                if i >= done:
+                    counts["skipped" if not c else ("added" if p is None else "updated")] += 1
+                    counts["windowed"] += int(c and n_windows[i] > 1)
+            delete_objects(client, stale)
+            if rows or stale:
+                bump_index_version(INDEX_VERSION_FILE, "index")
+            total += len(ids)
+            encoded += n
+            if job is not None and offset + len(ids) > start_row:
+                job.commit(next_row=offset + len(ids), counts=dict(counts),
+                           rows_uploaded=offset + len(ids), upload=uploader.stats())
+                job.check_cancelled()
+            print(f"[index] {total} rows scanned, {len(df)} uploaded ({encoded} encoded, {uploader.stats()['objects_per_sec']} obj/s)")
+
+    gone = [d for d in old.entries if d not in new.entries]
+    delete_objects(client, [window_uuid(d, k) for d in gone for k in range(old.window_count(d))])
+    counts["deleted"] = len(gone)
+    if gone:
+        bump_index_version(INDEX_VERSION_FILE, "index")
+    # objects that still failed after retries stay out of the manifest, so the next run retries them
+    for err in uploader.errors.values():
+        new.entries.pop(str(err["doc_id"]), None)
+    new.save()
+
+    return {
+        "message": "Index upsert complete", "count": total, "encoded": encoded, "vector": "multilingual",
+        "windowing": {"enabled": WINDOWING, "max_tokens": WINDOW_TOKENS, "overlap": WINDOW_OVERLAP},
+        **counts, "upload": uploader.stats(), "errors": uploader.error_list(),
+        "index_version": read_index_version(INDEX_VERSION_FILE),
+    }
+
+def _run_index_job(params: dict, job: Job) -> dict:
+    return run_index(IndexBody(**params), job)
+
+JOBS_DIR = os.getenv("EMBED_JOBS_DIR", "data/jobs")
+
+@lru_cache(maxsize=1)
+def get_jobs() -> JobManager:
+    """Created on first use (not at import), so importing the module doesn't read or create JOBS_DIR."""
+    return JobManager(_run_index_job, JOBS_DIR)
+
+@app.on_event("startup")
+def _resume_jobs():
+    get_jobs().resume_pending()
+
+@app.post("/index")
+def index(body: IndexBody):
+    """Blocking index run (kept for scripts); prefer POST /jobs/index for large corpora."""
+    return run_index(body)
+
+def _job_or_404(job_id: str) -> Job:
+    job = get_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.post("/jobs/index")
+def submit_index_job(body: IndexBody):
+    """Queue an index run; poll GET /jobs/{job_id} for progress."""
+    return get_jobs().submit("index", body.model_dump())
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": get_jobs().list()}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    return _job_or_404(job_id).snapshot()
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    _job_or_404(job_id)
+    return get_jobs().cancel(job_id).snapshot()
+
+@app.post("/jobs/{job_id}/resume")
+def resume_job(job_id: str):
+    _job_or_404(job_id)
+    return get_jobs().resume(job_id).snapshot()
@@ -0,0 +1,60 @@
+# services/embedding/manifest.py
+import os
+import hashlib
+import pandas as pd
+
+def manifest_path_for(parquet_path: str) -> str:
+    """data/out/normalized.parquet -> data/out/normalized.manifest.parquet"""
+    base, _ = os.path.splitext(parquet_path)
+    return f"{base}.manifest.parquet"
+
+def index_key(model_id: str, windowing: bool, window_tokens: int, overlap: int) -> str:
+    """What a manifest hash depends on besides the text: the model and the windowing settings."""
+    return f"{model_id}|win{window_tokens}/{overlap}" if windowing else model_id
+
+def text_hash(model_id: str, text: str) -> str:
+    return hashlib.sha1(f"{model_id}\x00{text}".encode("utf-8")).hexdigest()
+
+class IndexManifest:
+    """
+    doc_id -> hash(model id + embedded text) for everything currently in Weaviate,
+    plus how many window objects each doc_id was stored as (1 unless windowed).
+
+    Lets /index skip rows whose text and model are unchanged and delete objects
+    whose doc_id disappeared from the parquet. Stored as a small parquet next
+    to the normalized parquet; written atomically after a successful run.
+    """
+
+    def __init__(self, path: str, entries: dict[str, str] | None = None, windows: dict[str, int] | None = None):
+        self.path = path
+        self.entries: dict[str, str] = entries or {}
+        self.windows: dict[str, int] = windows or {}
+
+    @classmethod
+    def load(cls, path: str) -> "IndexManifest":
+        if not os.path.exists(path):
+            return cls(path)
+        df = pd.read_parquet(path)
+        ids = df["doc_id"].astype(str)
+        windows = dict(zip(ids, df["windows"].astype(int))) if "windows" in df.columns else {}
+        return cls(path, dict(zip(ids, df["hash"])), windows)
+
+    def get(self, doc_id: str) -> str | None:
+        return self.entries.get(doc_id)
+
+    def window_count(self, doc_id: str) -> int:
+        return self.windows.get(doc_id, 1)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        df = pd.DataFrame({
+            "doc_id": list(self.entries.keys()),
+            "hash": list(self.entries.values()),
+            "windows": [self.windows.get(d, 1) for d in self.entries],
+        })
+        tmp = self.path + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,18 +1,25 @@
 # services/embedding/model.py
-from sentence_transformers import SentenceTransformer
+import os
+from backends import load_checked_encoder
+from bucketing import encode_bucketed
 import torch, numpy as np
 
 class LabseEncoder:
-    def __init__(self, device=None):
-        self.model = SentenceTransformer("sentence-transformers/LaBSE")
-        self.model = self.model.to(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    def __init__(self, device=None, backend=None):
+        # EMBED_BACKEND: torch (fp32) | int8 | onnx | onnx-int8; non-fp32 backends are parity-checked
+        self.backend = backend or os.environ.get("EMBED_BACKEND", "torch")
+        if self.backend == "torch":
+            device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.last_stats = None
+        self.model, self.parity = load_checked_encoder("sentence-transformers/LaBSE", self.backend, device=device)
 
-    def encode(self, texts, batch_size=512):
-        embs = self.model.encode(
-            texts,
-            batch_size=batch_size,
-            normalize_embeddings=True,  # cosine-friendly
-            convert_to_numpy=True,
-            show_progress_bar=False
-        )
-        return embs.astype(np.float32)
\ No newline at end of file
+    def encode(self, texts, batch_size=512, token_budget=None):
+        # length-bucketed batches of at most `batch_size` texts / `token_budget` padded tokens;
+        # vectors come back normalized (cosine-friendly) and in input order
+        token_budget = token_budget or int(os.environ.get("EMBED_TOKEN_BUDGET", "8192"))
+        embs, self.last_stats = encode_bucketed(self.model, texts, token_budget=token_budget, max_batch=batch_size)
+        if len(texts) >= 256:
+            s = self.last_stats
+            print(f"[encode] {s['texts']} texts, padding {s['padding_ratio']:.1%} "
+                  f"(input order {s['baseline_padding_ratio']:.1%}), {s['tokens_per_sec']} tok/s")
+        return embs
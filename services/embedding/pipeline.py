@@ -0,0 +1,65 @@
+# services/embedding/pipeline.py
+import queue
+import threading
+import pyarrow.parquet as pq
+
+# Columns /index needs from the normalized parquet (missing ones are skipped)
+PAYLOAD_COLUMNS = [
+    "doc_id", "book_id", "para_id",
+    "pali_paragraph", "pali_paragraph_ascii",
+    "translation_paragraph", "translation_paragraph_ascii",
+    "multilingual_concat",
+]
+
+_DONE = object()
+
+def iter_parquet_chunks(pf: pq.ParquetFile, columns: list[str], batch_size: int):
+    """
+    Yield DataFrames of at most `batch_size` rows, reading only `columns`
+    row group by row group, so memory does not grow with file size.
+    """
+    present = [c for c in columns if c in pf.schema_arrow.names]
+    for rb in pf.iter_batches(batch_size=max(1, int(batch_size)), columns=present):
+        yield rb.to_pandas()
+
+def prefetch(items, fn, depth: int = 2):
+    """
+    Yield fn(item) for each item, in order, computing them on a background
+    thread at most `depth` results ahead of the consumer. Used to overlap
+    encoding of chunk N+1 with the upload of chunk N; the bounded queue is
+    the backpressure that keeps memory flat.
+    """
+    q: queue.Queue = queue.Queue(maxsize=max(1, int(depth)))
+    stop = threading.Event()
+
+    def put(x) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(x, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if stop.is_set() or not put(("ok", fn(item))):
+                    return
+            put(("ok", _DONE))
+        except BaseException as e:  # hand the error to the consumer
+            put(("err", e))
+
+    t = threading.Thread(target=produce, name="index-prefetch", daemon=True)
+    t.start()
+    try:
+        while True:
+            kind, val = q.get()
+            if kind == "err":
+                raise val
+            if val is _DONE:
+                return
+            yield val
+    finally:
+        stop.set()
+        t.join(timeout=5)
@@ -0,0 +1,164 @@
+# services/embedding/snapshot.py
+"""
+Snapshot the Paragraph class (objects + vectors) to disk and restore it without re-encoding.
+
+    python -m services.embedding.snapshot create  --out data/snapshots/latest
+    python -m services.embedding.snapshot restore --path data/snapshots/latest [--drop-existing]
+
+`create` pages through the class with the cursor API (`after=<last id>`), so memory and
+query cost stay flat however large the class is, and writes the same shard layout as
+`embed_shards`: `.npy` vectors + a Parquet sidecar (object UUID + all properties) per file,
+plus the class definition in meta.json. `restore` recreates the class from that definition
+(HNSW/BM25 settings included) and bulk-imports the files with concurrent batches while the
+next file is read in the background, so it runs at Weaviate ingest speed.
+
+Keep snapshots outside data/out/ (teardown.sh deletes it). The index manifest is copied
+alongside and put back on restore, so incremental /index keeps working afterwards.
+"""
+import os
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import weaviate
+from services.common.index_version import DEFAULT_PATH, bump_index_version
+from services.embedding.pipeline import prefetch
+from services.common.shards import ShardSet
+from services.embedding.uploader import BatchUploader, build_payloads
+from services.embedding.weaviate_schema import CLASS
+
+# class-level settings that can be sent back to create_class (server-managed ones are dropped)
+_CLASS_KEYS = ("class", "description", "vectorizer", "vectorIndexType", "vectorIndexConfig",
+               "invertedIndexConfig", "moduleConfig", "properties")
+_PROP_KEYS = ("name", "dataType", "description", "tokenization", "indexInverted",
+              "indexFilterable", "indexSearchable", "moduleConfig")
+
+def portable_class(schema: dict) -> dict:
+    out = {k: schema[k] for k in _CLASS_KEYS if k in schema}
+    out["properties"] = [{k: p[k] for k in _PROP_KEYS if k in p} for p in schema.get("properties", [])]
+    return out
+
+def _pages(client, class_name: str, props: list[str], page_size: int):
+    """Yield lists of objects using cursor paging (ordered by id, no offset cost)."""
+    after = None
+    while True:
+        q = client.query.get(class_name, props).with_additional(["id", "vector"]).with_limit(page_size)
+        if after is not None:
+            q = q.with_after(after)
+        res = q.do()
+        if res.get("errors"):
+            raise RuntimeError(f"Snapshot query failed: {res['errors']}")
+        objs = res["data"]["Get"][class_name] or []
+        if not objs:
+            return
+        after = objs[-1]["_additional"]["id"]
+        yield objs
+
+def create_snapshot(client, out: str, class_name: str = CLASS, page_size: int = 1000,
+                    file_rows: int = 50000, dtype: str = "float32", manifest: str | None = None) -> dict:
+    t0 = time.time()
+    schema = client.schema.get(class_name)
+    props = [p["name"] for p in schema.get("properties", [])]
+    shards = None
+    ids, vecs, rows = [], [], []  # vecs: one float32 array per page, not float lists
+    total = 0
+
+    def flush():
+        nonlocal shards
+        if shards is None:
+            shards = ShardSet.create(out, {
+                "kind": "snapshot", "class": class_name, "schema": portable_class(schema),
+                "dim": vecs[0].shape[1], "dtype": dtype, "properties": props,
+            })
+        side = pd.DataFrame.from_records(rows, columns=props)
+        side.insert(0, "uuid", ids)
+        shards.write_shard(len(shards.shards()), np.concatenate(vecs), side)
+        ids.clear(); vecs.clear(); rows.clear()
+
+    for page in _pages(client, class_name, props, page_size):
+        total += len(page)
+        extras = [o.pop("_additional") for o in page]
+        ids.extend(e["id"] for e in extras)
+        vecs.append(np.asarray([e["vector"] for e in extras], dtype=np.float32))
+        rows.extend(page)
+        if len(ids) >= file_rows:
+            flush()
+        print(f"[snapshot] {total} objects read")
+    if ids:
+        flush()
+    if shards is None:
+        raise RuntimeError(f"Class {class_name} is empty; nothing to snapshot")
+    copy = os.path.join(out, "manifest.parquet")
+    if os.path.exists(copy):
+        os.remove(copy)  # from an older snapshot at the same path
+    if manifest and os.path.exists(manifest):
+        shutil.copyfile(manifest, copy)
+        shards.update_meta(manifest=manifest)
+    return {**shards.stats(), "seconds": round(time.time() - t0, 2)}
+
+def restore_snapshot(client, path: str, workers: int = 4, batch_rows: int = 2000,
+                     retries: int = 3, drop_existing: bool = False) -> dict:
+    t0 = time.time()
+    shards = ShardSet(path)
+    meta = shards.meta
+    if meta is None or meta.get("kind") != "snapshot":
+        raise FileNotFoundError(f"No snapshot under {path}")
+    class_name = meta["class"]
+    existing = {c["class"] for c in client.schema.get().get("classes", [])}
+    if class_name in existing and drop_existing:
+        client.schema.delete_class(class_name)
+        existing.discard(class_name)
+    if class_name not in existing:
+        client.schema.create_class(meta["schema"])
+
+    # int properties with gaps come back from parquet as floats; send them as ints again
+    int_props = [p["name"] for p in meta["schema"]["properties"] if p.get("dataType") == ["int"]]
+    uploader = BatchUploader(client, class_name, num_workers=workers, max_retries=retries)
+    with uploader:
+        # read (and decompress) the next file while the current one is uploading
+        for entry, (vecs, side) in prefetch(shards.shards(), lambda e: (e, shards.read(e)), depth=1):
+            for a in range(0, len(side), batch_rows):
+                part = side.iloc[a:a + batch_rows]
+                payloads = build_payloads(part, meta["properties"])
+                for pl in payloads:
+                    for k in int_props:
+                        if pl.get(k) is not None:
+                            pl[k] = int(pl[k])
+                uploader.add(payloads, np.asarray(vecs[a:a + batch_rows], dtype=np.float32), part["uuid"].tolist())
+            print(f"[restore] {entry['name']}: {entry['rows']} objects ({uploader.stats()['objects_per_sec']} obj/s)")
+
+    manifest_src = os.path.join(path, "manifest.parquet")
+    if meta.get("manifest") and os.path.exists(manifest_src) and not os.path.exists(meta["manifest"]):
+        os.makedirs(os.path.dirname(meta["manifest"]) or ".", exist_ok=True)
+        shutil.copyfile(manifest_src, meta["manifest"])
+    return {
+        **shards.stats(),
+        "seconds": round(time.time() - t0, 2),
+        "upload": uploader.stats(),
+        "errors": uploader.error_list(),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["create", "restore"])
+    ap.add_argument("--path", "--out", dest="path", default="data/snapshots/latest")
+    ap.add_argument("--weaviate-url", default=os.getenv("WEAVIATE_URL", "http://localhost:8090"))
+    ap.add_argument("--class-name", default=CLASS)
+    ap.add_argument("--page-size", type=int, default=1000)
+    ap.add_argument("--file-rows", type=int, default=50000)
+    ap.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    ap.add_argument("--manifest", default="data/out/normalized.manifest.parquet")
+    ap.add_argument("--workers", type=int, default=int(os.getenv("EMBED_UPLOAD_WORKERS", "4")))
+    ap.add_argument("--drop-existing", action="store_true", help="delete the class before restoring")
+    args = ap.parse_args()
+
+    client = weaviate.Client(args.weaviate_url, timeout_config=(5, 120))
+    if args.command == "create":
+        print(create_snapshot(client, args.path, args.class_name, args.page_size, args.file_rows, args.dtype, args.manifest))
+    else:
+        print(restore_snapshot(client, args.path, workers=args.workers, drop_existing=args.drop_existing))
+        bump_index_version(os.getenv("INDEX_VERSION_FILE", DEFAULT_PATH), "snapshot restore")
+
+if __name__ == "__main__":
+    main()
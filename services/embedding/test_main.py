@@ -14,8 +14,30 @@ from services.embedding.main import (
     _encode,
     encode_text_cached,
     encode_list,
+    labse,
+    encode_texts,
+    get_vector_cache,
+    get_client,
+    get_jobs,
+    MODEL_NAME,
     CLASS,
 )
+from services.common.batcher import MicroBatcher
+from services.embedding.vector_cache import VectorCache, normalize_key
+from services.embedding.pipeline import prefetch
+from services.embedding.manifest import manifest_path_for
+from services.embedding.jobs import JobManager
+from services.common.index_version import bump_index_version, read_index_version
+from services.embedding.uploader import BatchUploader, build_payloads, stable_uuid
+from services.embedding.encode_pool import EncodePool
+from services.embedding.backends import check_parity, load_encoder, parity_texts
+from services.embedding.bucketing import encode_bucketed, plan_batches
+from services.embedding.windows import token_windows, window_uuid
+from services.common.shards import ShardSet
+from services.embedding.embed_shards import embed_to_shards, parse_args
+from services.embedding.load_shards import load_shards
+from services.embedding.snapshot import create_snapshot, restore_snapshot
+from services.embedding.manifest import IndexManifest
 
 
 @pytest.fixture
@@ -24,6 +46,40 @@ def client():
     return TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def fresh_weaviate_client():
+    """Drop the pooled Weaviate client so each test sees its own patched one"""
+    get_client.cache_clear()
+    yield
+    get_client.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def index_version_file(tmp_path):
+    """Keep index version bumps out of the repo's data/out"""
+    path = str(tmp_path / "index_version.json")
+    with patch("services.embedding.main.INDEX_VERSION_FILE", path):
+        yield path
+
+
+@pytest.fixture(autouse=True)
+def memory_vector_cache():
+    """A fresh memory-only vector cache per test: no slab under the CWD, no vectors carried across runs"""
+    get_vector_cache.cache_clear()
+    with patch("services.embedding.main.VECTOR_CACHE_DIR", None):
+        yield
+    get_vector_cache.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def jobs_dir(tmp_path):
+    """Keep job state files out of the repo (and out of the next run's start-up resume)"""
+    get_jobs.cache_clear()
+    with patch("services.embedding.main.JOBS_DIR", str(tmp_path / "jobs")):
+        yield str(tmp_path / "jobs")
+    get_jobs.cache_clear()
+
+
 @pytest.fixture
 def sample_texts():
     """Sample texts for testing"""
@@ -180,6 +236,576 @@ class TestEncodeList:
         assert result.shape[0] == 0
 
 
+class TestBucketing:
+    """Tests for length-bucketed, token-budget batching"""
+
+    def test_plan_batches_respects_token_budget(self):
+        """Test that every index is planned once and padded batch size stays within budget"""
+        lengths = np.array([3, 120, 4, 250, 5, 60, 3, 3])
+        batches = plan_batches(lengths, token_budget=256, max_batch=4)
+        assert sorted(np.concatenate(batches).tolist()) == list(range(8))
+        for b in batches:
+            assert len(b) <= 4
+            assert len(b) * lengths[b].max() <= 256 or len(b) == 1
+
+    def test_encode_bucketed_restores_input_order(self):
+        """Test that bucketed vectors come back in input order and match encode_list per text"""
+        texts = ["short", "a much longer paragraph " * 20, "mid length text here", "x"]
+        vecs, info = encode_bucketed(labse, texts, token_budget=64, max_batch=8)
+        for i, t in enumerate(texts):
+            np.testing.assert_array_almost_equal(vecs[i], encode_list([t])[0], decimal=5)
+        assert info["texts"] == 4
+        assert info["tokens_per_sec"] > 0
+
+    def test_bucketing_cuts_padding(self):
+        """Test that headings mixed with long paragraphs pad less than input-order batches"""
+        texts = [("heading" if i % 2 else "long commentary paragraph " * 30) for i in range(64)]
+        _, info = encode_bucketed(labse, texts, token_budget=4096, max_batch=64, baseline_batch=32)
+        assert info["padding_ratio"] < info["baseline_padding_ratio"]
+
+    def test_stats_reports_encode_padding(self, client):
+        """Test that /stats exposes running padding ratio and tokens/sec"""
+        encode_list(["one text", "another, longer text to encode"])
+        data = client.get("/stats").json()["encode"]
+        assert data["texts"] >= 2
+        assert 0.0 <= data["padding_ratio"] < 1.0
+        assert "tokens_per_sec" in data
+
+
+class TestWindows:
+    """Tests for overlapping token windows"""
+
+    def test_short_text_is_one_window(self):
+        """Test that text within the limit is returned unchanged"""
+        assert token_windows(labse.tokenizer, "Evaṃ me sutaṃ", 16, 4) == ["Evaṃ me sutaṃ"]
+
+    def test_long_text_windows_overlap_and_cover_tail(self):
+        """Test that windows respect the size, overlap by the given tokens and reach the end"""
+        text = " ".join(f"w{i}" for i in range(20))
+        wins = token_windows(labse.tokenizer, text, 8, 2)  # 6 tokens per window, step 4
+        assert wins[0] == "w0 w1 w2 w3 w4 w5"
+        assert wins[1].startswith("w4 w5 ")
+        assert wins[-1].endswith("w19")
+        assert all(len(w.split()) <= 6 for w in wins)
+
+    def test_window_zero_keeps_paragraph_uuid(self):
+        """Test that window 0 uses the plain doc_id UUID and later windows differ"""
+        assert window_uuid("doc_1", 0) == str(uuid.uuid5(uuid.NAMESPACE_DNS, "doc_1"))
+        assert window_uuid("doc_1", 1) != window_uuid("doc_1", 0)
+
+
+class TestMicroBatcher:
+    """Tests for the /embed request-coalescing batcher"""
+
+    @staticmethod
+    def _fake_encode(calls):
+        def encode(texts):
+            calls.append(list(texts))
+            return np.array([[float(len(t))] for t in texts], dtype=np.float32)
+        return encode
+
+    def test_single_request_round_trip(self):
+        """Test that a lone request is encoded and returned"""
+        calls = []
+        b = MicroBatcher(self._fake_encode(calls), max_batch=8, max_wait_ms=1)
+        vec = b.encode("abc")
+        assert vec[0] == 3.0
+        assert calls == [["abc"]]
+
+    def test_concurrent_requests_are_coalesced(self):
+        """Test that concurrent requests share one encode call and get their own result"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        calls = []
+        b = MicroBatcher(self._fake_encode(calls), max_batch=16, max_wait_ms=200)
+        texts = ["x" * n for n in range(1, 9)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(b.encode, texts))
+
+        assert [r[0] for r in results] == [float(len(t)) for t in texts]
+        assert len(calls) < len(texts)
+        stats = b.stats()
+        assert stats["items"] == len(texts)
+        assert stats["max_batch_size_seen"] > 1
+
+    def test_max_batch_is_respected(self):
+        """Test that no batch exceeds max_batch"""
+        calls = []
+        b = MicroBatcher(self._fake_encode(calls), max_batch=2, max_wait_ms=50)
+        futs = [b.submit(str(i)) for i in range(5)]
+        [f.result() for f in futs]
+        assert all(len(c) <= 2 for c in calls)
+
+    def test_encode_errors_propagate(self):
+        """Test that model errors are raised to every waiting caller"""
+        def boom(texts):
+            raise RuntimeError("model failure")
+        b = MicroBatcher(boom, max_batch=4, max_wait_ms=1)
+        with pytest.raises(RuntimeError, match="model failure"):
+            b.encode("x")
+
+
+class TestVectorCache:
+    """Tests for the persistent, byte-bounded vector cache"""
+
+    def test_normalize_key(self):
+        """Test NFC, whitespace and casefold normalization"""
+        assert normalize_key("  Anicca\t  Vata ") == "anicca vata"
+        assert normalize_key("a\u0304") == normalize_key("\u0101")  # NFD vs NFC ā
+        assert normalize_key("Dhamma", casefold=False) == "Dhamma"
+
+    def test_key_includes_model_id(self):
+        """Test that the same text under another model gets another key"""
+        a = VectorCache(None, model_id="model-a", dim=4)
+        b = VectorCache(None, model_id="model-b", dim=4)
+        assert a.key("dhamma") != b.key("dhamma")
+
+    def test_put_get_and_miss(self, tmp_path):
+        """Test basic put/get and counters"""
+        cache = VectorCache(str(tmp_path), model_id="m", dim=4)
+        assert cache.get("x") is None
+        cache.put("x", np.ones(4, dtype=np.float32))
+        np.testing.assert_array_equal(cache.get("x"), np.ones(4))
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hot_hits"] == 1
+
+    def test_survives_reopen(self, tmp_path):
+        """Test that entries are served from disk after a restart"""
+        cache = VectorCache(str(tmp_path), model_id="m", dim=4)
+        cache.put("Sabbe sankhara anicca", np.arange(4, dtype=np.float32))
+        cache.flush()
+
+        reopened = VectorCache(str(tmp_path), model_id="m", dim=4)
+        vec = reopened.get("sabbe  SANKHARA anicca")
+        np.testing.assert_array_equal(vec, np.arange(4))
+        assert reopened.stats()["disk_hits"] == 1
+
+    def test_byte_budget_evicts_lru(self, tmp_path):
+        """Test that the disk tier never exceeds its byte budget"""
+        cache = VectorCache(str(tmp_path), model_id="m", dim=4, max_bytes=3 * 16, hot_bytes=0)
+        for i in range(5):
+            cache.put(f"t{i}", np.full(4, i, dtype=np.float32))
+        stats = cache.stats()
+        assert stats["disk_entries"] == 3
+        assert stats["evictions"] == 2
+        assert stats["disk_bytes_used"] <= stats["disk_bytes_budget"]
+        assert cache.get("t0") is None
+        assert cache.get("t4") is not None
+
+    def test_float16_slab(self, tmp_path):
+        """Test that a float16 slab halves the footprint and round-trips approximately"""
+        cache = VectorCache(str(tmp_path), model_id="m", dim=4, dtype="float16", hot_bytes=0)
+        cache.put("x", np.array([0.1, 0.2, 0.3, 0.4], dtype=np.float32))
+        assert cache.row_bytes == 8
+        np.testing.assert_array_almost_equal(cache.get("x"), [0.1, 0.2, 0.3, 0.4], decimal=3)
+
+
+class TestStatsEndpoint:
+    """Tests for /stats endpoint"""
+
+    def test_stats_reports_batcher(self, client):
+        """Test that batcher queue depth and batch sizes are exposed"""
+        encode_text_cached.cache_clear()
+        client.post("/embed", json={"texts": ["stats probe"]})
+        data = client.get("/stats").json()
+        assert data["batcher"]["batches"] >= 1
+        assert "queue_depth" in data["batcher"]
+        assert "avg_batch_size" in data["batcher"]
+
+    def test_stats_reports_vector_cache(self, client):
+        """Test that vector cache hit/miss/eviction counters are exposed"""
+        data = client.get("/stats").json()
+        for key in ("hot_hits", "disk_hits", "misses", "evictions"):
+            assert key in data["vector_cache"]
+
+
+class TestEncodeTexts:
+    """Tests for deduplicated, cache-aware batch encoding"""
+
+    def test_duplicates_encoded_once_and_scattered(self):
+        """Test that repeated texts are encoded once and returned in input order"""
+        get_vector_cache().clear()
+        texts = ["# Majjhimanikāye", "Evaṃ me sutaṃ", "# Majjhimanikāye", "Evaṃ me sutaṃ"]
+        with patch("services.embedding.main.encode_list", wraps=encode_list) as spy:
+            vecs, encoded = encode_texts(texts)
+        assert encoded == 2
+        assert spy.call_count == 1
+        assert len(spy.call_args.args[0]) == 2
+        np.testing.assert_array_equal(vecs[0], vecs[2])
+        np.testing.assert_array_equal(vecs[1], vecs[3])
+        np.testing.assert_array_almost_equal(vecs[1], encode_list(["Evaṃ me sutaṃ"])[0], decimal=5)
+
+    def test_partial_cache_hits(self):
+        """Test that only cache misses go through the model"""
+        get_vector_cache().clear()
+        encode_texts(["cached one", "cached two"])
+        with patch("services.embedding.main.encode_list", wraps=encode_list) as spy:
+            vecs, encoded = encode_texts(["cached one", "fresh text", "cached two"])
+        assert encoded == 1
+        assert spy.call_args.args[0] == ["fresh text"]
+        assert vecs.shape[0] == 3
+
+    def test_embed_batch_reports_encoded(self, client):
+        """Test that batch /embed reports how many texts were encoded"""
+        get_vector_cache().clear()
+        response = client.post("/embed", json={"texts": ["dup", "dup", "other"]})
+        data = response.json()
+        assert len(data["vectors"]) == 3
+        assert data["encoded"] == 2
+
+
+class TestPrefetch:
+    """Tests for the bounded encode/upload overlap helper"""
+
+    def test_prefetch_preserves_order(self):
+        """Test that results come back in input order"""
+        assert list(prefetch(range(10), lambda x: x * x, depth=2)) == [x * x for x in range(10)]
+
+    def test_prefetch_propagates_errors(self):
+        """Test that producer errors surface in the consumer"""
+        def fn(x):
+            if x == 3:
+                raise ValueError("bad chunk")
+            return x
+        with pytest.raises(ValueError, match="bad chunk"):
+            list(prefetch(range(5), fn))
+
+    def test_prefetch_is_bounded(self):
+        """Test that the producer never runs more than depth (+1 in flight) ahead"""
+        import threading
+        import time
+        produced = []
+        lock = threading.Lock()
+
+        def fn(x):
+            with lock:
+                produced.append(x)
+            return x
+
+        gen = prefetch(range(100), fn, depth=2)
+        next(gen)
+        time.sleep(0.2)
+        with lock:
+            assert len(produced) <= 4
+        gen.close()
+
+
+def _wait_for(job, statuses=("succeeded", "failed", "cancelled"), timeout=10):
+    import time
+    deadline = time.time() + timeout
+    while job.state.get("status") not in statuses and time.time() < deadline:
+        time.sleep(0.01)
+    return job.state.get("status")
+
+
+class TestJobManager:
+    """Tests for asynchronous, checkpointed jobs"""
+
+    def test_job_runs_and_reports_result(self, tmp_path):
+        """Test that a submitted job runs in the background and records its result"""
+        def run(params, job):
+            job.update(rows_total=2)
+            job.commit(next_row=2)
+            return {"count": params["n"]}
+
+        manager = JobManager(run, str(tmp_path))
+        snap = manager.submit("index", {"n": 2})
+        job = manager.get(snap["job_id"])
+        assert _wait_for(job) == "succeeded"
+        assert job.snapshot()["result"] == {"count": 2}
+
+    def test_cancel_then_resume_from_checkpoint(self, tmp_path):
+        """Test that a cancelled job resumes from its last committed row"""
+        import threading
+        gate = threading.Event()
+        starts = []
+
+        def run(params, job):
+            starts.append(job.start_row)
+            for row in range(job.start_row, 10):
+                if row == 5 and not gate.is_set():
+                    gate.set()
+                    job.cancel_event.wait(5)
+                job.commit(next_row=row + 1)
+                job.check_cancelled()
+            return {}
+
+        manager = JobManager(run, str(tmp_path))
+        job = manager.get(manager.submit("index", {})["job_id"])
+        gate.wait(5)
+        manager.cancel(job.id)
+        assert _wait_for(job) == "cancelled"
+        assert job.start_row == 6
+
+        manager.resume(job.id)
+        assert _wait_for(job, ("succeeded",)) == "succeeded"
+        assert starts == [0, 6]
+
+    def test_restart_resumes_pending_jobs(self, tmp_path):
+        """Test that a job left 'running' by a crashed process is resumed on start-up"""
+        import json
+        state = {"job_id": "abc", "kind": "index", "params": {}, "status": "running", "next_row": 40}
+        (tmp_path / "abc.json").write_text(json.dumps(state))
+        seen = []
+
+        def run(params, job):
+            seen.append(job.start_row)
+            return {}
+
+        manager = JobManager(run, str(tmp_path))
+        manager.resume_pending()
+        assert _wait_for(manager.get("abc")) == "succeeded"
+        assert seen == [40]
+
+
+class TestUploader:
+    """Tests for columnar payloads and the retrying batch uploader"""
+
+    def test_build_payloads_columnar(self, sample_dataframe):
+        """Test payloads are built column-wise with None for missing columns and NaN"""
+        df = sample_dataframe.drop(columns=["pali_paragraph_ascii"])
+        df.loc[1, "translation_paragraph"] = None
+        payloads = build_payloads(df, ["doc_id", "pali_paragraph_ascii", "translation_paragraph"])
+        assert payloads[0] == {"doc_id": "doc_1", "pali_paragraph_ascii": None, "translation_paragraph": "Translation 1"}
+        assert payloads[1]["translation_paragraph"] is None
+
+    @staticmethod
+    def _client(fail_times):
+        """Mock client whose batch reports an error for doc_2 the first `fail_times` flushes"""
+        client = MagicMock()
+        batch = MagicMock()
+        client.batch.__enter__ = Mock(return_value=batch)
+        client.batch.__exit__ = Mock(return_value=False)
+        state = {"flushes": 0}
+
+        def flush():
+            state["flushes"] += 1
+            callback = client.batch.configure.call_args.kwargs["callback"]
+            if state["flushes"] <= fail_times:
+                callback([{"id": stable_uuid("doc_2"), "result": {"errors": {"error": [{"message": "timeout"}]}}}])
+        batch.flush.side_effect = flush
+        return client, batch
+
+    def test_failed_objects_are_retried(self):
+        """Test that an object failing once is re-added and ends without errors"""
+        client, batch = self._client(fail_times=1)
+        payloads = [{"doc_id": "doc_1"}, {"doc_id": "doc_2"}]
+        with BatchUploader(client, CLASS, backoff=0) as up:
+            up.add(payloads, [[0.1], [0.2]])
+        assert batch.add_data_object.call_count == 3
+        assert up.errors == {}
+        assert up.stats()["retried"] == 1
+
+    def test_persistent_failures_are_reported(self):
+        """Test that objects failing beyond max_retries are collected, not dropped"""
+        client, batch = self._client(fail_times=99)
+        with BatchUploader(client, CLASS, max_retries=2, backoff=0) as up:
+            up.add([{"doc_id": "doc_1"}, {"doc_id": "doc_2"}], [[0.1], [0.2]])
+        assert up.error_list() == [{"doc_id": "doc_2", "error": "timeout"}]
+        assert up.stats()["failed"] == 1
+
+
+class TestEncodePool:
+    """Tests for the multi-process bulk encoder"""
+
+    def test_pool_matches_in_process_order(self):
+        """Test that sharded multi-process encoding reassembles vectors in input order"""
+        texts = [f"paragraph {i}" for i in range(25)]
+        with EncodePool(MODEL_NAME, 2, threads=1, shard_size=4) as pool:
+            vecs = pool.encode(texts)
+            assert pool.stats()["rows"] == 25
+        assert vecs.shape == (25, 768)
+        assert vecs.dtype == np.float32
+        np.testing.assert_array_almost_equal(vecs, encode_list(texts), decimal=5)
+
+    def test_warmup_reaches_every_worker(self):
+        """Test that warmup returns only once each worker process has loaded its model"""
+        with EncodePool(MODEL_NAME, 3, threads=1) as pool:
+            pids = pool.warmup(timeout=120)
+        assert len(set(pids)) == 3
+
+
+class TestBackends:
+    """Tests for backend selection and the fp32 parity check"""
+
+    DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+    def test_unknown_backend_rejected(self):
+        """Test that an unknown EMBED_BACKEND fails loudly"""
+        with pytest.raises(ValueError, match="Unknown EMBED_BACKEND"):
+            load_encoder(MODEL_NAME, "fp8")
+
+    def test_parity_texts_from_bundled_csvs(self):
+        """Test that parity texts are sampled from the bundled CSVs"""
+        texts = parity_texts(self.DATA_DIR, 50)
+        assert len(texts) == 50
+        assert all(isinstance(t, str) and t.strip() for t in texts)
+        assert parity_texts(self.DATA_DIR, 0) == []
+
+    def test_parity_passes_for_matching_vectors(self, sample_texts):
+        """Test that a backend agreeing with fp32 is accepted and reported"""
+        ref = Mock()
+        ref.encode.side_effect = lambda texts, **kw: encode_list(texts)
+        report = check_parity(ref, MODEL_NAME, "int8", sample_texts, 0.98, reference=ref)
+        assert report["checked"] is True
+        assert report["mean_cosine"] == pytest.approx(1.0, abs=1e-4)
+
+    def test_parity_refuses_to_serve_below_threshold(self, sample_texts):
+        """Test that a disagreeing backend raises instead of serving"""
+        ref = Mock()
+        ref.encode.side_effect = lambda texts, **kw: encode_list(texts)
+        bad = Mock()
+        bad.encode.side_effect = lambda texts, **kw: encode_list([t[::-1] for t in texts])
+        with pytest.raises(RuntimeError, match="refusing to serve"):
+            check_parity(bad, MODEL_NAME, "onnx", sample_texts, 0.98, reference=ref)
+
+    def test_fp32_backend_is_not_checked(self):
+        """Test that the reference backend skips the parity check"""
+        assert check_parity(None, MODEL_NAME, "torch", ["x"], 0.98)["checked"] is False
+
+
+class TestShards:
+    """Tests for the embed-to-shards stage and the shard loader"""
+
+    @pytest.fixture
+    def shard_env(self, sample_dataframe, tmp_path):
+        parquet = str(tmp_path / "normalized.parquet")
+        sample_dataframe.to_parquet(parquet)
+        return parquet, str(tmp_path / "shards")
+
+    def test_embed_writes_memmapped_shards(self, shard_env):
+        """Test that shards pair a float16 .npy with a doc_id sidecar and model metadata"""
+        parquet, out = shard_env
+        stats = embed_to_shards(parse_args(["--parquet", parquet, "--out", out, "--shard-rows", "2", "--dtype", "float16"]))
+        assert (stats["shards"], stats["vectors"], stats["source_rows"]) == (2, 3, 3)
+
+        shards = ShardSet(out)
+        assert shards.meta["model_id"] == MODEL_NAME
+        assert shards.meta["dim"] == 768
+        vecs, side = shards.read(shards.shards()[0])
+        assert isinstance(vecs, np.memmap) and vecs.dtype == np.float16
+        assert side["doc_id"].tolist() == ["doc_1", "doc_2"]
+        np.testing.assert_allclose(vecs[0], encode_list(["Pali text 1 Translation 1"])[0], atol=1e-3)
+
+    def test_embed_resumes_and_guards_settings(self, shard_env):
+        """Test that a re-run resumes and other settings need --overwrite"""
+        parquet, out = shard_env
+        embed_to_shards(parse_args(["--parquet", parquet, "--out", out, "--shard-rows", "2"]))
+        with patch("services.embedding.embed_shards.encode_bucketed") as enc:
+            embed_to_shards(parse_args(["--parquet", parquet, "--out", out, "--shard-rows", "2"]))
+        enc.assert_not_called()
+        with pytest.raises(SystemExit):
+            embed_to_shards(parse_args(["--parquet", parquet, "--out", out, "--shard-rows", "2", "--dtype", "float16"]))
+
+    def test_load_shards_into_weaviate(self, shard_env):
+        """Test that the loader uploads every vector with /index UUIDs and writes the manifest"""
+        parquet, out = shard_env
+        embed_to_shards(parse_args(["--parquet", parquet, "--out", out, "--shard-rows", "2"]))
+        weaviate_client = MagicMock()
+        batch = MagicMock()
+        weaviate_client.batch.__enter__ = Mock(return_value=batch)
+        weaviate_client.batch.__exit__ = Mock(return_value=False)
+        manifest_path = manifest_path_for(parquet)
+
+        with patch("services.embedding.load_shards.ensure_schema"):
+            result = load_shards(weaviate_client, ShardSet(out), manifest_path=manifest_path)
+
+        calls = [c.kwargs for c in batch.add_data_object.call_args_list]
+        assert [c["uuid"] for c in calls] == [window_uuid(d, 0) for d in ("doc_1", "doc_2", "doc_3")]
+        assert calls[0]["data_object"]["window"] == 0
+        assert len(calls[0]["vector"]) == 768
+        assert result["errors"] == []
+        assert len(IndexManifest.load(manifest_path)) == 3
+
+    def test_load_shards_merges_existing_manifest(self, shard_env):
+        """Test that the loader keeps manifest entries of other doc_ids and deletes windows a doc lost"""
+        parquet, out = shard_env
+        embed_to_shards(parse_args(["--parquet", parquet, "--out", out, "--shard-rows", "2"]))
+        weaviate_client = MagicMock()
+        weaviate_client.batch.__enter__ = Mock(return_value=MagicMock())
+        weaviate_client.batch.__exit__ = Mock(return_value=False)
+        manifest_path = manifest_path_for(parquet)
+        IndexManifest(manifest_path, {"doc_1": "old", "doc_9": "h9"}, {"doc_1": 3, "doc_9": 2}).save()
+
+        with patch("services.embedding.load_shards.ensure_schema"):
+            result = load_shards(weaviate_client, ShardSet(out), manifest_path=manifest_path)
+
+        manifest = IndexManifest.load(manifest_path)
+        assert sorted(manifest.entries) == ["doc_1", "doc_2", "doc_3", "doc_9"]
+        assert manifest.get("doc_1") != "old" and manifest.window_count("doc_1") == 1
+        assert (manifest.get("doc_9"), manifest.window_count("doc_9")) == ("h9", 2)
+        deleted = [c.kwargs["uuid"] for c in weaviate_client.data_object.delete.call_args_list]
+        assert deleted == [window_uuid("doc_1", 1), window_uuid("doc_1", 2)]
+        assert result["deleted"] == 2
+
+
+class TestSnapshot:
+    """Tests for cursor-paged snapshot and concurrent restore"""
+
+    SCHEMA = {
+        "class": CLASS, "vectorizer": "none", "vectorIndexType": "hnsw", "shardingConfig": {"actualCount": 1},
+        "properties": [
+            {"name": "doc_id", "dataType": ["text"], "indexInverted": True},
+            {"name": "window", "dataType": ["int"], "indexInverted": True},
+        ],
+    }
+
+    @staticmethod
+    def _objects(n):
+        return [{"doc_id": f"doc_{i}", "window": None if i == 2 else 0,
+                 "_additional": {"id": str(uuid.uuid5(uuid.NAMESPACE_DNS, f"doc_{i}")), "vector": [float(i)] * 4}}
+                for i in range(n)]
+
+    def _source(self, objs, page_size):
+        client = MagicMock()
+        client.schema.get.return_value = self.SCHEMA
+        pages = [objs[i:i + page_size] for i in range(0, len(objs), page_size)] + [[]]
+        query = MagicMock()
+        for m in ("with_additional", "with_limit", "with_after"):
+            getattr(query, m).return_value = query
+        query.do.side_effect = [{"data": {"Get": {CLASS: p}}} for p in pages]
+        client.query.get.return_value = query
+        return client, query
+
+    def test_snapshot_pages_with_cursor(self, tmp_path):
+        """Test that the snapshot follows the `after` cursor and writes vectors + sidecar files"""
+        objs = self._objects(5)
+        client, query = self._source([dict(o, _additional=dict(o["_additional"])) for o in objs], page_size=2)
+        result = create_snapshot(client, str(tmp_path / "snap"), page_size=2, file_rows=3)
+
+        assert [c.args[0] for c in query.with_after.call_args_list] == [objs[i]["_additional"]["id"] for i in (1, 3, 4)]
+        assert (result["shards"], result["vectors"]) == (2, 5)
+        shards = ShardSet(str(tmp_path / "snap"))
+        assert "shardingConfig" not in shards.meta["schema"]
+        vecs, side = shards.read(shards.shards()[0])
+        assert side["uuid"].tolist()[0] == objs[0]["_additional"]["id"]
+        assert vecs.dtype == np.float32 and vecs.shape == (4, 4)  # two pages joined into one file
+        np.testing.assert_array_equal(vecs[1], [1.0] * 4)
+
+    def test_restore_recreates_class_and_imports(self, tmp_path):
+        """Test that restore creates the class from the snapshot and re-imports objects with their UUIDs"""
+        objs = self._objects(3)
+        source, _ = self._source([dict(o, _additional=dict(o["_additional"])) for o in objs], page_size=10)
+        create_snapshot(source, str(tmp_path / "snap"), page_size=10)
+
+        target = MagicMock()
+        target.schema.get.return_value = {"classes": []}
+        batch = MagicMock()
+        target.batch.__enter__ = Mock(return_value=batch)
+        target.batch.__exit__ = Mock(return_value=False)
+        result = restore_snapshot(target, str(tmp_path / "snap"), workers=2)
+
+        target.schema.create_class.assert_called_once()
+        assert target.batch.configure.call_args.kwargs["num_workers"] == 2
+        calls = [c.kwargs for c in batch.add_data_object.call_args_list]
+        assert [c["uuid"] for c in calls] == [o["_additional"]["id"] for o in objs]
+        assert calls[0]["data_object"] == {"doc_id": "doc_0", "window": 0}
+        assert isinstance(calls[0]["data_object"]["window"], int)
+        assert calls[2]["data_object"]["window"] is None
+        assert result["vectors"] == 3
+
+
 class TestHealthEndpoint:
     """Tests for /health endpoint"""
 
@@ -270,8 +896,9 @@ class TestIndexEndpoint:
             sample_dataframe.to_parquet(tmp.name)
             yield tmp.name
         # Cleanup
-        if os.path.exists(tmp.name):
-            os.remove(tmp.name)
+        for path in (tmp.name, manifest_path_for(tmp.name)):
+            if os.path.exists(path):
+                os.remove(path)
 
     @patch("services.embedding.main.weaviate.Client")
     @patch("services.embedding.main.ensure_schema")
@@ -302,6 +929,30 @@ class TestIndexEndpoint:
         assert data["count"] == 3
         assert data["vector"] == "multilingual"
 
+    @patch("services.embedding.main.weaviate.Client")
+    @patch("services.embedding.main.ensure_schema")
+    def test_index_runs_batch_on_their_own_clients(
+        self, mock_ensure_schema, mock_weaviate_client, client, temp_parquet_file
+    ):
+        """Test that each index run uploads through its own client, never the shared one"""
+        made = []
+
+        def make_client(*args, **kwargs):
+            c = MagicMock()
+            c.batch.__enter__ = Mock(return_value=MagicMock())
+            c.batch.__exit__ = Mock(return_value=False)
+            made.append(c)
+            return c
+        mock_weaviate_client.side_effect = make_client
+
+        for _ in range(2):
+            response = client.post("/index", json={"parquet_path": temp_parquet_file, "full_reindex": True})
+            assert response.status_code == 200
+
+        batching = [c for c in made if c.batch.__enter__.called]
+        assert len(batching) == 2
+        assert get_client() not in batching
+
     @patch("services.embedding.main.weaviate.Client")
     @patch("services.embedding.main.ensure_schema")
     def test_index_calls_ensure_schema(
@@ -338,8 +989,10 @@ class TestIndexEndpoint:
             json={"parquet_path": temp_parquet_file},
         )
 
-        # Verify batch_size was set
-        assert mock_batch.batch_size == 256
+        # Verify dynamic, concurrent batching was configured
+        configure = mock_client_instance.batch.configure.call_args.kwargs
+        assert configure["dynamic"] is True
+        assert configure["num_workers"] >= 1
         # Verify add_data_object was called 3 times (for 3 rows)
         assert mock_batch.add_data_object.call_count == 3
 
@@ -368,6 +1021,220 @@ class TestIndexEndpoint:
         expected_uuid_1 = str(uuid.uuid5(uuid.NAMESPACE_DNS, "doc_1"))
         assert uuids_used[0] == expected_uuid_1
 
+    @patch("services.embedding.main.weaviate.Client")
+    @patch("services.embedding.main.ensure_schema")
+    def test_index_streams_in_batch_size_chunks(
+        self, mock_ensure_schema, mock_weaviate_client, client, temp_parquet_file
+    ):
+        """Test that IndexBody.batch_size drives chunked encoding and every row is uploaded"""
+        mock_client_instance = MagicMock()
+        mock_weaviate_client.return_value = mock_client_instance
+        mock_batch = MagicMock()
+        mock_client_instance.batch.__enter__ = Mock(return_value=mock_batch)
+        mock_client_instance.batch.__exit__ = Mock(return_value=False)
+        get_vector_cache().clear()
+
+        with patch("services.embedding.main.encode_list", wraps=encode_list) as spy:
+            response = client.post(
+                "/index",
+                json={"parquet_path": temp_parquet_file, "batch_size": 2},
+            )
+
+        assert response.json()["count"] == 3
+        assert [len(c.args[0]) for c in spy.call_args_list] == [2, 1]
+        doc_ids = [c.kwargs["data_object"]["doc_id"] for c in mock_batch.add_data_object.call_args_list]
+        assert doc_ids == ["doc_1", "doc_2", "doc_3"]
+
+    @patch("services.embedding.main.weaviate.Client")
+    @patch("services.embedding.main.ensure_schema")
+    @patch("services.embedding.main.INDEX_PROCESSES", 2)
+    @patch("services.embedding.main.get_encode_pool")
+    def test_index_uses_pool_when_configured(
+        self, mock_get_pool, mock_ensure_schema, mock_weaviate_client, client, temp_parquet_file
+    ):
+        """Test that /index encodes through the pool when EMBED_INDEX_PROCESSES > 1"""
+        mock_client_instance = MagicMock()
+        mock_weaviate_client.return_value = mock_client_instance
+        mock_client_instance.batch.__enter__ = Mock(return_value=MagicMock())
+        mock_client_instance.batch.__exit__ = Mock(return_value=False)
+        mock_get_pool.return_value.encode.side_effect = encode_list
+        get_vector_cache().clear()
+
+        response = client.post("/index", json={"parquet_path": temp_parquet_file})
+
+        assert response.json()["encoded"] == 3
+        mock_get_pool.return_value.encode.assert_called_once()
+
+    @patch("services.embedding.main.weaviate.Client")
+    @patch("services.embedding.main.ensure_schema")
+    def test_index_incremental_with_manifest(
+        self, mock_ensure_schema, mock_weaviate_client, client, temp_parquet_file, sample_dataframe
+    ):
+        """Test that re-indexing only touches new/changed rows and deletes vanished ones"""
+        mock_ensure_schema.return_value = False  # class already exists
+        mock_client_instance = MagicMock()
+        mock_weaviate_client.return_value = mock_client_instance
+        mock_batch = MagicMock()
+        mock_client_instance.batch.__enter__ = Mock(return_value=mock_batch)
+        mock_client_instance.batch.__exit__ = Mock(return_value=False)
+
+        first = client.post("/index", json={"parquet_path": temp_parquet_file}).json()
+        assert (first["added"], first["updated"], first["skipped"], first["deleted"]) == (3, 0, 0, 0)
+
+        mock_batch.add_data_object.reset_mock()
+        second = client.post("/index", json={"parquet_path": temp_parquet_file}).json()
+        assert (second["added"], second["updated"], second["skipped"], second["deleted"]) == (0, 0, 3, 0)
+        assert mock_batch.add_data_object.call_count == 0
+
+        # typo fix in doc_2, doc_3 removed, doc_4 added
+        df = sample_dataframe.copy()
+        df.loc[1, "multilingual_concat"] = "Pali text 2 Translation 2 (fixed)"
+        df = pd.concat([df.iloc[:2], df.iloc[[2]].assign(doc_id="doc_4")], ignore_index=True)
+        df.to_parquet(temp_parquet_file)
+
+        mock_batch.add_data_object.reset_mock()
+        third = client.post("/index", json={"parquet_path": temp_parquet_file}).json()
+        assert (third["added"], third["updated"], third["skipped"], third["deleted"]) == (1, 1, 1, 1)
+        uploaded = [c.kwargs["data_object"]["doc_id"] for c in mock_batch.add_data_object.call_args_list]
+        assert uploaded == ["doc_2", "doc_4"]
+        mock_client_instance.data_object.delete.assert_called_once_with(
+            uuid=str(uuid.uuid5(uuid.NAMESPACE_DNS, "doc_3")), class_name=CLASS
+        )
+
+        full = client.post("/index", json={"parquet_path": temp_parquet_file, "full_reindex": True}).json()
+        assert (full["added"], full["updated"], full["skipped"]) == (0, 3, 0)
+
+    @patch("services.embedding.main.weaviate.Client")
+    @patch("services.embedding.main.ensure_schema")
+    def test_full_reindex_still_deletes_vanished_docs(
+        self, mock_ensure_schema, mock_weaviate_client, client, temp_parquet_file, sample_dataframe
+    ):
+        """Test that full_reindex (or a recreated class) re-uploads everything but still deletes dropped doc_ids"""
+        from weaviate.exceptions import UnexpectedStatusCodeError
+        mock_ensure_schema.return_value = False
+        mock_client_instance = MagicMock()
+        mock_weaviate_client.return_value = mock_client_instance
+        client.post("/index", json={"parquet_path": temp_parquet_file})
+
+        sample_dataframe.iloc[:2].to_parquet(temp_parquet_file)  # doc_3 dropped
+        full = client.post("/index", json={"parquet_path": temp_parquet_file, "full_reindex": True}).json()
+        assert (full["updated"], full["deleted"]) == (2, 1)
+        mock_client_instance.data_object.delete.assert_called_once_with(
+            uuid=str(uuid.uuid5(uuid.NAMESPACE_DNS, "doc_3")), class_name=CLASS
+        )
+
+        # class recreated: the object is already gone from Weaviate (404), which is not an error
+        sample_dataframe.iloc[:1].to_parquet(temp_parquet_file)
+        mock_ensure_schema.return_value = True
+        mock_client_instance.data_object.delete.side_effect = UnexpectedStatusCodeError(
+            "Delete object", Mock(status_code=404, json=Mock(return_value={}), text=""))
+        fresh = client.post("/index", json={"parquet_path": temp_parquet_file}).json()
+        assert (fresh["updated"], fresh["deleted"]) == (1, 1)
+
+    @patch("services.embedding.main.weaviate.Client")
+    @patch("services.embedding.main.ensure_schema")
+    def test_index_bumps_version_only_on_changes(
+        self, mock_ensure_schema, mock_weaviate_client, client, temp_parquet_file, index_version_file
+    ):
+        """Test that /index bumps the shared index version when objects change, not on no-op runs"""
+        mock_ensure_schema.return_value = False
+        mock_weaviate_client.return_value = MagicMock()
+        assert read_index_version(index_version_file) == 0
+
+        first = client.post("/index", json={"parquet_path": temp_parquet_file}).json()
+        assert first["index_version"] > 0
+        assert read_index_version(index_version_file) == first["index_version"]
+
+        second = client.post("/index", json={"parquet_path": temp_parquet_file}).json()
+        assert second["skipped"] == 3
+        assert second["index_version"] == first["index_version"]
+
+        bumped = bump_index_version(index_version_file, "test")
+        assert bumped > first["index_version"]
+
+    @patch("services.embedding.main.weaviate.Client")
+    @patch("services.embedding.main.ensure_schema")
+    @patch("services.embedding.main.WINDOW_TOKENS", 8)
+    def test_index_windows_long_paragraphs(
+        self, mock_ensure_schema, mock_weaviate_client, client, temp_parquet_file, sample_dataframe
+    ):
+        """Test that long paragraphs upload one object per window and shrinking deletes stale windows"""
+        mock_ensure_schema.return_value = False
+        mock_client_instance = MagicMock()
+        mock_weaviate_client.return_value = mock_client_instance
+        mock_batch = MagicMock()
+        mock_client_instance.batch.__enter__ = Mock(return_value=mock_batch)
+        mock_client_instance.batch.__exit__ = Mock(return_value=False)
+        df = sample_dataframe.copy()
+        df.loc[0, "multilingual_concat"] = " ".join(f"w{i}" for i in range(14))  # 6-token windows, step 4 -> 3 windows
+        df.to_parquet(temp_parquet_file)
+
+        with patch("services.embedding.main.WINDOW_OVERLAP", 2):
+            first = client.post("/index", json={"parquet_path": temp_parquet_file}).json()
+            objs = [c.kwargs for c in mock_batch.add_data_object.call_args_list]
+            doc1 = [o for o in objs if o["data_object"]["doc_id"] == "doc_1"]
+            assert [o["data_object"]["window"] for o in doc1] == [0, 1, 2]
+            assert {o["data_object"]["windows"] for o in doc1} == {3}
+            assert [o["uuid"] for o in doc1] == [window_uuid("doc_1", k) for k in range(3)]
+            assert first["windowed"] == 1
+
+            df.loc[0, "multilingual_concat"] = "now short"
+            df.to_parquet(temp_parquet_file)
+            second = client.post("/index", json={"parquet_path": temp_parquet_file}).json()
+        assert second["updated"] == 1
+        deleted = {c.kwargs["uuid"] for c in mock_client_instance.data_object.delete.call_args_list}
+        assert deleted == {window_uuid("doc_1", 1), window_uuid("doc_1", 2)}
+
+    @patch("services.embedding.main.weaviate.Client")
+    @patch("services.embedding.main.ensure_schema")
+    @patch("services.embedding.main.WINDOW_TOKENS", 8)
+    @patch("services.embedding.main.WINDOW_OVERLAP", 2)
+    def test_full_reindex_deletes_stale_windows(
+        self, mock_ensure_schema, mock_weaviate_client, client, temp_parquet_file, sample_dataframe
+    ):
+        """Test that a paragraph that shrank loses its extra windows under full_reindex too"""
+        mock_ensure_schema.return_value = False
+        mock_client_instance = MagicMock()
+        mock_weaviate_client.return_value = mock_client_instance
+        df = sample_dataframe.copy()
+        df.loc[0, "multilingual_concat"] = " ".join(f"w{i}" for i in range(14))  # 3 windows
+        df.to_parquet(temp_parquet_file)
+        client.post("/index", json={"parquet_path": temp_parquet_file})
+
+        df.loc[0, "multilingual_concat"] = "now short"
+        df.to_parquet(temp_parquet_file)
+        client.post("/index", json={"parquet_path": temp_parquet_file, "full_reindex": True})
+        deleted = {c.kwargs["uuid"] for c in mock_client_instance.data_object.delete.call_args_list}
+        assert deleted == {window_uuid("doc_1", 1), window_uuid("doc_1", 2)}
+
+    @patch("services.embedding.main.weaviate.Client")
+    @patch("services.embedding.main.ensure_schema")
+    def test_index_job_api(
+        self, mock_ensure_schema, mock_weaviate_client, client, temp_parquet_file
+    ):
+        """Test submitting an index job and polling it to completion"""
+        mock_client_instance = MagicMock()
+        mock_weaviate_client.return_value = mock_client_instance
+        mock_batch = MagicMock()
+        mock_client_instance.batch.__enter__ = Mock(return_value=mock_batch)
+        mock_client_instance.batch.__exit__ = Mock(return_value=False)
+
+        submitted = client.post("/jobs/index", json={"parquet_path": temp_parquet_file, "batch_size": 2}).json()
+        assert submitted["status"] in ("queued", "running", "succeeded")
+        _wait_for(get_jobs().get(submitted["job_id"]))
+
+        data = client.get(f"/jobs/{submitted['job_id']}").json()
+        assert data["status"] == "succeeded"
+        assert data["rows_total"] == 3
+        assert data["rows_uploaded"] == 3
+        assert data["result"]["count"] == 3
+        assert mock_batch.flush.call_count >= 2  # every chunk is flushed before its checkpoint
+
+    def test_unknown_job_404(self, client):
+        """Test that unknown job ids return 404"""
+        assert client.get("/jobs/nope").status_code == 404
+        assert client.post("/jobs/nope/cancel").status_code == 404
+
     def test_index_invalid_parquet_path(self, client):
         """Test indexing with invalid parquet path"""
         response = client.post(
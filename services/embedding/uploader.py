@@ -0,0 +1,139 @@
+# services/embedding/uploader.py
+import time
+import uuid
+import threading
+import pandas as pd
+
+def stable_uuid(doc_id) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, str(doc_id)))
+
+def build_payloads(df: pd.DataFrame, columns: list[str]) -> list[dict]:
+    """
+    Column-wise payload construction: one `tolist()` per column and a single zip
+    over rows, instead of per-row `df.loc` lookups. Missing columns and NaN become None.
+    """
+    n = len(df)
+    cols = []
+    for c in columns:
+        if c in df.columns:
+            s = df[c]
+            cols.append(s.astype(object).where(s.notna(), None).tolist())
+        else:
+            cols.append([None] * n)
+    return [dict(zip(columns, row)) for row in zip(*cols)]
+
+class BatchUploader:
+    """
+    Concurrent, retrying upload into one Weaviate class on top of the v3 client batch:
+
+      - `num_workers` concurrent batch requests with dynamic batch sizing; the client
+        blocks `add_data_object` while all workers are busy, which back-pressures the
+        encoder through the bounded prefetch queue.
+      - per-object errors are collected from the batch callback; failed objects are
+        re-added with exponential backoff up to `max_retries`, and whatever still
+        fails is kept in `errors` (never silently dropped).
+
+    Use as a context manager; `add()` uploads one chunk and returns once it is flushed.
+    """
+
+    def __init__(self, client, class_name: str, batch_size: int = 100, num_workers: int = 4,
+                 max_retries: int = 3, backoff: float = 0.5, timeout_retries: int = 3):
+        self.client = client
+        self.class_name = class_name
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout_retries = timeout_retries
+        self.errors: dict[str, dict] = {}  # uuid -> {"doc_id", "error"}
+        self.sent = 0
+        self.retried = 0
+        self._pending: dict[str, tuple] = {}  # uuid -> (payload, vector) of the chunk in flight
+        self._failed: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._batch = None
+        self._t0 = None
+
+    def __enter__(self) -> "BatchUploader":
+        self.client.batch.configure(
+            batch_size=self.batch_size,
+            dynamic=True,
+            num_workers=self.num_workers,
+            timeout_retries=self.timeout_retries,
+            connection_error_retries=self.timeout_retries,
+            callback=self._on_results,
+        )
+        self._batch = self.client.batch.__enter__()
+        self._t0 = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            self.client.batch.__exit__(exc_type, exc, tb)
+        return False
+
+    def _on_results(self, results):
+        # called by the client's worker threads after every batch request
+        if not results:
+            return
+        with self._lock:
+            for r in results:
+                errs = ((r.get("result") or {}).get("errors") or {}).get("error")
+                if errs:
+                    self._failed[str(r.get("id"))] = "; ".join(e.get("message", "") for e in errs)
+
+    def _add_one(self, obj_uuid: str, payload: dict, vector):
+        self._batch.add_data_object(
+            data_object=payload,
+            class_name=self.class_name,
+            uuid=obj_uuid,
+            vector=vector,
+        )
+
+    def add(self, payloads: list[dict], vectors, uuids: list[str] | None = None):
+        uuids = uuids or [stable_uuid(p["doc_id"]) for p in payloads]
+        for u, p, v in zip(uuids, payloads, vectors):
+            self._pending[u] = (p, v)
+            self._add_one(u, p, v)
+        self.sent += len(payloads)
+        self.flush()
+
+    def flush(self):
+        """Flush the batch, then retry failed objects with backoff until clean or out of retries."""
+        self._batch.flush()
+        attempt = 0
+        while True:
+            with self._lock:
+                failed, self._failed = self._failed, {}
+            if not failed:
+                break
+            retry = [u for u in failed if u in self._pending]
+            if attempt >= self.max_retries or not retry:
+                for u, e in failed.items():
+                    payload = self._pending.get(u, ({}, None))[0]
+                    doc_id = payload.get("doc_id") or self.errors.get(u, {}).get("doc_id")
+                    self.errors[u] = {"doc_id": doc_id, "error": e}
+                break
+            attempt += 1
+            time.sleep(self.backoff * (2 ** (attempt - 1)))
+            print(f"[upload] retrying {len(retry)} failed objects (attempt {attempt}/{self.max_retries})")
+            for u in retry:
+                self._add_one(u, *self._pending[u])
+            self.retried += len(retry)
+            self._batch.flush()
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        elapsed = max(1e-6, time.time() - (self._t0 or time.time()))
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": len(self.errors),
+            "objects_per_sec": round(self.sent / elapsed, 1),
+        }
+
+    def error_list(self, limit: int = 20) -> list[dict]:
+        return list(self.errors.values())[:limit]
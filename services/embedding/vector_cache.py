@@ -0,0 +1,209 @@
+# services/embedding/vector_cache.py
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+_WS = re.compile(r"\s+")
+_DIGEST = 20  # sha1
+
+def normalize_key(text: str, casefold: bool = True) -> str:
+    """NFC + collapsed whitespace (+ casefold) so trivially different queries share an entry."""
+    s = _WS.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+    return s.casefold() if casefold else s
+
+def _slug(model_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", model_id)
+
+class VectorCache:
+    """
+    Two-tier vector cache keyed by sha1(model_id + normalized text).
+
+      - hot tier: in-memory LRU of float32 vectors, bounded by `hot_bytes`
+      - disk tier: memory-mapped .npy slab (float32/float16) plus an index .npy
+        holding (digest, last-used tick) per slot, bounded by `max_bytes`
+
+    The disk tier lives under `path/<model slug>/` and is reopened on restart,
+    so repeat queries skip the model after a container restart. Slots are
+    self-describing (the digest is stored next to the vector), so a stale index
+    can never hand back another text's vector. `path=None` keeps it in memory only.
+    """
+
+    def __init__(self, path, model_id: str, dim: int, dtype: str = "float32",
+                 max_bytes: int = 256 * 1024 * 1024, hot_bytes: int = 16 * 1024 * 1024,
+                 casefold: bool = True, flush_every: int = 256):
+        self.model_id = model_id
+        self.dim = int(dim)
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported cache dtype: {dtype}")
+        self.casefold = casefold
+        self.flush_every = max(1, int(flush_every))
+        self.row_bytes = self.dim * self.dtype.itemsize
+        self.capacity = int(max_bytes) // self.row_bytes if path else 0
+        self.hot_capacity = max(0, int(hot_bytes) // (self.dim * 4))
+        self.dir = os.path.join(path, _slug(model_id)) if path else None
+
+        self._lock = threading.Lock()
+        self._hot: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._slots: "OrderedDict[bytes, int]" = OrderedDict()  # LRU order, oldest first
+        self._free: list[int] = []
+        self._tick = 0
+        self._dirty = 0
+        self._vectors = None
+        self._index = None
+        self.counters = {"hot_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "hot_evictions": 0, "puts": 0}
+        if self.capacity > 0:
+            self._open()
+
+    # ---- keys ----
+    def key(self, text: str) -> bytes:
+        norm = normalize_key(text, self.casefold)
+        return hashlib.sha1(f"{self.model_id}\x00{norm}".encode("utf-8")).digest()
+
+    # ---- disk tier ----
+    def _meta(self) -> dict:
+        return {"model_id": self.model_id, "dim": self.dim, "dtype": self.dtype.name, "capacity": self.capacity}
+
+    def _open(self):
+        os.makedirs(self.dir, exist_ok=True)
+        meta_path = os.path.join(self.dir, "meta.json")
+        vec_path = os.path.join(self.dir, "vectors.npy")
+        idx_path = os.path.join(self.dir, "index.npy")
+        idx_dtype = np.dtype([("digest", "u1", (_DIGEST,)), ("tick", "<u8")])
+
+        meta = None
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        reuse = meta == self._meta() and os.path.exists(vec_path) and os.path.exists(idx_path)
+
+        if reuse:
+            self._vectors = np.lib.format.open_memmap(vec_path, mode="r+")
+            self._index = np.lib.format.open_memmap(idx_path, mode="r+")
+            used = self._index["digest"].any(axis=1)
+            slots = np.flatnonzero(used)
+            order = slots[np.argsort(self._index["tick"][slots], kind="stable")]
+            for s in order:
+                self._slots[self._index["digest"][s].tobytes()] = int(s)
+            self._free = np.flatnonzero(~used)[::-1].tolist()
+            self._tick = int(self._index["tick"].max()) + 1 if len(self._index) else 0
+            print(f"[vector-cache] reopened {len(self._slots)} entries from {self.dir}")
+        else:
+            # model / dim / dtype / budget changed (or first run): start a fresh slab
+            self._vectors = np.lib.format.open_memmap(vec_path, mode="w+", dtype=self.dtype, shape=(self.capacity, self.dim))
+            self._index = np.lib.format.open_memmap(idx_path, mode="w+", dtype=idx_dtype, shape=(self.capacity,))
+            self._free = list(range(self.capacity - 1, -1, -1))
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(self._meta(), f)
+            os.replace(meta_path + ".tmp", meta_path)
+
+    def _disk_get(self, k: bytes):
+        slot = self._slots.get(k)
+        if slot is None:
+            return None
+        self._slots.move_to_end(k)
+        self._index["tick"][slot] = self._tick
+        self._tick += 1
+        return np.array(self._vectors[slot], dtype=np.float32)
+
+    def _disk_put(self, k: bytes, vec: np.ndarray):
+        if k in self._slots:
+            self._disk_get(k)  # refresh recency only
+            return
+        if self._free:
+            slot = self._free.pop()
+        else:
+            _, slot = self._slots.popitem(last=False)
+            self.counters["evictions"] += 1
+        self._index["digest"][slot] = 0  # invalidate before overwriting the vector
+        self._vectors[slot] = vec.astype(self.dtype, copy=False)
+        self._index[slot] = (np.frombuffer(k, dtype=np.uint8), self._tick)
+        self._tick += 1
+        self._slots[k] = slot
+        self._dirty += 1
+        if self._dirty >= self.flush_every:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._index.flush()
+        self._dirty = 0
+
+    # ---- hot tier ----
+    def _hot_put(self, k: bytes, vec: np.ndarray):
+        if self.hot_capacity == 0:
+            return
+        self._hot[k] = vec
+        self._hot.move_to_end(k)
+        while len(self._hot) > self.hot_capacity:
+            self._hot.popitem(last=False)
+            self.counters["hot_evictions"] += 1
+
+    # ---- public API ----
+    def get(self, text: str):
+        """Return a float32 vector or None."""
+        return self.get_key(self.key(text))
+
+    def put(self, text: str, vec: np.ndarray):
+        self.put_key(self.key(text), vec)
+
+    def get_key(self, k: bytes):
+        with self._lock:
+            vec = self._hot.get(k)
+            if vec is not None:
+                self._hot.move_to_end(k)
+                self.counters["hot_hits"] += 1
+                return vec
+            if self.capacity:
+                vec = self._disk_get(k)
+                if vec is not None:
+                    self._hot_put(k, vec)
+                    self.counters["disk_hits"] += 1
+                    return vec
+            self.counters["misses"] += 1
+            return None
+
+    def put_key(self, k: bytes, vec: np.ndarray):
+        vec = np.asarray(vec, dtype=np.float32)
+        with self._lock:
+            self.counters["puts"] += 1
+            self._hot_put(k, vec)
+            if self.capacity:
+                self._disk_put(k, vec)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def clear(self):
+        with self._lock:
+            self._hot.clear()
+            if self.capacity:
+                self._index["digest"][:] = 0
+                self._slots.clear()
+                self._free = list(range(self.capacity - 1, -1, -1))
+                self._flush_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+            lookups = c["hot_hits"] + c["disk_hits"] + c["misses"]
+            c.update({
+                "hit_rate": round((c["hot_hits"] + c["disk_hits"]) / lookups, 4) if lookups else 0.0,
+                "hot_entries": len(self._hot),
+                "hot_capacity": self.hot_capacity,
+                "disk_entries": len(self._slots),
+                "disk_capacity": self.capacity,
+                "disk_bytes_used": len(self._slots) * self.row_bytes,
+                "disk_bytes_budget": self.capacity * self.row_bytes,
+                "dtype": self.dtype.name,
+                "model_id": self.model_id,
+                "path": self.dir,
+            })
+            return c
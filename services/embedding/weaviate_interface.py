@@ -1,19 +1,28 @@
 # services/embedding/weaviate_interface.py
 import weaviate, os
+from functools import lru_cache
+from uploader import BatchUploader
 
-client = weaviate.Client(
-    url=os.environ.get("WEAVIATE_URL", "http://weaviate:8080"),
-    additional_headers={"X-OpenAI-Api-Key": ""}  # not used
-)
+@lru_cache(maxsize=1)
+def get_client() -> weaviate.Client:
+    # one pooled client per process instead of one per import / call
+    return weaviate.Client(
+        url=os.environ.get("WEAVIATE_URL", "http://weaviate:8080"),
+        additional_headers={"X-OpenAI-Api-Key": ""},  # not used
+        timeout_config=(5, 120),
+    )
 
-def upsert_batch(payloads, vectors_dict, class_name="Paragraph"):
-    with client.batch as batch:
-        batch.batch_size = 256
-        for idx, payload in enumerate(payloads):
-            vec = {name: vectors_dict[name][idx] for name in vectors_dict.keys()}
-            client.batch.add_data_object(
-                data_object=payload,
-                class_name=class_name,
-                uuid=payload["doc_id"],   # stable UUID (string allowed)
-                vectors=vec
-            )
+def upsert_batch(payloads, vectors_dict, class_name="Paragraph", vector_name="multilingual"):
+    """
+    Upload one chunk with the concurrent, retrying BatchUploader.
+    The Paragraph class has a single external vector, so only `vector_name` is sent.
+    Returns the uploader stats and any per-object errors.
+    """
+    uploader = BatchUploader(
+        get_client(), class_name,
+        num_workers=int(os.environ.get("EMBED_UPLOAD_WORKERS", "4")),
+        max_retries=int(os.environ.get("EMBED_UPLOAD_RETRIES", "3")),
+    )
+    with uploader:
+        uploader.add(payloads, vectors_dict[vector_name])
+    return {**uploader.stats(), "errors": uploader.error_list()}
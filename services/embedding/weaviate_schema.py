@@ -12,11 +12,11 @@ def ensure_schema(client: weaviate.Client, named_vectors: bool = False):
       - Optional 'named_vectors' is kept for future use (not enabled in this MVP)
 
     We rely on external embeddings (LaBSE) and Weaviate's BM25 module for hybrid search.
+    Returns True if the class was created (i.e. the index is empty), False if it existed
+    (properties added since it was created are added in place).
     """
     schema = client.schema.get()
-    existing = {c["class"] for c in schema.get("classes", [])}
-    if CLASS in existing:
-        return  # already present
+    existing = {c["class"]: c for c in schema.get("classes", [])}
 
     base_props = [
         {"name": "doc_id", "dataType": ["text"], "indexInverted": True},
@@ -30,8 +30,19 @@ def ensure_schema(client: weaviate.Client, named_vectors: bool = False):
         {"name": "translation_paragraph_ascii", "dataType": ["text"], "indexInverted": True},
 
         {"name": "multilingual_concat", "dataType": ["text"], "indexInverted": True},
+
+        # long paragraphs are stored as overlapping token windows, one object per window
+        {"name": "window", "dataType": ["int"], "indexInverted": True},
+        {"name": "windows", "dataType": ["int"], "indexInverted": False},
     ]
 
+    if CLASS in existing:
+        have = {p["name"] for p in existing[CLASS].get("properties") or []}
+        for prop in base_props:
+            if prop["name"] not in have:
+                client.schema.property.create(CLASS, prop)
+        return False  # already present
+
     class_obj = {
         "class": CLASS,
         "description": "Pali & English paragraphs (external vectors + BM25)",
@@ -48,6 +59,7 @@ def ensure_schema(client: weaviate.Client, named_vectors: bool = False):
     # NOTE: If you later upgrade Weaviate and want named vectors,
     # you'll adapt this to the per-vector "vectorConfig" blocks.
     client.schema.create_class(class_obj)
+    return True
 
 if __name__ == "__main__":
     print("Connecting to Weaviate...")
@@ -0,0 +1,29 @@
+# services/embedding/windows.py
+from services.embedding.uploader import stable_uuid
+
+def window_uuid(doc_id, window: int) -> str:
+    """Window 0 keeps the paragraph's original UUID, so short paragraphs are unchanged."""
+    return stable_uuid(doc_id if window == 0 else f"{doc_id}#w{window}")
+
+def token_windows(tokenizer, text: str, max_tokens: int, overlap: int) -> list[str]:
+    """
+    Split `text` into overlapping windows of at most `max_tokens` model tokens
+    (room is left for [CLS]/[SEP]); each window is cut from the original string at
+    token offsets, so no text is lost or re-tokenized differently. Texts that fit
+    are returned as a single window.
+    """
+    if not text:
+        return [text]
+    width = max(1, max_tokens - 2)
+    enc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = enc["offset_mapping"]
+    if len(offsets) <= width:
+        return [text]
+    step = max(1, width - max(0, min(overlap, width - 1)))
+    out = []
+    for start in range(0, len(offsets), step):
+        end = min(start + width, len(offsets))
+        out.append(text[offsets[start][0]:offsets[end - 1][1]])
+        if end == len(offsets):
+            break
+    return out
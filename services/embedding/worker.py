@@ -1,7 +1,19 @@
 # services/embedding/worker.py
+import os
 import pandas as pd
 from model import LabseEncoder
 from weaviate_interface import upsert_batch
+from uploader import build_payloads
+from encode_pool import EncodePool
+from backends import load_checked_encoder
+
+PAYLOAD_COLUMNS = [
+    "doc_id", "book_id", "para_id",
+    "pali_paragraph", "pali_paragraph_ascii",
+    "english_paragraph", "english_paragraph_ascii",
+    "chinese_paragraph", "russian_paragraph",
+    "multilingual_concat",
+]
 
 def build_multilingual_text(row):
     parts = []
@@ -10,43 +22,36 @@ def build_multilingual_text(row):
             parts.append(row[col])
     return " \n ".join(parts) if parts else ""
 
-def process_parquet(parquet_path: str, batch_size=5000):
+def process_parquet(parquet_path: str, batch_size=5000, processes=None, threads=None):
+    """
+    Encode and upsert a parquet in `batch_size` chunks. With `processes` > 1
+    (default: EMBED_INDEX_PROCESSES), texts are encoded by an EncodePool of that
+    many worker processes instead of a single in-process model.
+    """
     df = pd.read_parquet(parquet_path)
-    enc = LabseEncoder()
-
-    for i in range(0, len(df), batch_size):
-        batch = df.iloc[i:i+batch_size].copy()
+    processes = int(processes or os.environ.get("EMBED_INDEX_PROCESSES", "0"))
+    if processes > 1:
+        backend = os.environ.get("EMBED_BACKEND", "torch")
+        if backend != "torch":
+            # export + parity check once here, before the workers load the backend
+            load_checked_encoder("sentence-transformers/LaBSE", backend)
+        enc = EncodePool("sentence-transformers/LaBSE", processes, threads=threads, backend=backend)
+        enc.warmup()
+    else:
+        enc = LabseEncoder()
 
-        vectors = {}
-        # Create per-language vectors if text exists
-        if "pali_paragraph" in df.columns:
-            vectors["pali"] = enc.encode(batch["pali_paragraph"].fillna("").tolist())
-        if "english_paragraph" in df.columns:
-            vectors["en"] = enc.encode(batch["english_paragraph"].fillna("").tolist())
-        if "chinese_paragraph" in df.columns:
-            vectors["zh"] = enc.encode(batch["chinese_paragraph"].fillna("").tolist())
-        if "russian_paragraph" in df.columns:
-            vectors["ru"] = enc.encode(batch["russian_paragraph"].fillna("").tolist())
+    try:
+        for i in range(0, len(df), batch_size):
+            batch = df.iloc[i:i+batch_size].copy()
 
-        # Multilingual fused
-        ml_texts = batch.apply(build_multilingual_text, axis=1).tolist()
-        vectors["multilingual"] = enc.encode(ml_texts)
+            # Multilingual fused; the Paragraph class holds this single vector, so it is the only one encoded
+            ml_texts = batch.apply(build_multilingual_text, axis=1).tolist()
+            vectors = {"multilingual": enc.encode(ml_texts)}
 
-        payloads = []
-        for j, row in batch.iterrows():
-            payload = {
-                "doc_id": row["doc_id"],
-                "book_id": row["book_id"],
-                "para_id": row["para_id"],
-                "pali_paragraph": row.get("pali_paragraph"),
-                "pali_paragraph_ascii": row.get("pali_paragraph_ascii"),
-                "english_paragraph": row.get("english_paragraph"),
-                "english_paragraph_ascii": row.get("english_paragraph_ascii"),
-                "chinese_paragraph": row.get("chinese_paragraph"),
-                "russian_paragraph": row.get("russian_paragraph"),
-                "multilingual_concat": row.get("multilingual_concat"),
-            }
-            payloads.append(payload)
+            payloads = build_payloads(batch, PAYLOAD_COLUMNS)
 
-        # Upsert to Weaviate with named vectors
-        upsert_batch(payloads, vectors)
+            # Upsert to Weaviate
+            upsert_batch(payloads, vectors)
+    finally:
+        if processes > 1:
+            enc.close()
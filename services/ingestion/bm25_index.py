@@ -0,0 +1,100 @@
+# services/ingestion/bm25_index.py
+"""
+Compact BM25 inverted index over diacritic-folded Pāli + English text, built at ETL time
+and served in-process by the search service (services/search/keyword_index.py).
+
+Layout of <out_parquet stem>.bm25/:
+  meta.json      k1, b, doc count, average length, block size, source
+  vocab.npy      term strings (term id = position)
+  pali_vocab.npy folded terms of the Pāli side (sorted); search uses it to tell ASCII Pāli queries from English
+  offsets.npy    (terms + 1,) start of each term's postings
+  postings.npy   doc numbers, ascending within a term
+  impacts.npy    precomputed BM25 contribution of each posting (idf included)
+  idf.npy        per-term IDF
+  block_*.npy    per-term blocks of BLOCK_SIZE postings: offsets, last doc, max impact
+  docs.parquet   one row per doc number: doc_id + the fields search returns
+"""
+import os
+import json
+import time
+import shutil
+from collections import Counter
+import numpy as np
+import pandas as pd
+from services.common.text import fold_tokens
+
+FORMAT_VERSION = 1
+BLOCK_SIZE = 128
+DOC_COLUMNS = ["doc_id", "book_id", "para_id", "pali_paragraph", "translation_paragraph"]
+TEXT_COLUMNS = ["pali_paragraph", "translation_paragraph"]
+def index_dir_for(parquet_path: str) -> str:
+    root, _ = os.path.splitext(parquet_path)
+    return root + ".bm25"
+
+def build_bm25_index(df: pd.DataFrame, out_dir: str, k1: float = 1.2, b: float = 0.75,
+                     source: str | None = None) -> dict:
+    t0 = time.time()
+    cols = [c for c in TEXT_COLUMNS if c in df.columns] or ["multilingual_concat"]
+    texts = df[cols].fillna("").astype(str).agg(" ".join, axis=1).tolist()
+
+    vocab: dict[str, int] = {}
+    term_ids, doc_nums, tfs = [], [], []
+    doc_len = np.zeros(len(texts), dtype=np.int32)
+    for d, text in enumerate(texts):
+        toks = fold_tokens(text)
+        doc_len[d] = len(toks)
+        for tok, tf in Counter(toks).items():
+            term_ids.append(vocab.setdefault(tok, len(vocab)))
+            doc_nums.append(d)
+            tfs.append(tf)
+    term_ids = np.asarray(term_ids, dtype=np.int64)
+    doc_nums = np.asarray(doc_nums, dtype=np.int32)
+    tfs = np.asarray(tfs, dtype=np.float32)
+
+    order = np.lexsort((doc_nums, term_ids))  # by term, then doc
+    term_ids, doc_nums, tfs = term_ids[order], doc_nums[order], tfs[order]
+    n_docs = len(texts)
+    df_t = np.bincount(term_ids, minlength=len(vocab))
+    offsets = np.concatenate([[0], np.cumsum(df_t)]).astype(np.int64)
+    idf = np.log1p((n_docs - df_t + 0.5) / (df_t + 0.5)).astype(np.float32)
+    avg_len = float(doc_len.mean()) if n_docs else 0.0
+    norm = k1 * (1 - b + b * doc_len[doc_nums] / max(avg_len, 1e-9))
+    impacts = (idf[term_ids] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+    # block-max metadata: each term's postings cut into blocks of BLOCK_SIZE
+    n_blocks = (df_t + BLOCK_SIZE - 1) // BLOCK_SIZE
+    block_offsets = np.concatenate([[0], np.cumsum(n_blocks)]).astype(np.int64)
+    nth = np.arange(block_offsets[-1]) - np.repeat(block_offsets[:-1], n_blocks)
+    starts = np.repeat(offsets[:-1], n_blocks) + BLOCK_SIZE * nth
+    # a block never spans two terms: the next start is the next term's first posting at the latest
+    ends = np.append(starts[1:], len(doc_nums)).astype(np.int64)
+    block_max = np.maximum.reduceat(impacts, starts) if len(starts) else np.empty(0, np.float32)
+    block_last = doc_nums[ends - 1] if len(starts) else np.empty(0, np.int32)
+
+    tmp = out_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    pali_vocab = sorted({t for text in df["pali_paragraph"].dropna().astype(str) for t in fold_tokens(text)}) \
+        if "pali_paragraph" in df.columns else []
+    arrays = {
+        "vocab": np.array(list(vocab), dtype=str), "pali_vocab": np.array(pali_vocab, dtype=str),
+        "offsets": offsets, "postings": doc_nums, "impacts": impacts, "idf": idf,
+        "block_offsets": block_offsets, "block_last": block_last.astype(np.int32),
+        "block_max": block_max.astype(np.float32),
+    }
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), arr)
+    docs = df.reindex(columns=DOC_COLUMNS).reset_index(drop=True)
+    docs.to_parquet(os.path.join(tmp, "docs.parquet"), index=False)
+    meta = {
+        "format": FORMAT_VERSION, "k1": k1, "b": b, "docs": n_docs, "terms": len(vocab),
+        "postings": int(len(doc_nums)), "pali_terms": len(pali_vocab), "avg_len": avg_len, "block_size": BLOCK_SIZE,
+        "fields": cols, "source": source, "created_at": time.time(),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)
+    print(f"[ETL] BM25 index: {n_docs} docs, {len(vocab)} terms, {len(doc_nums)} postings "
+          f"in {time.time() - t0:.1f}s -> {out_dir}")
+    return {"path": out_dir, "docs": n_docs, "terms": len(vocab), "postings": int(len(doc_nums))}
@@ -1,8 +1,15 @@
 # services/ingestion/etl.py
+import os
 import pandas as pd
 from pathlib import Path
 from typing import Optional, Dict, List
 from .io import strip_diacritics, normalize_nfc
+from .bm25_index import build_bm25_index, index_dir_for
+from services.common.index_version import DEFAULT_PATH, bump_index_version
+
+# local BM25 index next to the parquet (<name>.bm25/), served in-process by the search service
+BM25_INDEX = os.getenv("ETL_BM25_INDEX", "1") == "1"
+INDEX_VERSION_FILE = os.getenv("INDEX_VERSION_FILE", DEFAULT_PATH)
 
 def _first_existing(chunk: pd.DataFrame, candidates: List[str]) -> Optional[str]:
     for c in candidates:
@@ -101,10 +108,15 @@ def run_etl(csv_path: str, out_parquet: str, schema_cfg: Optional[Dict] = None)
     out = Path(out_parquet)
     out.parent.mkdir(parents=True, exist_ok=True)
     df.to_parquet(out, index=False)
+    bm25 = None
+    if BM25_INDEX:
+        bm25 = build_bm25_index(df, index_dir_for(str(out)), source=str(out))
+        bump_index_version(INDEX_VERSION_FILE, "etl")  # search drops results cached from the old keyword index
 
     return {
         "rows": len(df),
         "parquet": str(out),
         "used_text_columns": sorted(set(selected_cols)),
-        "id_fields": id_fields
+        "id_fields": id_fields,
+        "bm25_index": bm25,
     }
\ No newline at end of file
@@ -0,0 +1,87 @@
+# services/search/bench_query_encoder.py
+"""
+End-to-end query-embedding latency: remote (POST /embed on the embedding service) vs
+local (LaBSE in the search process), as /search sees it through `embedder.embed(query)`.
+
+    python -m services.search.bench_query_encoder --embedding-url http://localhost:8082 --rounds 5
+
+Queries are the "Search:" lines of example_queries.txt. Every query is made unique per
+round (a round number is appended) so neither side's vector cache is hit, and model
+loading happens in warmup and is not timed. `--concurrency` sends that many queries at
+once, like concurrent /search calls. Vectors from the two modes are compared per query,
+so a model/backend mismatch shows up as min_cosine < 1.
+"""
+import os
+import re
+import time
+import asyncio
+import argparse
+import numpy as np
+from services.search.pools import BoundedPool
+from services.search.embedding_client import EmbeddingClient
+from services.search.query_encoder import LocalQueryEncoder
+
+def load_queries(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [m.group(1).strip() for m in re.finditer(r"^Search:\s*(.+)$", f.read(), flags=re.M)]
+
+async def run(embed, queries: list[str], concurrency: int) -> tuple[list, list[float]]:
+    sem = asyncio.Semaphore(concurrency)
+    latency = [0.0] * len(queries)
+
+    async def one(i, q):
+        async with sem:
+            t0 = time.perf_counter()
+            vec = await embed(q)
+            latency[i] = time.perf_counter() - t0
+            return vec
+
+    return await asyncio.gather(*(one(i, q) for i, q in enumerate(queries))), latency
+
+def summary(name: str, latency: list[float], seconds: float) -> str:
+    ms = np.array(latency) * 1000
+    return (f"{name:>7} {len(ms):>7} {np.percentile(ms, 50):>8.1f} {np.percentile(ms, 95):>8.1f} "
+            f"{ms.max():>8.1f} {len(ms) / seconds:>9.1f}")
+
+async def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--embedding-url", default=os.getenv("EMBEDDING_URL", "http://localhost:8082"))
+    ap.add_argument("--model", default=os.getenv("EMBED_MODEL", "sentence-transformers/LaBSE"))
+    ap.add_argument("--backend", default=os.getenv("EMBED_BACKEND", "torch"))
+    ap.add_argument("--queries", default="example_queries.txt")
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--threads", type=int, default=int(os.getenv("SEARCH_ENCODE_THREADS", "2")),
+                    help="encode pool threads for the local mode")
+    args = ap.parse_args()
+
+    base = load_queries(args.queries)
+    queries = [f"{q} {r}" for r in range(args.rounds) for q in base]
+    remote = EmbeddingClient(args.embedding_url, timeout=30, connect_timeout=5)
+    pool = BoundedPool("encode", args.threads)
+    local = LocalQueryEncoder(args.model, pool, backend=args.backend, cache_size=0)
+    print(f"{len(queries)} queries, concurrency={args.concurrency}, model={args.model}, backend={args.backend}")
+    t0 = time.perf_counter()
+    await pool.run(local.warmup)
+    print(f"local model loaded in {time.perf_counter() - t0:.1f}s")
+    if await remote.embed("warmup") is None:
+        raise SystemExit(f"embedding service at {args.embedding_url} did not answer /embed")
+
+    print(f"{'mode':>7} {'queries':>7} {'p50_ms':>8} {'p95_ms':>8} {'max_ms':>8} {'queries/s':>9}")
+    results = {}
+    for name, embed in (("remote", remote.embed), ("local", local.embed)):
+        t0 = time.perf_counter()
+        vecs, latency = await run(embed, queries, args.concurrency)
+        results[name] = vecs
+        print(summary(name, latency, time.perf_counter() - t0))
+
+    pairs = [(a, b) for a, b in zip(results["remote"], results["local"]) if a is not None and b is not None]
+    if pairs:
+        cos = np.sum(np.array([a for a, _ in pairs]) * np.array([b for _, b in pairs]), axis=1)
+        print(f"agreement over {len(pairs)} queries: mean_cosine={cos.mean():.5f} min_cosine={cos.min():.5f}")
+    print(f"remote errors={remote.errors}, local errors={local.errors}")
+    await remote.close()
+    pool.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
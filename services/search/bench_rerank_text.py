@@ -0,0 +1,80 @@
+# services/search/bench_rerank_text.py
+"""
+Latency saved by trimming the cross-encoder input (SEARCH_RERANK_TEXT / _TEXT_WORDS), and how
+closely each trimmed ranking agrees with the current full-snippet (Pāli + translation) input.
+
+    python -m services.search.bench_rerank_text --words 0,64,128 --backend torch
+
+Queries and candidates are the ones bench_reranker uses (example_queries.txt plus a few Pāli
+queries; BM25 hits or a fixed CSV sample). For each setting it reports the mean tokens per
+pair, scoring time, speedup over full snippets, nDCG@k graded by the full-snippet scores,
+and top-1 agreement. Model loading and warmup are not timed.
+"""
+import os
+import time
+import argparse
+import numpy as np
+from services.search.reranker import Reranker
+from services.search.language import detect_lang, is_ascii_pali
+from services.search.rerank_text import query_terms, rerank_text
+from services.search.bench_query_encoder import load_queries
+from services.search.bench_reranker import candidate_hits, ndcg, snippet
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=os.getenv("SEARCH_RERANK_MODEL", "BAAI/bge-reranker-v2-m3"))
+    ap.add_argument("--backend", default=os.getenv("SEARCH_RERANK_BACKEND", "torch"))
+    ap.add_argument("--batch-size", type=int, default=16)
+    ap.add_argument("--max-length", type=int, default=512)
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--words", default="0,64,128", help="SEARCH_RERANK_TEXT_WORDS values to try (0 = whole side)")
+    ap.add_argument("--candidates", type=int, default=50)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", default="example_queries.txt")
+    ap.add_argument("--extra-queries", nargs="*", default=["dhammadāna", "appamādo amatapadaṃ", "nibbāna"])
+    ap.add_argument("--data-dir", default="data")
+    ap.add_argument("--bm25-dir", default=os.getenv("SEARCH_LOCAL_KEYWORD_DIR", "data/out/normalized.bm25"))
+    ap.add_argument("--onnx-dir", default=os.getenv("SEARCH_RERANK_ONNX_DIR", "data/cache/onnx"))
+    args = ap.parse_args()
+
+    queries = load_queries(args.queries) + args.extra_queries
+    hits = candidate_hits(queries, args.candidates, args.data_dir, args.bm25_dir)
+    rr = Reranker(args.model, backend=args.backend, batch_size=args.batch_size, max_length=args.max_length,
+                  threads=args.threads, onnx_dir=args.onnx_dir)
+    if not rr.loaded:
+        raise SystemExit("torch + transformers are needed for the reranker")
+    rr.warmup()
+    pali_vocab = None
+    if os.path.exists(os.path.join(args.bm25_dir, "meta.json")):
+        from services.search.keyword_index import KeywordIndex
+        pali_vocab = KeywordIndex(args.bm25_dir).pali_terms
+    # as the service with SEARCH_RERANK_ASCII_PALI=1: ASCII Pāli queries read the Pāli side
+    langs = [detect_lang(q) for q in queries]
+    langs = ["pali" if l == "en" and is_ascii_pali(q, pali_vocab) else l for q, l in zip(queries, langs)]
+    print(f"{len(queries)} queries ({sum(l == 'pali' for l in langs)} Pāli), "
+          f"{sum(len(h) for h in hits)} pairs, backend={args.backend}")
+
+    settings = [("snippet", 0)] + [("lang", int(w)) for w in args.words.split(",")]
+    print(f"{'input':>14} {'tokens/pair':>11} {'seconds':>8} {'speedup':>7} {'ndcg@' + str(args.k):>8} {'top1':>5}")
+    ref_scores = ref_seconds = None
+    for mode, words in settings:
+        sets = []
+        for q, lang, cands in zip(queries, langs, hits):
+            terms = query_terms(q)
+            sets.append([snippet(o) if mode == "snippet" else rerank_text(o, lang, terms, words) for o in cands])
+        lengths = [len(ids) for q, texts in zip(queries, sets)
+                   for ids in rr.tokenizer([[q, t] for t in texts], truncation=True, max_length=args.max_length)["input_ids"]]
+        t0 = time.perf_counter()
+        scores = [rr.score(q, texts) for q, texts in zip(queries, sets)]
+        seconds = time.perf_counter() - t0
+        if ref_scores is None:
+            ref_scores, ref_seconds = scores, seconds
+        orders = [np.argsort(-s, kind="stable") for s in scores]
+        agree = np.mean([ndcg(o, g, args.k) for o, g in zip(orders, ref_scores)])
+        top1 = np.mean([o[0] == int(np.argmax(g)) for o, g in zip(orders, ref_scores)])
+        label = "snippet" if mode == "snippet" else f"lang/{words or 'all'}"
+        print(f"{label:>14} {np.mean(lengths):>11.1f} {seconds:>8.2f} {ref_seconds / seconds:>6.2f}x "
+              f"{agree:>8.4f} {top1:>5.2f}")
+
+if __name__ == "__main__":
+    main()
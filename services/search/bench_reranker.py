@@ -0,0 +1,124 @@
+# services/search/bench_reranker.py
+"""
+Pairs/sec of the cross-encoder per SEARCH_RERANK_BACKEND, and how well each one's ranking
+agrees with the reference (fp32 torch at full length, i.e. the current model output).
+
+    python -m services.search.bench_reranker --backends torch,int8,onnx,onnx-int8 --batch-sizes 8,16,32
+
+Queries are the "Search:" lines of example_queries.txt (plus --extra-queries). Each one gets
+--candidates paragraphs (pali + translation snippets, like /search): the top BM25 hits
+from the ETL's index when data/out/normalized.bm25 exists, else a fixed random sample of
+the bundled CSVs. Agreement is nDCG@k of the backend's order, graded by the reference
+scores, plus top-1 agreement. Model loading and warmup are not timed.
+
+With --concurrency N, each configuration is also run as N concurrent requests, once scoring
+per request and once per --batch-wait-ms window with cross-request merging, reporting
+pairs/sec and p95 request latency for both.
+"""
+import os
+import glob
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from services.search.reranker import Reranker
+from services.common.batcher import MicroBatcher
+from services.search.bench_query_encoder import load_queries
+
+def snippet(o: dict) -> str:
+    return " \n ".join(p for p in (o.get("pali_paragraph"), o.get("translation_paragraph")) if p)
+
+def candidate_hits(queries: list[str], n: int, data_dir: str, bm25_dir: str, seed: int = 0) -> list[list[dict]]:
+    """Per query, `n` paragraphs: BM25 hits from the ETL's index if there is one, else a fixed sample of the CSVs."""
+    if os.path.exists(os.path.join(bm25_dir, "meta.json")):
+        from services.search.keyword_backend import LocalKeywordBackend
+        kw = LocalKeywordBackend(bm25_dir)
+        return [kw.search(q, n) for q in queries]
+    frames = [pd.read_csv(p) for p in sorted(glob.glob(os.path.join(data_dir, "*.csv")))]
+    rows = pd.concat(frames, ignore_index=True)[["pali_paragraph", "translation_paragraph"]]
+    rows = rows.astype(object).where(rows.notna(), None).to_dict("records")
+    rng = np.random.default_rng(seed)
+    return [[rows[i] for i in rng.choice(len(rows), size=min(n, len(rows)), replace=False)] for _ in queries]
+
+def candidate_sets(queries: list[str], n: int, data_dir: str, bm25_dir: str, seed: int = 0) -> list[list[str]]:
+    return [[snippet(o) for o in hits] for hits in candidate_hits(queries, n, data_dir, bm25_dir, seed)]
+
+def ndcg(order: np.ndarray, gains: np.ndarray, k: int) -> float:
+    discount = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = np.sort(gains)[::-1][:k]
+    dcg = float((gains[order[:k]] * discount[:len(order[:k])]).sum())
+    best = float((ideal * discount[:len(ideal)]).sum())
+    return dcg / best if best > 0 else 1.0
+
+def run(rr: Reranker, queries: list[str], sets: list[list[str]]) -> tuple[list[np.ndarray], float]:
+    t0 = time.perf_counter()
+    scores = [rr.score(q, texts) for q, texts in zip(queries, sets)]
+    return scores, time.perf_counter() - t0
+
+def run_concurrent(rr: Reranker, queries: list[str], sets: list[list[str]], concurrency: int) -> tuple[float, float]:
+    """(seconds, p95 request latency in ms) for all queries sent `concurrency` at a time."""
+    def one(i):
+        t0 = time.perf_counter()
+        rr.score(queries[i], sets[i])
+        return time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        latency = list(ex.map(one, range(len(queries))))
+    return time.perf_counter() - t0, float(np.percentile(latency, 95) * 1000)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=os.getenv("SEARCH_RERANK_MODEL", "BAAI/bge-reranker-v2-m3"))
+    ap.add_argument("--backends", default="torch,int8,onnx,onnx-int8")
+    ap.add_argument("--batch-sizes", default="16")
+    ap.add_argument("--max-length", type=int, default=512)
+    ap.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = library default)")
+    ap.add_argument("--candidates", type=int, default=50)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", default="example_queries.txt")
+    ap.add_argument("--extra-queries", nargs="*", default=["dhamma dāna", "heedfulness", "nibbāna"])
+    ap.add_argument("--data-dir", default="data")
+    ap.add_argument("--bm25-dir", default=os.getenv("SEARCH_LOCAL_KEYWORD_DIR", "data/out/normalized.bm25"))
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--batch-wait-ms", type=float, default=5.0)
+    ap.add_argument("--max-batch-requests", type=int, default=8)
+    ap.add_argument("--onnx-dir", default=os.getenv("SEARCH_RERANK_ONNX_DIR", "data/cache/onnx"))
+    args = ap.parse_args()
+
+    queries = load_queries(args.queries) + args.extra_queries
+    sets = candidate_sets(queries, args.candidates, args.data_dir, args.bm25_dir)
+    pairs = sum(len(s) for s in sets)
+    print(f"{len(queries)} queries, {pairs} pairs, model={args.model}, threads={args.threads or 'default'}")
+
+    ref = Reranker(args.model, backend="torch", batch_size=16, max_length=512, threads=args.threads)
+    if not ref.loaded:
+        raise SystemExit("torch + transformers are needed for the reranker")
+    ref.warmup()
+    ref_scores, ref_seconds = run(ref, queries, sets)
+    ref_orders = [np.argsort(-s, kind="stable") for s in ref_scores]
+    del ref
+
+    print(f"{'backend':>10} {'batch':>5} {'seconds':>8} {'pairs/sec':>9} {'ndcg@' + str(args.k):>8} {'top1':>5}")
+    print(f"{'reference':>10} {16:>5} {ref_seconds:>8.2f} {pairs / ref_seconds:>9.1f} {1.0:>8.4f} {1.0:>5.2f}")
+    for backend in args.backends.split(","):
+        for bs in (int(b) for b in args.batch_sizes.split(",")):
+            rr = Reranker(args.model, backend=backend, batch_size=bs, max_length=args.max_length,
+                          threads=args.threads, onnx_dir=args.onnx_dir)
+            rr.warmup()
+            scores, seconds = run(rr, queries, sets)
+            orders = [np.argsort(-s, kind="stable") for s in scores]
+            agree = np.mean([ndcg(o, g, args.k) for o, g in zip(orders, ref_scores)])
+            top1 = np.mean([o[0] == r[0] for o, r in zip(orders, ref_orders)])
+            print(f"{backend:>10} {bs:>5} {seconds:>8.2f} {pairs / seconds:>9.1f} {agree:>8.4f} {top1:>5.2f}")
+            if args.concurrency > 1:
+                for label, wait in (("per-request", 0.0), ("merged", args.batch_wait_ms)):
+                    rr.batcher = MicroBatcher(rr._score_requests, max_batch=args.max_batch_requests,
+                                              max_wait_ms=wait, name="bench-rerank-batcher") if wait > 0 else None
+                    seconds, p95 = run_concurrent(rr, queries * 4, sets * 4, args.concurrency)
+                    print(f"{'':>10} {label:>12} x{args.concurrency}: {4 * pairs / seconds:>9.1f} pairs/sec, "
+                          f"p95 {p95:.0f} ms")
+            del rr
+
+if __name__ == "__main__":
+    main()
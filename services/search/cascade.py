@@ -0,0 +1,63 @@
+# services/search/cascade.py
+from .result_cache import normalize_query
+
+def _stage(stages: dict, name: str, before: int, after: int):
+    stages[name] = {"in": before, "dropped": before - after}
+
+def rerank_cascade(reranker, query: str, hits: list[dict], top_k: int, depth: int,
+                   prune_ratio: float = 0.0, margin: float = 0.0, tier: int = 0,
+                   score_key: str = "_weaviate_score", text_key: str = "snippet",
+                   text_fn=None) -> tuple[list[dict], dict]:
+    """
+    Cheap stages first, the cross-encoder last; `hits` are first-stage candidates, best first.
+      dedup:  identical non-empty snippets (after whitespace/NFC normalization) keep only their best hit
+      prune:  drop hits whose first-stage score (the fused BM25/cosine score) is below
+              `prune_ratio` * the best one (0 = off)
+      depth:  keep the top `depth` (never fewer than top_k) for the cross-encoder
+      rerank: with `margin` > 0, score tiers of `tier` hits (default 2 * top_k, at least 10)
+              and stop once rank k leads rank k+1 by `margin`; the rest are never scored
+    The cross-encoder reads `text_key`, or `text_fn(hit)` (kept in `_rerank_text`) for the hits
+    that reach it; dedup always compares `text_key`.
+    Returns the top_k hits and, per stage, how many candidates came in and were dropped.
+    """
+    stages: dict = {}
+    seen, deduped = set(), []
+    for h in hits:
+        key = normalize_query(h.get(text_key) or "")
+        if key and key in seen:
+            continue
+        seen.add(key)
+        deduped.append(h)
+    _stage(stages, "dedup", len(hits), len(deduped))
+
+    pruned = deduped
+    best = max((float(h.get(score_key) or 0.0) for h in deduped), default=0.0)
+    if prune_ratio > 0 and best > 0:
+        pruned = [h for h in deduped if float(h.get(score_key) or 0.0) >= prune_ratio * best]
+    _stage(stages, "prune", len(deduped), len(pruned))
+
+    candidates = pruned[:max(depth, top_k)]
+    _stage(stages, "depth", len(pruned), len(candidates))
+    if text_fn is not None:
+        for h in candidates:
+            h["_rerank_text"] = text_fn(h)
+        text_key = "_rerank_text"
+
+    if margin <= 0 or len(candidates) <= top_k:
+        results = reranker.rerank(query, candidates, text_key=text_key, top_k=top_k)
+        _stage(stages, "rerank", len(candidates), len(candidates))
+        return results, stages
+
+    tier = tier or max(2 * top_k, 10)
+    scored: list[dict] = []
+    for start in range(0, len(candidates), tier):
+        chunk = candidates[start:start + tier]
+        out = reranker.rerank(query, chunk, text_key=text_key, top_k=len(chunk))
+        if out and "_rerank_score" not in out[0]:  # no cross-encoder loaded: keep first-stage order
+            scored = candidates
+            break
+        scored = sorted(scored + out, key=lambda x: x["_rerank_score"], reverse=True)
+        if len(scored) > top_k and scored[top_k - 1]["_rerank_score"] - scored[top_k]["_rerank_score"] >= margin:
+            break
+    _stage(stages, "rerank", len(candidates), len(scored))
+    return scored[:top_k], stages
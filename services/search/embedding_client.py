@@ -0,0 +1,118 @@
+# services/search/embedding_client.py
+import time
+from collections import deque
+import httpx
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failures; while open, calls are skipped for
+    `cooldown` seconds; then half-open lets a single probe through, whose result closes or
+    re-opens the breaker.
+    """
+
+    def __init__(self, failures: int = 3, cooldown: float = 30.0, clock=time.monotonic):
+        self.failures = max(1, failures)
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and self.clock() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            print("[embedding-client] breaker closed")
+        self.state, self.consecutive, self._probing = "closed", 0, False
+
+    def record_failure(self):
+        self.consecutive += 1
+        self._probing = False
+        if self.state == "half_open" or self.consecutive >= self.failures:
+            if self.state != "open":
+                self.opens += 1
+                print(f"[embedding-client] breaker open for {self.cooldown}s after {self.consecutive} failures")
+            self.state, self.opened_at = "open", self.clock()
+
+    def stats(self) -> dict:
+        out = {"state": self.state, "consecutive_failures": self.consecutive, "opens": self.opens}
+        if self.state == "open":
+            out["retry_in_sec"] = round(max(0.0, self.cooldown - (self.clock() - self.opened_at)), 1)
+        return out
+
+class EmbeddingClient:
+    """
+    Query embedding over one pooled keep-alive HTTP client (opened/closed with the app),
+    with a tight timeout and a circuit breaker: while the embedding service is failing,
+    `embed` returns None immediately and /search degrades to BM25-only.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 1.5, connect_timeout: float = 0.5,
+                 max_connections: int = 20, breaker: CircuitBreaker | None = None):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                   keepalive_expiry=30)
+        self.breaker = breaker or CircuitBreaker()
+        self._http: httpx.AsyncClient | None = None
+        self.latency = deque(maxlen=512)
+        self.calls = self.errors = self.skipped = 0
+
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:  # created by start(); lazily if used outside the app lifespan
+            self._http = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._http
+
+    async def start(self):
+        self.http()
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def embed(self, text: str) -> list[float] | None:
+        if not self.breaker.allow():
+            self.skipped += 1
+            return None
+        self.calls += 1
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            r = await self.http().post(f"{self.base_url}/embed", json={"texts": [text], "normalize": True})
+            r.raise_for_status()
+            vectors = r.json().get("vectors") or []
+            ok = True
+            return vectors[0] if vectors else None
+        except Exception:
+            self.errors += 1
+            return None
+        finally:
+            # also runs when the caller's leg timeout cancels the request, which counts as a failure
+            self.latency.append(time.perf_counter() - t0)
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def stats(self) -> dict:
+        lat = sorted(self.latency)
+        pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 1) if lat else None
+        return {
+            "url": self.base_url,
+            "calls": self.calls,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+            "breaker": self.breaker.stats(),
+        }
@@ -0,0 +1,46 @@
+# services/search/fusion.py
+
+FUSION_MODES = ("relative", "rrf")
+
+def _keys(hits: list[dict], leg: str) -> list:
+    """doc_id per hit; a hit without one is keyed by its leg and position (kept, never merged), as pool_windows does."""
+    return [h.get("doc_id") or f"{leg}#{pos}" for pos, h in enumerate(hits)]
+
+def _normalized(hits: list[dict], keys: list, score_key: str) -> dict:
+    scores = [float(h.get(score_key) or 0.0) for h in hits]
+    if not scores:
+        return {}
+    lo, hi = min(scores), max(scores)
+    span = hi - lo
+    return {key: (1.0 if span == 0 else (s - lo) / span) for key, s in zip(keys, scores)}
+
+def _reciprocal_ranks(keys: list, k: int) -> dict:
+    return {key: 1.0 / (k + rank) for rank, key in enumerate(keys, start=1)}
+
+def fuse(keyword_hits: list[dict] | None, vector_hits: list[dict] | None, alpha: float,
+         mode: str = "relative", rrf_k: int = 60, score_key: str = "_weaviate_score") -> list[dict]:
+    """
+    Merge the keyword and vector legs (each already one hit per doc_id, best first) into one
+    ranked list; `alpha` weights the vector leg (0 = keyword only, 1 = vector only):
+      - relative: each leg's scores min-max normalized to [0, 1], then (1 - alpha) * kw + alpha * vec
+                  (Weaviate's relativeScoreFusion, so scores stay comparable to server-side hybrid)
+      - rrf:      (1 - alpha) / (rrf_k + kw rank) + alpha / (rrf_k + vec rank); ignores raw score scales
+    A doc missing from a leg gets 0 from it. Ties keep keyword-leg order, then vector-leg order.
+    """
+    if mode not in FUSION_MODES:
+        raise ValueError(f"Unknown fusion {mode!r}; expected one of {FUSION_MODES}")
+    keyword_hits, vector_hits = keyword_hits or [], vector_hits or []
+    kw_keys, vec_keys = _keys(keyword_hits, "keyword"), _keys(vector_hits, "vector")
+    if mode == "relative":
+        kw, vec = _normalized(keyword_hits, kw_keys, score_key), _normalized(vector_hits, vec_keys, score_key)
+    else:
+        kw, vec = _reciprocal_ranks(kw_keys, rrf_k), _reciprocal_ranks(vec_keys, rrf_k)
+    merged: dict = {}
+    for key, h in zip(kw_keys + vec_keys, keyword_hits + vector_hits):
+        merged[key] = {**merged.get(key, {}), **h}  # vector hit wins: it carries matched_windows
+    fused = []
+    for pos, (key, h) in enumerate(merged.items()):
+        h[score_key] = (1 - alpha) * kw.get(key, 0.0) + alpha * vec.get(key, 0.0)
+        fused.append((h, pos))
+    fused.sort(key=lambda x: (-x[0][score_key], x[1]))
+    return [h for h, _ in fused]
@@ -0,0 +1,60 @@
+# services/search/keyword_backend.py
+from abc import ABC, abstractmethod
+
+# Window objects repeat their paragraph's full text, so BM25 only looks at the first window of each paragraph
+FIRST_WINDOW = {"path": ["window"], "operator": "Equal", "valueInt": 0}
+
+class KeywordBackend(ABC):
+    """
+    BM25 keyword search over paragraphs. Like VectorBackend, `search` returns objects shaped
+    like Weaviate's Get results (properties + `_additional.score`).
+    """
+    name = "base"
+
+    @abstractmethod
+    def search(self, query: str, limit: int) -> list[dict]:
+        ...
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+class LocalKeywordBackend(KeywordBackend):
+    """In-process BM25 over the diacritic-folded index written at ETL time; no Weaviate needed."""
+    name = "local"
+
+    def __init__(self, path: str):
+        from .keyword_index import KeywordIndex
+        self.index = KeywordIndex(path)
+        print(f"[keyword-backend] local BM25 over {len(self.index)} docs from {path}")
+
+    @property
+    def pali_terms(self) -> frozenset:
+        """Folded words of the indexed Pāli side (for is_ascii_pali)."""
+        return self.index.pali_terms
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        scores, ids = self.index.search(query, limit)
+        objs = self.index.objects(ids)
+        for o, s in zip(objs, scores):
+            o["_additional"] = {"score": float(s)}
+        return objs
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self.index.stats()}
+
+class WeaviateKeywordBackend(KeywordBackend):
+    """BM25 inside Weaviate (`with_bm25`) over the Paragraph class."""
+    name = "weaviate"
+
+    def __init__(self, get_client, class_name: str, properties: list[str], where: dict | None = None):
+        self.get_client = get_client
+        self.class_name = class_name
+        self.properties = properties
+        self.where = where
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        q = self.get_client().query.get(self.class_name, self.properties).with_bm25(query=query)
+        if self.where:
+            q = q.with_where(self.where)
+        res = q.with_additional(["score"]).with_limit(limit).do()
+        return res["data"]["Get"][self.class_name]
@@ -0,0 +1,84 @@
+# services/search/keyword_index.py
+"""
+In-process BM25 over the inverted index built at ETL time (services/ingestion/bm25_index.py).
+
+Queries are folded exactly like the documents (lowercase, no diacritics), so "dhamma"
+finds "Dhammā". Top-k uses block-max MaxScore: terms are visited from the highest score
+upper bound down; once the remaining terms together cannot lift an unseen document into the
+current top-k, only existing candidates are scored, and a candidate is skipped for a term
+when the max impact of the posting block it would fall into cannot lift it either.
+Results are identical to exhaustive BM25.
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+from services.common.text import fold_tokens
+from .local_index import _top_k
+
+_ARRAYS = ("offsets", "postings", "impacts", "idf", "block_offsets", "block_last", "block_max")
+
+class KeywordIndex:
+    def __init__(self, path: str):
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"No BM25 index (meta.json) under {path}")
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        self.path = path
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        self.terms = {t: i for i, t in enumerate(np.load(os.path.join(path, "vocab.npy")).tolist())}
+        pali_path = os.path.join(path, "pali_vocab.npy")  # absent in indexes built before it was added
+        self.pali_terms = frozenset(np.load(pali_path).tolist()) if os.path.exists(pali_path) else frozenset()
+        # per-term score upper bound = best block of the term
+        self.max_impact = np.maximum.reduceat(np.asarray(self.block_max), np.asarray(self.block_offsets[:-1])) \
+            if len(self.terms) else np.empty(0, np.float32)
+        self.docs = pd.read_parquet(os.path.join(path, "docs.parquet"))
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def term_ids(self, query: str) -> np.ndarray:
+        return np.unique([self.terms[t] for t in fold_tokens(query) if t in self.terms]).astype(np.int64)
+
+    def search(self, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        tids = self.term_ids(query)
+        if len(tids) == 0:
+            return np.empty(0, np.float32), np.empty(0, np.int64)
+        ub = self.max_impact[tids]
+        order = np.argsort(-ub, kind="stable")
+        tids, ub = tids[order], ub[order]
+        rest = np.append(np.cumsum(ub[::-1])[::-1], 0.0)  # rest[i] = best possible from terms i..end
+
+        cand = np.empty(0, np.int64)
+        score = np.empty(0, np.float32)
+        theta = -np.inf
+        for i, t in enumerate(tids):
+            lo, hi = int(self.offsets[t]), int(self.offsets[t + 1])
+            if len(cand) < k or rest[i] >= theta - 1e-6:
+                # an unseen doc could still reach the top-k: merge the whole posting list
+                merged = np.concatenate([cand, self.postings[lo:hi]])
+                cand, inv = np.unique(merged, return_inverse=True)
+                score = np.bincount(inv, weights=np.concatenate([score, self.impacts[lo:hi]])).astype(np.float32)
+            else:
+                keep = score + rest[i] >= theta - 1e-6
+                cand, score = cand[keep], score[keep]
+                blo, bhi = int(self.block_offsets[t]), int(self.block_offsets[t + 1])
+                blk = np.searchsorted(self.block_last[blo:bhi], cand)
+                inside = blk < bhi - blo
+                bound = score + np.where(inside, self.block_max[blo + np.minimum(blk, bhi - blo - 1)], 0.0) + rest[i + 1]
+                probe = np.flatnonzero(inside & (bound >= theta - 1e-6))
+                pos = lo + np.searchsorted(self.postings[lo:hi], cand[probe])
+                found = (pos < hi) & (self.postings[np.minimum(pos, hi - 1)] == cand[probe])
+                score[probe[found]] += self.impacts[pos[found]]
+            if len(cand) >= k:
+                theta = float(np.partition(score, len(score) - k)[len(score) - k])
+        return _top_k(score, cand, k)
+
+    def objects(self, ids) -> list[dict]:
+        recs = self.docs.iloc[list(ids)].to_dict("records")
+        return [{k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in r.items()} for r in recs]
+
+    def stats(self) -> dict:
+        return {"path": self.path, **{k: self.meta.get(k) for k in ("docs", "terms", "postings", "created_at")}}
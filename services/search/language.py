@@ -1,13 +1,33 @@
 # services/search/language.py
 import unicodedata, re
+from services.common.text import fold_tokens
+
+# ASCII spellings of common Pāli terms, for when no BM25 Pāli vocabulary is loaded
+PALI_TERMS = frozenset(
+    "dhamma dhammo dhamme dhammam dhammesu anicca dukkha dukkham anatta nibbana nibbanam sutta suttanta "
+    "bhikkhu bhikkhave bhikkhuni sangha buddho bhagava tathagata metta karuna mudita upekkha sati samadhi "
+    "panna sila kamma jhana vipassana samatha tanha avijja dana appamada appamado sabbe sankhara sankhata "
+    "khandha vedana sanna vinnana namarupa arahant arahanta magga phala ariya sacca".split()
+)
 
 def strip_diacritics(s: str) -> str:
     nfkd = unicodedata.normalize("NFKD", s)
     return "".join(ch for ch in nfkd if not unicodedata.combining(ch))
 
+def is_ascii_pali(q: str, pali_vocab: frozenset | None = None, min_share: float = 0.5) -> bool:
+    """
+    ASCII-spelled Pāli ("anicca", "sabbe dhamma anatta"): every word of 3+ letters is a Pāli term
+    (from the BM25 index's Pāli side, else PALI_TERMS) and such words are at least `min_share` of
+    the query, so short words shared with English ("so", "na", "ca", "te") decide nothing.
+    """
+    words = [t for t in fold_tokens(q) if not t.isdigit()]
+    content = [t for t in words if len(t) > 2]
+    vocab = pali_vocab or PALI_TERMS
+    return bool(content) and len(content) >= min_share * len(words) and all(t in vocab for t in content)
+
 def detect_lang(q: str) -> str:
     if re.search(r"[\u4e00-\u9fff]", q): return "zh"
     if re.search(r"[\u0400-\u04FF]", q): return "ru"
     if re.search(r"[āīūḍḷṇṭñĀĪŪḌḶṆṬÑ]", q): return "pali"
     # crude default
-    return "en"
\ No newline at end of file
+    return "en"
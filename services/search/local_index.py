@@ -0,0 +1,214 @@
+# services/search/local_index.py
+"""
+In-process nearest-neighbour search over the vector shards written by
+`services.embedding.embed_shards` or `services.embedding.snapshot`
+(meta.json + memory-mapped shard-NNNNN.npy + Parquet sidecar per shard).
+
+Index kinds:
+  - exact: blockwise numpy matmul over the memory-mapped shards (cosine on normalized
+           vectors); no build step, right answer always, fine up to a few 100k vectors
+  - ivf:   inverted file over spherical k-means centroids; a query scores `nprobe`
+           lists only. Trained at load time and cached next to the shards.
+  - hnsw:  hnswlib graph (optional dependency), cached next to the shards
+  - auto:  exact below SEARCH_EXACT_MAX_VECTORS, else hnsw when hnswlib is installed, else ivf
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+from services.common.shards import ShardSet
+
+try:
+    import hnswlib
+except ImportError:  # optional: only needed for SEARCH_LOCAL_INDEX=hnsw
+    hnswlib = None
+
+INDEX_KINDS = ("exact", "ivf", "hnsw", "auto")
+BLOCK_ROWS = 65536
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Best `k` (score desc), ties broken by id so results are deterministic."""
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        scores, ids = scores[part], ids[part]
+    order = np.lexsort((ids, -scores))
+    return scores[order], ids[order]
+
+class ShardVectors:
+    """All shards of a ShardSet as one logical (n, dim) matrix plus their sidecar rows."""
+
+    def __init__(self, path: str, columns: list[str] | None = None):
+        shards = ShardSet(path)
+        if shards.meta is None or not shards.shards():
+            raise FileNotFoundError(f"No vector shards (meta.json) under {path}")
+        self.path = path
+        self.meta = shards.meta
+        self.parts, sides = [], []
+        for entry in shards.shards():
+            vecs, side = shards.read(entry)
+            self.parts.append(vecs)
+            keep = [c for c in (columns or side.columns) if c in side.columns]
+            sides.append(side[keep])
+        self.offsets = np.cumsum([0] + [len(p) for p in self.parts])
+        self.rows = pd.concat(sides, ignore_index=True)
+        self.dim = int(self.meta["dim"])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def fingerprint(self) -> str:
+        """Changes whenever the shard set is rewritten or extended."""
+        return f"{self.meta.get('created_at')}:{self.meta.get('updated_at')}:{len(self)}:{self.dim}"
+
+    def blocks(self, block_rows: int = BLOCK_ROWS):
+        """Yield (first global id, float32 block) over all shards."""
+        for start, part in zip(self.offsets, self.parts):
+            for a in range(0, len(part), block_rows):
+                yield int(start + a), np.asarray(part[a:a + block_rows], dtype=np.float32)
+
+    def take(self, ids: np.ndarray) -> np.ndarray:
+        """float32 rows for sorted global ids (one fancy-index read per shard)."""
+        out = np.empty((len(ids), self.dim), dtype=np.float32)
+        which = np.searchsorted(self.offsets, ids, side="right") - 1
+        for s in np.unique(which):
+            mask = which == s
+            out[mask] = self.parts[s][ids[mask] - self.offsets[s]]
+        return out
+
+    def objects(self, ids) -> list[dict]:
+        recs = self.rows.iloc[list(ids)].to_dict("records")
+        return [{k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in r.items()} for r in recs]
+
+class ExactIndex:
+    kind = "exact"
+
+    def __init__(self, vectors: ShardVectors):
+        self.vectors = vectors
+
+    def search(self, q: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        best_s, best_i = np.empty(0, np.float32), np.empty(0, np.int64)
+        for start, block in self.vectors.blocks():
+            s, i = _top_k(block @ q, np.arange(start, start + len(block)), k)
+            best_s, best_i = _top_k(np.concatenate([best_s, s]), np.concatenate([best_i, i]), k)
+        return best_s, best_i
+
+    def stats(self) -> dict:
+        return {"kind": self.kind}
+
+class IvfIndex:
+    """
+    Inverted file: vectors are grouped by their nearest of `nlist` centroids (spherical
+    k-means on a sample); a query scans the `nprobe` closest lists exactly.
+    """
+    kind = "ivf"
+
+    def __init__(self, vectors: ShardVectors, nlist: int = 0, nprobe: int = 16,
+                 train_sample: int = 100_000, iters: int = 10, cache: bool = True):
+        self.vectors = vectors
+        # never more lists than vectors: k-means seeds each list with a distinct vector
+        self.nlist = min(nlist or int(4 * np.sqrt(len(vectors))), len(vectors)) or 1
+        self.nprobe = nprobe
+        cache_path = os.path.join(vectors.path, f"ivf-{self.nlist}.npz")
+        if cache and self._load(cache_path):
+            print(f"[local-index] ivf: loaded {cache_path}")
+            return
+        t0 = time.time()
+        self.centroids = self._train(train_sample, iters)
+        self._assign()
+        print(f"[local-index] ivf: {self.nlist} lists over {len(vectors)} vectors in {time.time() - t0:.1f}s")
+        if cache:
+            np.savez(cache_path + ".tmp.npz", centroids=self.centroids, order=self.order,
+                     offsets=self.offsets, fingerprint=np.array(vectors.fingerprint()))
+            os.replace(cache_path + ".tmp.npz", cache_path)
+
+    def _load(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            if str(data["fingerprint"]) != self.vectors.fingerprint():
+                return False
+            self.centroids, self.order, self.offsets = data["centroids"], data["order"], data["offsets"]
+        return True
+
+    def _train(self, sample: int, iters: int) -> np.ndarray:
+        n = len(self.vectors)
+        rng = np.random.default_rng(0)
+        ids = np.sort(rng.choice(n, size=min(n, max(sample, self.nlist)), replace=False))
+        x = self.vectors.take(ids)
+        cent = x[rng.choice(len(x), size=self.nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(x @ cent.T, axis=1)
+            sums = np.zeros_like(cent)
+            np.add.at(sums, assign, x)
+            empty = np.bincount(assign, minlength=self.nlist) == 0
+            sums[empty] = cent[empty]  # keep the old centroid for lists that lost all points
+            cent = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        return cent.astype(np.float32)
+
+    def _assign(self):
+        assign = np.empty(len(self.vectors), dtype=np.int32)
+        for start, block in self.vectors.blocks():
+            assign[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        self.order = np.argsort(assign, kind="stable").astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.nlist))]).astype(np.int64)
+
+    def search(self, q: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        probe = np.argsort(-(self.centroids @ q))[:min(self.nprobe, self.nlist)]
+        cand = np.sort(np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe]))
+        if len(cand) == 0:
+            return np.empty(0, np.float32), np.empty(0, np.int64)
+        return _top_k(self.vectors.take(cand) @ q, cand, k)
+
+    def stats(self) -> dict:
+        sizes = np.diff(self.offsets)
+        return {"kind": self.kind, "nlist": self.nlist, "nprobe": self.nprobe, "max_list": int(sizes.max())}
+
+class HnswIndex:
+    kind = "hnsw"
+
+    def __init__(self, vectors: ShardVectors, m: int = 32, ef_construction: int = 200,
+                 ef_search: int = 128, cache: bool = True):
+        if hnswlib is None:
+            raise RuntimeError("SEARCH_LOCAL_INDEX=hnsw needs hnswlib (pip install hnswlib)")
+        self.vectors = vectors
+        self.ef_search = ef_search
+        cache_path = os.path.join(vectors.path, "hnsw.bin")
+        stamp_path = cache_path + ".fingerprint"
+        self.index = hnswlib.Index(space="ip", dim=vectors.dim)
+        stamp = None
+        if os.path.exists(stamp_path):
+            with open(stamp_path) as f:
+                stamp = f.read()
+        if cache and stamp == vectors.fingerprint() and os.path.exists(cache_path):
+            self.index.load_index(cache_path, max_elements=len(vectors))
+            print(f"[local-index] hnsw: loaded {cache_path}")
+        else:
+            t0 = time.time()
+            self.index.init_index(max_elements=len(vectors), ef_construction=ef_construction, M=m)
+            for start, block in self.vectors.blocks():
+                self.index.add_items(block, np.arange(start, start + len(block)))
+            print(f"[local-index] hnsw: {len(vectors)} vectors in {time.time() - t0:.1f}s")
+            if cache:
+                self.index.save_index(cache_path)
+                with open(stamp_path, "w") as f:
+                    f.write(vectors.fingerprint())
+        self.index.set_ef(ef_search)
+
+    def search(self, q: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(self.vectors))
+        labels, dists = self.index.knn_query(q[None, :], k=k)
+        return 1.0 - dists[0].astype(np.float32), labels[0].astype(np.int64)  # "ip" distance is 1 - dot
+
+    def stats(self) -> dict:
+        return {"kind": self.kind, "ef_search": self.ef_search}
+
+def build_index(vectors: ShardVectors, kind: str = "auto", exact_max: int = 200_000, **opts):
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown local index {kind!r}; expected one of {INDEX_KINDS}")
+    if kind == "auto":
+        kind = "exact" if len(vectors) <= exact_max else ("hnsw" if hnswlib is not None else "ivf")
+    if kind == "exact":
+        return ExactIndex(vectors)
+    if kind == "ivf":
+        return IvfIndex(vectors, nlist=opts.get("nlist", 0), nprobe=opts.get("nprobe", 16))
+    return HnswIndex(vectors, ef_search=opts.get("ef_search", 128))
@@ -1,18 +1,98 @@
 # services/search/main.py
 import os
+import time
+import asyncio
+import threading
 import weaviate
-import httpx
 from fastapi import FastAPI
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from .language import detect_lang, strip_diacritics
+from .language import detect_lang, is_ascii_pali, strip_diacritics
 from .rag import LLMProvider, build_prompt, make_bilingual_answer
 from .reranker import Reranker
+from .pooling import pool_windows
+from .vector_backend import make_vector_backend
+from .keyword_backend import FIRST_WINDOW, LocalKeywordBackend, WeaviateKeywordBackend
+from .fusion import fuse
+from .pools import BoundedPool
+from .embedding_client import CircuitBreaker, EmbeddingClient
+from .result_cache import IndexVersion, TTLCache, normalize_query
+from .query_encoder import QUERY_ENCODERS, LocalQueryEncoder
+from .cascade import rerank_cascade
+from .rerank_text import RERANK_TEXT_MODES, query_terms, rerank_text
 
-reranker = Reranker() 
 WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://weaviate:8080")
 EMBEDDING_URL = os.getenv("EMBEDDING_URL", "http://embedding:8082")
 CLASS = "Paragraph"
+# long paragraphs are indexed as several window objects; hits are pooled per doc_id (max | sum)
+WINDOW_POOL = os.getenv("SEARCH_WINDOW_POOL", "max")
+# 0 if the index still holds objects uploaded before windowing (no `window` property) and was never fully re-indexed
+KEYWORD_FIRST_WINDOW = os.getenv("SEARCH_KEYWORD_FIRST_WINDOW", "1") == "1"
+RETURN_PROPS = ["doc_id","book_id","para_id","pali_paragraph","translation_paragraph"]
+# weaviate: hybrid search in Weaviate | local: in-process vector index over data/out/shards (no Weaviate)
+VECTOR_BACKEND = os.getenv("SEARCH_VECTOR_BACKEND", "weaviate")
+LOCAL_VECTOR_DIR = os.getenv("SEARCH_LOCAL_VECTOR_DIR", "data/out/shards")
+LOCAL_INDEX = os.getenv("SEARCH_LOCAL_INDEX", "auto")  # exact | ivf | hnsw | auto
+LOCAL_EXACT_MAX = int(os.getenv("SEARCH_EXACT_MAX_VECTORS", "200000"))
+IVF_NLIST = int(os.getenv("SEARCH_IVF_NLIST", "0"))  # 0 = 4 * sqrt(vectors)
+IVF_NPROBE = int(os.getenv("SEARCH_IVF_NPROBE", "16"))
+HNSW_EF = int(os.getenv("SEARCH_HNSW_EF", "128"))
+# weaviate: BM25 inside Weaviate's hybrid query | local: in-process BM25 built at ETL time (diacritic-folded)
+KEYWORD_BACKEND = os.getenv("SEARCH_KEYWORD_BACKEND", "weaviate")
+LOCAL_KEYWORD_DIR = os.getenv("SEARCH_LOCAL_KEYWORD_DIR", "data/out/normalized.bm25")
+# relative | rrf: keyword and vector legs run concurrently and are fused here by alpha
+# weaviate: a single server-side hybrid query (legs run one after the other on fallback)
+FUSION = os.getenv("SEARCH_FUSION", "relative")
+RRF_K = int(os.getenv("SEARCH_RRF_K", "60"))
+KEYWORD_TIMEOUT = float(os.getenv("SEARCH_KEYWORD_TIMEOUT", "2"))
+VECTOR_TIMEOUT = float(os.getenv("SEARCH_VECTOR_TIMEOUT", "5"))  # includes the query embedding call
+# blocking work runs in bounded pools off the event loop: Weaviate I/O + index lookups, and rerank inference
+IO_THREADS = int(os.getenv("SEARCH_IO_THREADS", "16"))
+# query embedding hop: pooled keep-alive client, tight timeout, breaker skips the call while embedding is down
+EMBED_TIMEOUT = float(os.getenv("SEARCH_EMBED_TIMEOUT", "1.5"))
+EMBED_CONNECT_TIMEOUT = float(os.getenv("SEARCH_EMBED_CONNECT_TIMEOUT", "0.5"))
+EMBED_MAX_CONNECTIONS = int(os.getenv("SEARCH_EMBED_MAX_CONNECTIONS", "20"))
+BREAKER_FAILURES = int(os.getenv("SEARCH_EMBED_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.getenv("SEARCH_EMBED_BREAKER_COOLDOWN", "30"))
+# remote: POST /embed on the embedding service | local: LaBSE loaded in this process on first query
+# (same EMBED_MODEL / EMBED_BACKEND as the indexer; falls back to remote if it cannot load)
+QUERY_ENCODER = os.getenv("SEARCH_QUERY_ENCODER", "remote")
+QUERY_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/LaBSE")
+QUERY_BACKEND = os.getenv("EMBED_BACKEND", "torch")  # torch | int8 | onnx | onnx-int8
+ENCODE_THREADS = int(os.getenv("SEARCH_ENCODE_THREADS", "2"))
+QUERY_VECTOR_CACHE = int(os.getenv("SEARCH_QUERY_VECTOR_CACHE", "4096"))
+# cross-encoder engine: torch (fp32 CPU) | fp16 (GPU) | int8 | onnx | onnx-int8, all warmed up at startup
+RERANK_MODEL = os.getenv("SEARCH_RERANK_MODEL", "BAAI/bge-reranker-v2-m3")
+RERANK_BACKEND = os.getenv("SEARCH_RERANK_BACKEND", "torch")
+RERANK_BATCH_SIZE = int(os.getenv("SEARCH_RERANK_BATCH_SIZE", "16"))
+RERANK_MAX_LENGTH = int(os.getenv("SEARCH_RERANK_MAX_LENGTH", "512"))  # tokens per (query, passage) pair
+RERANK_TORCH_THREADS = int(os.getenv("SEARCH_RERANK_TORCH_THREADS", "0"))  # intra-op threads; 0 = library default
+RERANK_ONNX_DIR = os.getenv("SEARCH_RERANK_ONNX_DIR", "data/cache/onnx")
+# rerank scores remembered per (query, doc_id, model) until they expire or the index version changes (0 = off)
+RERANK_MEMO_SIZE = int(os.getenv("SEARCH_RERANK_MEMO_SIZE", "50000"))
+RERANK_MEMO_TTL = float(os.getenv("SEARCH_RERANK_MEMO_TTL", "3600"))
+RERANK_TOKEN_BUDGET = int(os.getenv("SEARCH_RERANK_TOKEN_BUDGET", "8192"))  # padded tokens per forward pass (0 = off)
+# concurrent requests' pairs are merged on one inference thread (0 ms = each request scores its own pairs)
+RERANK_BATCH_WAIT_MS = float(os.getenv("SEARCH_RERANK_BATCH_WAIT_MS", "5"))
+RERANK_MAX_BATCH_REQUESTS = int(os.getenv("SEARCH_RERANK_MAX_BATCH_REQUESTS", "8"))
+# rerank pool threads run the cascade; with merging they mostly wait on the inference thread, so allow more
+RERANK_THREADS = int(os.getenv("SEARCH_RERANK_THREADS", "16" if RERANK_BATCH_WAIT_MS > 0 else "1"))
+# cross-encoder input: snippet (Pāli + translation) | lang (only the side in the query's language),
+# optionally cut to the N-word window with the most query terms (0 = whole side; pairs still stop at MAX_LENGTH tokens)
+RERANK_TEXT = os.getenv("SEARCH_RERANK_TEXT", "snippet")
+RERANK_TEXT_WORDS = int(os.getenv("SEARCH_RERANK_TEXT_WORDS", "0"))
+# lang mode: an English-looking query made of Pāli words ("anicca") reads the Pāli side (retrieval and /answer still see "en")
+RERANK_ASCII_PALI = os.getenv("SEARCH_RERANK_ASCII_PALI", "1") == "1"
+# rerank cascade (each settable per request): first-stage candidates -> dedup -> prune -> cross-encoder on the top N
+CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "100"))
+RERANK_DEPTH = int(os.getenv("SEARCH_RERANK_DEPTH", str(CANDIDATES)))  # default: every candidate, as before the cascade
+PRUNE_RATIO = float(os.getenv("SEARCH_PRUNE_RATIO", "0"))  # drop hits below this fraction of the best first-stage score
+RERANK_MARGIN = float(os.getenv("SEARCH_RERANK_MARGIN", "0"))  # >0: rerank in tiers, stop when rank k leads k+1 by this
+RERANK_TIER = int(os.getenv("SEARCH_RERANK_TIER", "0"))  # 0 = max(2 * top_k, 10)
+# /search and /answer responses cached per (normalized query, alpha, top_k) and index version
+CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))  # 0 disables
+CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+INDEX_VERSION_FILE = os.getenv("INDEX_VERSION_FILE", "data/out/index_version.json")  # bumped by the indexers
 
 app = FastAPI(title="Semantic Search + RAG Service")
 
@@ -25,28 +105,129 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-client = weaviate.Client(WEAVIATE_URL)
+client = weaviate.Client(WEAVIATE_URL) if "weaviate" in (VECTOR_BACKEND, KEYWORD_BACKEND) else None
+vectors = make_vector_backend(
+    VECTOR_BACKEND, lambda: client, CLASS, RETURN_PROPS,
+    path=LOCAL_VECTOR_DIR, kind=LOCAL_INDEX, exact_max=LOCAL_EXACT_MAX,
+    nlist=IVF_NLIST, nprobe=IVF_NPROBE, ef_search=HNSW_EF,
+)
+weaviate_keywords = WeaviateKeywordBackend(lambda: client, CLASS, RETURN_PROPS,
+                                           where=FIRST_WINDOW if KEYWORD_FIRST_WINDOW else None)
+keywords: LocalKeywordBackend | None = None  # also the BM25 fallback when Weaviate is unreachable
+keywords_stamp = None  # (inode, mtime) of the loaded index's meta.json; an ETL rebuild changes it
+keywords_lock = threading.Lock()
 llm = LLMProvider()
+reranker = Reranker(RERANK_MODEL, backend=RERANK_BACKEND, batch_size=RERANK_BATCH_SIZE,
+                    max_length=RERANK_MAX_LENGTH, threads=RERANK_TORCH_THREADS, onnx_dir=RERANK_ONNX_DIR,
+                    token_budget=RERANK_TOKEN_BUDGET, batch_wait_ms=RERANK_BATCH_WAIT_MS,
+                    max_batch_requests=RERANK_MAX_BATCH_REQUESTS,
+                    memo=TTLCache(RERANK_MEMO_SIZE, RERANK_MEMO_TTL) if RERANK_MEMO_SIZE > 0 else None,
+                    version_fn=lambda: index_version.current())
+io_pool = BoundedPool("io", IO_THREADS)
+rerank_pool = BoundedPool("rerank", RERANK_THREADS)
+result_cache = TTLCache(CACHE_SIZE, CACHE_TTL)
+index_version = IndexVersion(INDEX_VERSION_FILE)
+embedder = EmbeddingClient(
+    EMBEDDING_URL, timeout=EMBED_TIMEOUT, connect_timeout=EMBED_CONNECT_TIMEOUT,
+    max_connections=EMBED_MAX_CONNECTIONS, breaker=CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN),
+)
+if RERANK_TEXT not in RERANK_TEXT_MODES:
+    raise ValueError(f"Unknown SEARCH_RERANK_TEXT {RERANK_TEXT!r}; expected one of {RERANK_TEXT_MODES}")
+if QUERY_ENCODER not in QUERY_ENCODERS:
+    raise ValueError(f"Unknown SEARCH_QUERY_ENCODER {QUERY_ENCODER!r}; expected one of {QUERY_ENCODERS}")
+encode_pool = None
+if QUERY_ENCODER == "local":
+    encode_pool = BoundedPool("encode", ENCODE_THREADS)
+    embedder = LocalQueryEncoder(QUERY_MODEL, encode_pool, backend=QUERY_BACKEND,
+                                 cache_size=QUERY_VECTOR_CACHE, fallback=embedder)
 
 class SearchBody(BaseModel):
     query: str
     top_k: int = 10
     alpha: float = 0.5  # 0->BM25 only; 1->vector only
+    # rerank cascade overrides (None: SEARCH_CANDIDATES / _RERANK_DEPTH / _PRUNE_RATIO / _RERANK_MARGIN)
+    candidates: int | None = None
+    rerank_depth: int | None = None
+    prune_ratio: float | None = None
+    rerank_margin: float | None = None
 
 def build_snippet(o: dict) -> str:
     parts = [o.get("pali_paragraph"), o.get("translation_paragraph")]
     return " \n ".join([p for p in parts if p])
 
+def to_hits(objs: list[dict], pool: str | None = None) -> list[dict]:
+    """Weaviate-shaped objects -> hits, one per doc_id (keyword hits pass pool="max": summing would multiply BM25)."""
+    hits = [{"snippet": build_snippet(o), **o} for o in objs]
+    # Preserve original retrieval scores
+    for hit in hits:
+        additional = hit.pop("_additional", {})
+        hit["_weaviate_score"] = additional.get("score", 0.0)
+        hit["_explain_score"] = additional.get("explainScore", "")
+    return pool_windows(hits, pool or WINDOW_POOL)
+
+def get_keywords() -> LocalKeywordBackend | None:
+    """
+    The local BM25 index, loaded on first use once the ETL has written it and reloaded when
+    the ETL rebuilds it (a new meta.json); a failed reload keeps serving the old index.
+    Blocking (a stat, and a full load after a rebuild): async code calls it through io_pool.
+    One thread reloads while the others keep serving the current index; the new one is swapped in whole.
+    """
+    global keywords, keywords_stamp
+    try:
+        st = os.stat(os.path.join(LOCAL_KEYWORD_DIR, "meta.json"))
+    except OSError:
+        return keywords  # not built yet, or mid-swap
+    stamp = (st.st_ino, st.st_mtime_ns)
+    if stamp != keywords_stamp and keywords_lock.acquire(blocking=False):
+        try:
+            if stamp != keywords_stamp:
+                try:
+                    keywords = LocalKeywordBackend(LOCAL_KEYWORD_DIR)
+                except Exception as e:
+                    print(f"[search] reloading local BM25 failed ({e!r}); keeping the loaded index")
+                keywords_stamp = stamp
+        finally:
+            keywords_lock.release()
+    return keywords
+
 async def get_query_vector(q: str) -> list[float] | None:
+    return await embedder.embed(q)  # None: graceful degrade to BM25-only
+
+async def keyword_leg(query: str, limit: int) -> list[dict] | None:
+    local = await io_pool.run(get_keywords)
+    backend = local if local is not None and (KEYWORD_BACKEND == "local" or client is None) else weaviate_keywords
+    if backend is weaviate_keywords and client is None:
+        return None
+    try:
+        return to_hits(await io_pool.run(backend.search, query, limit), pool="max")
+    except Exception as e:
+        if local is None or backend is local:
+            raise
+        print(f"[search] Weaviate BM25 failed ({e!r}); serving local BM25")
+        return to_hits(await io_pool.run(local.search, query, limit), pool="max")
+
+async def vector_leg(query: str, limit: int) -> list[dict] | None:
+    q_vec = await get_query_vector(query)
+    if q_vec is None:
+        return None
+    return to_hits(await io_pool.run(vectors.search, q_vec, limit))
+
+async def run_leg(name: str, leg, timeout: float, legs: dict) -> list[dict] | None:
+    """Await one leg under its own timeout; a slow or failing leg yields None instead of failing /search."""
+    t0 = time.perf_counter()
     try:
-        async with httpx.AsyncClient(timeout=30) as s:
-            r = await s.post(f"{EMBEDDING_URL}/embed", json={"texts": [q], "normalize": True})
-            r.raise_for_status()
-            data = r.json()
-            vectors = data.get("vectors") or []
-            return vectors[0] if vectors else None
-    except Exception:
-        return None  # graceful degrade to BM25-only
+        hits = await asyncio.wait_for(leg, timeout)
+        status = "ok" if hits is not None else "unavailable"
+    except asyncio.TimeoutError:
+        hits, status = None, "timeout"
+    except Exception as e:
+        print(f"[search] {name} leg failed: {e!r}")
+        hits, status = None, "error"
+    legs[name] = {"status": status, "hits": len(hits or []), "ms": round((time.perf_counter() - t0) * 1000, 1)}
+    return hits
+
+async def _skipped():
+    return None
 
 @app.get("/health")
 def health():
@@ -54,48 +235,145 @@ def health():
 
 @app.get("/")
 def root():
-    return {"service": "search", "status": "ok", "embedding_url": EMBEDDING_URL}
+    return {"service": "search", "status": "ok", "embedding_url": EMBEDDING_URL, "vector_backend": VECTOR_BACKEND,
+            "query_encoder": QUERY_ENCODER}
+
+@app.get("/stats")
+def stats():
+    kw = get_keywords()
+    return {
+        "vectors": vectors.stats(),
+        "keywords": kw.stats() if kw else None,
+        "pools": {"io": io_pool.stats(), "rerank": rerank_pool.stats(),
+                  **({"encode": encode_pool.stats()} if encode_pool else {})},
+        "embedding": embedder.stats(),
+        "reranker": reranker.stats(),
+        "cache": {**result_cache.stats(), "index_version": index_version.current()},
+    }
+
+@app.on_event("startup")
+async def _open_clients():
+    await embedder.start()
+    await rerank_pool.run(reranker.warmup)
+
+@app.on_event("shutdown")
+async def _close_clients():
+    await embedder.close()
+    io_pool.shutdown()
+    rerank_pool.shutdown()
+    if encode_pool:
+        encode_pool.shutdown()
+
+async def server_hybrid(query: str, keyword_query: str, alpha: float, limit: int) -> tuple[list[dict], float]:
+    """SEARCH_FUSION=weaviate: one hybrid query in Weaviate, then a vector-only query if it came back empty."""
+    q_vec = await get_query_vector(query)
+    hits = await io_pool.run(_server_hybrid, keyword_query, q_vec, alpha, limit)
+    return hits, (alpha if q_vec is not None else 0.0)
+
+def _server_hybrid(keyword_query: str, q_vec: list[float] | None, alpha: float, limit: int) -> list[dict]:
+    hits = []
+    weaviate_ok = True
+    keyword_only = q_vec is None or alpha <= 0
+    local = get_keywords()  # reloaded here if the ETL rebuilt it since the last query
+    if keyword_only and KEYWORD_BACKEND == "local" and local is not None:
+        hits = to_hits(local.search(keyword_query, limit), pool="max")  # no Weaviate round trip
+    elif VECTOR_BACKEND == "weaviate":
+        try:
+            q = client.query.get(CLASS, RETURN_PROPS)
+            if q_vec is not None:
+                q = q.with_hybrid(query=keyword_query, alpha=alpha, vector=q_vec)
+            else:
+                q = q.with_hybrid(query=keyword_query, alpha=0.0)  # BM25-only fallback
+            if KEYWORD_FIRST_WINDOW:
+                q = q.with_where(FIRST_WINDOW)  # also limits the vector half to first windows
+
+            # IMPORTANT: Request _additional metadata to get original scores
+            q = q.with_additional(["score", "explainScore"])
+
+            res = q.with_limit(limit).do()
+            hits = to_hits(res["data"]["Get"][CLASS])
+        except Exception as e:
+            if local is None:
+                raise
+            print(f"[search] Weaviate query failed ({e!r}); serving local BM25")
+            weaviate_ok = False
+            hits = to_hits(local.search(keyword_query, limit), pool="max")
+    elif keyword_only and local is not None:
+        hits = to_hits(local.search(keyword_query, limit), pool="max")
+
+    # Vector-only search: the fallback if hybrid is empty, the only path with the local backend
+    if not hits and q_vec is not None and (weaviate_ok or VECTOR_BACKEND == "local"):
+        hits = to_hits(vectors.search(q_vec, limit))
+    return hits
+
+def cache_key(kind: str, body: SearchBody) -> tuple:
+    return (kind, normalize_query(body.query), round(body.alpha, 4), body.top_k,
+            body.candidates, body.rerank_depth, body.prune_ratio, body.rerank_margin)
+
+def cacheable(res: dict, body: SearchBody) -> bool:
+    """Only complete answers are cached: no error, no leg dropped, no fallback to a single leg."""
+    if "error" in res or res.get("alpha") != body.alpha:
+        return False
+    return all(leg["status"] == "ok" for leg in res.get("legs", {}).values())
+
+def rerank_text_fn(query: str, lang: str, pali_vocab: frozenset | None = None):
+    """What the cross-encoder reads per hit (None: the full snippet)."""
+    if RERANK_TEXT == "snippet":
+        return None
+    if lang == "en" and RERANK_ASCII_PALI and is_ascii_pali(query, pali_vocab):
+        lang = "pali"
+    terms = query_terms(query) if RERANK_TEXT_WORDS > 0 else None
+    return lambda h: rerank_text(h, lang, terms, RERANK_TEXT_WORDS)
 
 @app.post("/search")
 async def search(body: SearchBody):
+    key, version = cache_key("search", body), index_version.current()
+    cached = result_cache.get(key, version)
+    if cached is not None:
+        return {**cached, "cached": True}
+    res = await _search(body)
+    if cacheable(res, body):
+        result_cache.put(key, version, res)
+    return res
+
+async def _search(body: SearchBody):
     try:
         lang = detect_lang(body.query)
         keyword_query = strip_diacritics(body.query) if lang == "pali" else body.query
 
-        q_vec = await get_query_vector(body.query)
+        limit = max(body.candidates or CANDIDATES, body.top_k)
+        alpha = body.alpha
+        legs = {}
+        if FUSION == "weaviate":
+            hits, alpha = await server_hybrid(body.query, keyword_query, body.alpha, limit)
+        else:
+            # both legs start at once: BM25 runs while the query is being embedded
+            kw_hits, vec_hits = await asyncio.gather(
+                run_leg("keyword", keyword_leg(keyword_query, limit), KEYWORD_TIMEOUT, legs) if alpha < 1 else _skipped(),
+                run_leg("vector", vector_leg(body.query, limit), VECTOR_TIMEOUT, legs) if alpha > 0 else _skipped(),
+            )
+            if vec_hits is None and alpha >= 1:
+                # alpha=1 skipped BM25; with no query vector fail over to it instead of returning nothing
+                kw_hits = await run_leg("keyword", keyword_leg(keyword_query, limit), KEYWORD_TIMEOUT, legs)
+            if vec_hits is None:
+                alpha = 0.0  # keyword only
+            elif kw_hits is None:
+                alpha = 1.0  # vector only
+            hits = fuse(kw_hits, vec_hits, alpha, FUSION, RRF_K)
+
+        pali_vocab = None
+        if RERANK_TEXT != "snippet" and RERANK_ASCII_PALI and lang == "en":
+            local = await io_pool.run(get_keywords)  # its Pāli vocabulary tells ASCII Pāli ("anicca") from English
+            pali_vocab = local.pali_terms if local is not None else None
 
-        q = client.query.get(
-            CLASS, ["doc_id","book_id","para_id","pali_paragraph","translation_paragraph"]
+        # Rerank cascade (one candidate per paragraph after window pooling)
+        reranked_hits, cascade = await rerank_pool.run(
+            rerank_cascade, reranker, body.query, hits, body.top_k,
+            depth=body.rerank_depth or RERANK_DEPTH,
+            prune_ratio=PRUNE_RATIO if body.prune_ratio is None else body.prune_ratio,
+            margin=RERANK_MARGIN if body.rerank_margin is None else body.rerank_margin,
+            tier=RERANK_TIER, text_fn=rerank_text_fn(body.query, lang, pali_vocab),
         )
-        if q_vec is not None:
-            q = q.with_hybrid(query=keyword_query, alpha=body.alpha, vector=q_vec)
-        else:
-            q = q.with_hybrid(query=keyword_query, alpha=0.0)  # BM25-only fallback
-
-        # IMPORTANT: Request _additional metadata to get original scores
-        q = q.with_additional(["score", "explainScore"])
-        
-        res = q.with_limit(max(100, body.top_k)).do()
-        hits = [{"snippet": build_snippet(o), **o} for o in res["data"]["Get"][CLASS]]
-
-        # Preserve original Weaviate scores
-        for hit in hits:
-            additional = hit.pop("_additional", {})
-            hit["_weaviate_score"] = additional.get("score", 0.0)
-            hit["_explain_score"] = additional.get("explainScore", "")
-
-        # Fallbacks if empty
-        if not hits and q_vec is not None:
-            vec_only = client.query.get(CLASS, ["doc_id","book_id","para_id","pali_paragraph","translation_paragraph"]) \
-                        .with_hybrid(query="", alpha=1.0, vector=q_vec) \
-                        .with_limit(max(100, body.top_k)).do()
-            hits = [{"snippet": build_snippet(o), **o} for o in vec_only["data"]["Get"][CLASS]]
-            for hit in hits:
-                additional = hit.pop("_additional", {})
-                hit["_weaviate_score"] = additional.get("score", 0.0)
-
-        # Rerank using the reranker        
-        reranked_hits = reranker.rerank(body.query, hits, text_key="snippet", top_k=body.top_k)
 
         # Assign final scores with better fallback logic
         for r in reranked_hits:
@@ -115,8 +393,10 @@ async def search(body: SearchBody):
             
             # Clean up explain score if exists
             r.pop("_explain_score", None)
+            r.pop("_rerank_text", None)
 
-        return {"query_lang": lang, "alpha": body.alpha, "results": reranked_hits}
+        return {"query_lang": lang, "alpha": alpha, "legs": legs, "cascade": cascade, "results": reranked_hits,
+                "cached": False}
     
     except Exception as e:
             import traceback
@@ -125,6 +405,10 @@ async def search(body: SearchBody):
  
 @app.post("/answer")
 async def answer(body: SearchBody):
+    key, version = cache_key("answer", body), index_version.current()
+    cached = result_cache.get(key, version)
+    if cached is not None:
+        return cached
     search_res = await search(body)
     contexts = search_res["results"]
     target_lang = search_res["query_lang"]
@@ -135,4 +419,7 @@ async def answer(body: SearchBody):
     else:
         out = make_bilingual_answer(body.query, contexts, target_lang)
 
-    return {"lang": target_lang, "answer": out, "citations": contexts[:min(10, len(contexts))]}
\ No newline at end of file
+    res = {"lang": target_lang, "answer": out, "citations": contexts[:min(10, len(contexts))]}
+    if cacheable(search_res, body):
+        result_cache.put(key, version, res)
+    return res
\ No newline at end of file
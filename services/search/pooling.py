@@ -0,0 +1,36 @@
+# services/search/pooling.py
+
+POOL_MODES = ("max", "sum")
+
+def pool_windows(hits: list[dict], mode: str = "max", score_key: str = "_weaviate_score") -> list[dict]:
+    """
+    Collapse window-level hits (long paragraphs are indexed as several objects sharing
+    a doc_id) into one hit per doc_id, ordered by the pooled score:
+      - max: the best-matching window decides (robust default)
+      - sum: paragraphs matching in several windows are boosted
+    The best window's hit is kept as the representative; `matched_windows` counts the hits.
+    """
+    if mode not in POOL_MODES:
+        raise ValueError(f"Unknown window pooling {mode!r}; expected one of {POOL_MODES}")
+    groups: dict = {}
+    for pos, h in enumerate(hits):
+        key = h.get("doc_id") or f"#{pos}"
+        score = float(h.get(score_key) or 0.0)
+        g = groups.get(key)
+        if g is None:
+            groups[key] = {"hit": h, "best": score, "total": score, "count": 1, "pos": pos}
+            continue
+        g["total"] += score
+        g["count"] += 1
+        if score > g["best"]:
+            g["hit"], g["best"] = h, score
+    pooled = []
+    for g in groups.values():
+        h = dict(g["hit"])
+        h[score_key] = g["best"] if mode == "max" else g["total"]
+        h["matched_windows"] = g["count"]
+        h.pop("window", None)
+        pooled.append((h, g["pos"]))
+    # stable on ties: keep the engine's order (first appearance) for equal pooled scores
+    pooled.sort(key=lambda x: (-x[0][score_key], x[1]))
+    return [h for h, _ in pooled]
@@ -0,0 +1,45 @@
+# services/search/pools.py
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class BoundedPool:
+    """
+    A fixed-size thread pool for blocking work called from async endpoints (sync Weaviate
+    client, numpy index lookups, cross-encoder inference), so the event loop never waits on it.
+    At most `threads` calls run at once; the rest queue here instead of piling onto the loop.
+    """
+
+    def __init__(self, name: str, threads: int):
+        self.name = name
+        self.threads = max(1, threads)
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix=f"search-{name}")
+        self._lock = threading.Lock()
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+
+    def _call(self, fn):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            self.queued += 1
+        call = functools.partial(self._call, functools.partial(fn, *args, **kwargs))
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"threads": self.threads, "running": self.running, "queued": self.queued, "completed": self.completed}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
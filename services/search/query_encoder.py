@@ -0,0 +1,108 @@
+# services/search/query_encoder.py
+import time
+import threading
+from collections import deque
+from .result_cache import TTLCache, normalize_query
+
+QUERY_ENCODERS = ("remote", "local")
+
+def load_labse(model_name: str, backend: str = "torch", threads: int | None = None):
+    """The embedding service's loader (same backends and fp32 parity check), imported only when used."""
+    from services.embedding.backends import load_checked_encoder
+    encoder, _ = load_checked_encoder(model_name, backend, device="cpu", threads=threads)
+    return encoder
+
+class LocalQueryEncoder:
+    """
+    Embeds queries in the search process instead of over HTTP to the embedding service.
+    The model is loaded on first use (from the shared HF cache) with the same name, backend
+    and normalization as the indexer, so query vectors land in the indexed space.
+    If it cannot be loaded, queries go to `fallback` (the remote EmbeddingClient) instead.
+    """
+
+    def __init__(self, model_name: str, pool, backend: str = "torch", threads: int | None = None,
+                 cache_size: int = 4096, fallback=None, loader=load_labse):
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = threads
+        self.pool = pool
+        self.fallback = fallback
+        self.loader = loader
+        self.model = None
+        self.load_error: str | None = None
+        self.load_seconds: float | None = None
+        self._load_lock = threading.Lock()
+        self.cache = TTLCache(cache_size, ttl=86400)  # vectors don't depend on the index version
+        self.latency = deque(maxlen=512)
+        self.calls = self.errors = 0
+
+    def _ensure_model(self):
+        with self._load_lock:
+            if self.model is None and self.load_error is None:
+                t0 = time.perf_counter()
+                try:
+                    self.model = self.loader(self.model_name, self.backend, self.threads)
+                    self.load_seconds = round(time.perf_counter() - t0, 2)
+                    print(f"[query-encoder] {self.model_name} ({self.backend}) loaded in {self.load_seconds}s")
+                except Exception as e:
+                    self.load_error = repr(e)
+                    print(f"[query-encoder] could not load {self.model_name}: {e!r}; using the embedding service")
+        return self.model
+
+    def _encode(self, text: str) -> list[float] | None:
+        model = self._ensure_model()
+        if model is None:
+            return None
+        vec = model.encode([text], normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False)[0]
+        return vec.astype("float32").tolist()
+
+    def warmup(self):
+        """Load the model now rather than on the first query (used by the benchmark)."""
+        self._encode("warmup")
+
+    async def start(self):
+        if self.fallback is not None:
+            await self.fallback.start()
+
+    async def close(self):
+        if self.fallback is not None:
+            await self.fallback.close()
+
+    async def embed(self, text: str) -> list[float] | None:
+        if self.load_error is not None:
+            return await self.fallback.embed(text) if self.fallback is not None else None
+        key = normalize_query(text)
+        vec = self.cache.get(key, 0)
+        if vec is not None:
+            return vec
+        self.calls += 1
+        t0 = time.perf_counter()
+        try:
+            vec = await self.pool.run(self._encode, key)
+        except Exception as e:
+            self.errors += 1
+            print(f"[query-encoder] encode failed: {e!r}")
+            return None
+        finally:
+            self.latency.append(time.perf_counter() - t0)
+        if vec is None:  # the model failed to load on this call
+            return await self.fallback.embed(text) if self.fallback is not None else None
+        self.cache.put(key, 0, vec)
+        return vec
+
+    def stats(self) -> dict:
+        lat = sorted(self.latency)
+        pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 1) if lat else None
+        return {
+            "mode": "local",
+            "model": self.model_name,
+            "backend": self.backend,
+            "loaded": self.model is not None,
+            "load_seconds": self.load_seconds,
+            "load_error": self.load_error,
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+            "cache": self.cache.stats(),
+            "fallback": self.fallback.stats() if self.fallback is not None else None,
+        }
@@ -0,0 +1,37 @@
+# services/search/rerank_text.py
+from services.common.text import fold_tokens
+
+RERANK_TEXT_MODES = ("snippet", "lang")
+
+# too common to steer the window (query terms are folded: lowercase, no diacritics)
+_STOPWORDS = frozenset(
+    "the and for are was were what which who whom whose that this these those with from into onto "
+    "then than there their them they have has had not but how why when where does did can could "
+    "would should will shall about its his her him she you your our".split()
+)
+
+def query_terms(query: str) -> set[str]:
+    return {t for t in fold_tokens(query) if len(t) > 2 and t not in _STOPWORDS}
+
+def best_window(text: str, terms: set[str], max_words: int) -> str:
+    """The `max_words`-word span of `text` containing the most query terms (the first one on ties)."""
+    words = text.split()
+    if max_words <= 0 or len(words) <= max_words:
+        return text
+    hits = [1 if terms and any(t in terms for t in fold_tokens(w)) else 0 for w in words]
+    best_start, best, cur = 0, sum(hits[:max_words]), sum(hits[:max_words])
+    for start in range(1, len(words) - max_words + 1):
+        cur += hits[start + max_words - 1] - hits[start - 1]
+        if cur > best:
+            best_start, best = start, cur
+    return " ".join(words[best_start:best_start + max_words])
+
+def rerank_text(hit: dict, lang: str, terms: set[str] | None = None, max_words: int = 0) -> str:
+    """
+    Cross-encoder input for one hit: the side of the paragraph in the query's language
+    (Pāli for Pāli queries, the translation otherwise; the other side if that one is empty),
+    cut to the `max_words` window around the query terms when `max_words` > 0.
+    """
+    sides = ("pali_paragraph", "translation_paragraph") if lang == "pali" else ("translation_paragraph", "pali_paragraph")
+    text = next((hit[s] for s in sides if hit.get(s)), "") or hit.get("snippet", "")
+    return best_window(text, terms or set(), max_words)
@@ -1,24 +1,232 @@
+import os
+import re
+import time
+import threading
+import numpy as np
+from services.common.batcher import MicroBatcher
+from .result_cache import TTLCache, normalize_query
+
 try:
-    from FlagEmbedding import FlagReranker
     import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
     USE_RERANKER = True
 except Exception:
-    FlagReranker = None
+    torch = None
     USE_RERANKER = False
 
+# SEARCH_RERANK_BACKEND values:
+#   torch      PyTorch fp32 on CPU (reference)
+#   fp16       PyTorch half precision on GPU (the old FlagReranker(use_fp16=True); fp32 if there is no GPU)
+#   int8       PyTorch with dynamic int8 quantization of the Linear layers (CPU)
+#   onnx       exported ONNX graph run by ONNX Runtime (CPU)
+#   onnx-int8  the same graph with ONNX Runtime dynamic int8 weights
+RERANK_BACKENDS = ("torch", "fp16", "int8", "onnx", "onnx-int8")
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name)
+
+def export_onnx(model, tokenizer, out_dir: str, quantize: bool = False) -> str:
+    """
+    Export the cross-encoder to `out_dir/model.onnx` (written to a tmp dir, then renamed).
+    Weights go to external data files: the fp32 graph of a large reranker exceeds protobuf's 2 GB.
+    """
+    tmp = out_dir + ".tmp"
+    os.makedirs(tmp, exist_ok=True)
+    enc = tokenizer([["export query", "export passage"]], padding=True, return_tensors="pt")
+    fp32_path = os.path.join(tmp, "fp32.onnx" if quantize else "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model.cpu().float().eval(), (enc["input_ids"], enc["attention_mask"]), fp32_path,
+            input_names=["input_ids", "attention_mask"], output_names=["logits"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "seq"}, "attention_mask": {0: "batch", 1: "seq"},
+                          "logits": {0: "batch"}},
+            opset_version=14,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(tmp, "model.onnx"), weight_type=QuantType.QInt8,
+                         use_external_data_format=True)
+    os.replace(tmp, out_dir)
+    return os.path.join(out_dir, "model.onnx")
+
+class OnnxCrossEncoder:
+    """ONNX Runtime stand-in for the torch model's forward pass: token ids in, relevance logits out."""
+
+    def __init__(self, path: str, threads: int = 0):
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+
+    def logits(self, enc) -> np.ndarray:
+        feeds = {k: enc[k].astype(np.int64) for k in ("input_ids", "attention_mask")}
+        return self.session.run(None, feeds)[0].reshape(-1)
+
 class Reranker:
-    def __init__(self, model_name="BAAI/bge-reranker-v2-m3"):
+    """
+    Cross-encoder reranker (bge-reranker-v2-m3) with a selectable CPU/GPU backend.
+    Pairs are sorted by length and scored in batches of at most `batch_size` pairs and (if set)
+    `token_budget` padded tokens, each pair truncated to `max_length` tokens; `threads` caps
+    intra-op threads (torch or ONNX Runtime).
+    With `batch_wait_ms` > 0, concurrent requests are merged: one inference thread collects up to
+    `max_batch_requests` requests arriving within that window and scores all their pairs together.
+    With a `memo` TTLCache, scores are remembered per (normalized query, doc_id, model id) and
+    tagged with `version_fn()` (the index version), so only unseen pairs reach the model.
+    Without torch/transformers installed, `rerank` keeps the first-stage order.
+    """
+
+    def __init__(self, model_name="BAAI/bge-reranker-v2-m3", backend: str = "torch", batch_size: int = 16,
+                 max_length: int = 512, threads: int = 0, onnx_dir: str = "data/cache/onnx",
+                 token_budget: int = 0, batch_wait_ms: float = 0.0, max_batch_requests: int = 16,
+                 memo: TTLCache | None = None, version_fn=lambda: 0):
+        if backend not in RERANK_BACKENDS:
+            raise ValueError(f"Unknown SEARCH_RERANK_BACKEND {backend!r}; expected one of {RERANK_BACKENDS}")
         print(f"🔍 USE_RERANKER is set to: {USE_RERANKER}")
-        if USE_RERANKER:
-            self.model = FlagReranker(model_name, use_fp16=True)
+        self.model_name = model_name
+        self.backend = backend
+        self.model_id = f"{model_name}@{backend}"
+        self.memo = memo
+        self.version_fn = version_fn
+        self.batch_size = max(1, batch_size)
+        self.max_length = max_length
+        self.threads = threads
+        self.token_budget = token_budget
+        self.batcher = MicroBatcher(self._score_requests, max_batch=max_batch_requests, max_wait_ms=batch_wait_ms,
+                                    name="search-rerank-batcher") if batch_wait_ms > 0 else None
+        self.model = None
+        self.onnx = None
+        self._lock = threading.Lock()
+        self.pairs = self.batches = 0
+        self.seconds = 0.0
+        self.warmup_seconds = None
+        if not USE_RERANKER:
+            return
+        if threads:
+            torch.set_num_threads(threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        self.device = "cpu"
+        if backend == "fp16" and torch.cuda.is_available():
+            self.device = "cuda"
+            model = model.half().to(self.device)
+        elif backend == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif backend in ("onnx", "onnx-int8"):
+            out_dir = os.path.join(onnx_dir, _slug(model_name), backend)
+            path = os.path.join(out_dir, "model.onnx")
+            if not os.path.exists(path):
+                print(f"[reranker] exporting {model_name} to {path} ...")
+                export_onnx(model, self.tokenizer, out_dir, quantize=(backend == "onnx-int8"))
+            self.onnx = OnnxCrossEncoder(path, threads)
+            model = None
+        self.model = model
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None or self.onnx is not None
+
+    def _logits(self, pairs: list[list[str]]) -> np.ndarray:
+        if self.onnx is not None:
+            enc = self.tokenizer(pairs, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+            return self.onnx.logits(enc)
+        enc = self.tokenizer(pairs, padding=True, truncation=True, max_length=self.max_length, return_tensors="pt")
+        with torch.inference_mode():
+            out = self.model(**{k: v.to(self.device) for k, v in enc.items()}).logits
+        return out.view(-1).float().cpu().numpy()
+
+    def _plan(self, pairs: list[list[str]]) -> list[np.ndarray]:
+        """Longest first, so similar lengths share a batch (less padding); cut by batch_size and token_budget."""
+        if self.token_budget > 0:
+            ids = self.tokenizer(pairs, truncation=True, max_length=self.max_length)["input_ids"]
+            lengths = np.array([len(i) for i in ids])
         else:
-            self.model = None
+            lengths = np.array([len(q) + len(t) for q, t in pairs])  # only the order matters here
+        batches, cur = [], []
+        for i in np.argsort(-lengths, kind="stable"):
+            if cur and (len(cur) >= self.batch_size or
+                        (self.token_budget > 0 and (len(cur) + 1) * lengths[cur[0]] > self.token_budget)):
+                batches.append(np.array(cur))
+                cur = []
+            cur.append(i)
+        if cur:
+            batches.append(np.array(cur))
+        return batches
+
+    def _score_pairs(self, pairs: list[list[str]]) -> np.ndarray:
+        t0 = time.perf_counter()
+        out = np.empty(len(pairs), dtype=np.float32)
+        batches = self._plan(pairs) if pairs else []
+        for idx in batches:
+            out[idx] = self._logits([pairs[i] for i in idx])
+        with self._lock:
+            self.batches += len(batches)
+            self.pairs += len(pairs)
+            self.seconds += time.perf_counter() - t0
+        return out
+
+    def _score_requests(self, requests: list[tuple[str, list[str]]]) -> list[np.ndarray]:
+        """Batcher callback: all pairs of the merged requests in one pass, logits split back per request."""
+        logits = self._score_pairs([[q, t] for q, texts in requests for t in texts])
+        bounds = np.cumsum([0] + [len(texts) for _, texts in requests])
+        return [logits[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def score(self, query: str, texts: list[str], normalize: bool = True) -> np.ndarray:
+        """Relevance of each text to `query` (sigmoid of the logit with `normalize`), in input order."""
+        if self.batcher is not None:
+            out = self.batcher.submit((query, list(texts))).result()
+        else:
+            out = self._score_pairs([[query, t] for t in texts])
+        return 1.0 / (1.0 + np.exp(-out)) if normalize else out
+
+    def warmup(self):
+        """One full-length batch, so the first request doesn't pay for lazy init and allocator growth."""
+        if not self.loaded:
+            return
+        t0 = time.perf_counter()
+        self._logits([["warmup", "warmup " * self.max_length]] * min(self.batch_size, 4))
+        self.warmup_seconds = round(time.perf_counter() - t0, 2)
+        print(f"[reranker] {self.backend} warmup {self.warmup_seconds}s")
+
+    def memo_score(self, query: str, candidates: list[dict], text_key="snippet") -> np.ndarray:
+        """`score` for candidates, served from the memo where (query, doc_id) was scored under this index version."""
+        texts = [c.get(text_key, "") for c in candidates]
+        if self.memo is None:
+            return self.score(query, texts)
+        version, q = self.version_fn(), normalize_query(query)
+        keys = [(q, c.get("doc_id"), self.model_id) for c in candidates]
+        scores = np.empty(len(candidates), dtype=np.float32)
+        unseen = []
+        for i, key in enumerate(keys):
+            s = self.memo.get(key, version) if key[1] is not None else None
+            if s is None:
+                unseen.append(i)
+            else:
+                scores[i] = s
+        if unseen:
+            fresh = self.score(query, [texts[i] for i in unseen])
+            scores[unseen] = fresh
+            for i, s in zip(unseen, fresh):
+                if keys[i][1] is not None:
+                    self.memo.put(keys[i], version, float(s))
+        return scores
 
     def rerank(self, query: str, candidates: list[dict], text_key="snippet", top_k=10) -> list[dict]:
-        if not USE_RERANKER or not candidates:  # fallback: naive score
+        if not self.loaded or not candidates:  # fallback: naive score
             return candidates[:top_k]
-        pairs = [(query, c.get(text_key,"")) for c in candidates]
-        scores = self.model.compute_score(pairs, normalize=True)
+        scores = self.memo_score(query, candidates, text_key)
         for c, s in zip(candidates, scores):
             c["_rerank_score"] = float(s)
-        return sorted(candidates, key=lambda x: x.get("_rerank_score", 0.0), reverse=True)[:top_k]
\ No newline at end of file
+        return sorted(candidates, key=lambda x: x.get("_rerank_score", 0.0), reverse=True)[:top_k]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "model": self.model_name, "backend": self.backend, "loaded": self.loaded,
+                "batch_size": self.batch_size, "max_length": self.max_length, "token_budget": self.token_budget,
+                "threads": self.threads, "warmup_seconds": self.warmup_seconds, "pairs": self.pairs,
+                "batches": self.batches, "pairs_per_sec": round(self.pairs / self.seconds, 1) if self.seconds else None,
+                "request_batcher": self.batcher.stats() if self.batcher is not None else None,
+                "score_memo": self.memo.stats() if self.memo is not None else None,
+            }
@@ -0,0 +1,90 @@
+# services/search/result_cache.py
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from services.common.index_version import read_index_version
+
+class TTLCache:
+    """
+    Size-bounded LRU with a per-entry TTL. Every entry is tagged with the index version it
+    was computed against; a lookup under another version is a miss (and drops the entry).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.stale = 0
+
+    def get(self, key, version):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, tag, expires = item
+            if tag != version or self.clock() >= expires:
+                del self._data[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, version, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, version, self.clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data), "max_entries": self.max_entries, "ttl_sec": self.ttl,
+            "hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions, "stale": self.stale,
+        }
+
+class IndexVersion:
+    """The indexer's version file, re-read at most once per `poll` seconds (a stat otherwise)."""
+
+    def __init__(self, path: str, poll: float = 1.0, clock=time.monotonic):
+        self.path = path
+        self.poll = poll
+        self.clock = clock
+        self._checked = -float("inf")
+        self._mtime = None
+        self.version = 0
+
+    def current(self) -> int:
+        now = self.clock()
+        if now - self._checked >= self.poll:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime != self._mtime:
+                self._mtime = mtime
+                self.version = read_index_version(self.path)
+        return self.version
+
+def normalize_query(q: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", q)).strip()
@@ -8,7 +8,32 @@ from services.search.main import (
     app,
     build_snippet,
     get_query_vector,
+    keyword_leg,
 )
+from services.search.pooling import pool_windows
+from services.search.fusion import fuse
+from services.search.pools import BoundedPool
+from services.search.embedding_client import CircuitBreaker, EmbeddingClient
+from services.search.result_cache import IndexVersion, TTLCache, normalize_query
+from services.search.query_encoder import LocalQueryEncoder
+from services.search.cascade import rerank_cascade
+from services.search.reranker import Reranker
+from services.search.rerank_text import best_window, query_terms, rerank_text
+from services.search.language import detect_lang, is_ascii_pali
+from services.common.index_version import bump_index_version
+from services.search.local_index import ShardVectors, ExactIndex, IvfIndex, build_index
+from services.search.vector_backend import LocalVectorBackend, VectorBackend, WeaviateBackend, make_vector_backend
+from services.search.keyword_index import KeywordIndex
+from services.search.keyword_backend import FIRST_WINDOW, KeywordBackend, LocalKeywordBackend, WeaviateKeywordBackend
+from services.ingestion.bm25_index import build_bm25_index
+from services.common.text import fold_tokens
+
+
+@pytest.fixture(autouse=True)
+def fresh_result_cache():
+    """Tests post identical queries against different mocks; never serve one test's result to another."""
+    with patch("services.search.main.result_cache", TTLCache(1024, 300)):
+        yield
 
 
 @pytest.fixture
@@ -160,6 +185,985 @@ class TestGetQueryVector:
             assert result is None
 
 
+class TestWindowPooling:
+    """Tests for pooling window hits back to their paragraph"""
+
+    @staticmethod
+    def _hits():
+        return [
+            {"doc_id": "doc_1", "window": 2, "_weaviate_score": 0.6},
+            {"doc_id": "doc_2", "window": 0, "_weaviate_score": 0.5},
+            {"doc_id": "doc_1", "window": 0, "_weaviate_score": 0.3},
+            {"doc_id": "doc_2", "window": 1, "_weaviate_score": 0.4},
+            {"doc_id": "doc_3", "window": 0, "_weaviate_score": "0.2"},
+        ]
+
+    def test_max_pooling_keeps_best_window(self):
+        """Test that max pooling yields one hit per doc_id scored by its best window"""
+        pooled = pool_windows(self._hits(), "max")
+        assert [h["doc_id"] for h in pooled] == ["doc_1", "doc_2", "doc_3"]
+        assert [h["_weaviate_score"] for h in pooled] == [0.6, 0.5, 0.2]
+        assert pooled[0]["matched_windows"] == 2
+        assert "window" not in pooled[0]
+
+    def test_sum_pooling_boosts_multi_window_matches(self):
+        """Test that sum pooling adds window scores per doc_id"""
+        pooled = pool_windows(self._hits(), "sum")
+        assert [h["doc_id"] for h in pooled] == ["doc_2", "doc_1", "doc_3"]
+        assert pooled[0]["_weaviate_score"] == pytest.approx(0.9)
+
+    def test_unknown_mode_rejected(self):
+        """Test that an unknown pooling mode raises"""
+        with pytest.raises(ValueError):
+            pool_windows([], "mean")
+
+    @patch("services.search.main.FUSION", "weaviate")
+    @patch("services.search.main.client")
+    @patch("services.search.main.get_query_vector")
+    @patch("services.search.main.reranker")
+    def test_search_returns_one_result_per_paragraph(self, mock_reranker, mock_get_vector, mock_weaviate, client):
+        """Test that /search pools window hits before reranking"""
+        mock_get_vector.return_value = [0.1] * 768
+        objs = [
+            {"doc_id": "doc_1", "pali_paragraph": "a", "window": 1, "_additional": {"score": "0.9"}},
+            {"doc_id": "doc_1", "pali_paragraph": "a", "window": 0, "_additional": {"score": "0.7"}},
+            {"doc_id": "doc_2", "pali_paragraph": "b", "window": 0, "_additional": {"score": "0.5"}},
+        ]
+        mock_query = MagicMock()
+        for m in ("with_hybrid", "with_where", "with_additional", "with_limit"):
+            getattr(mock_query, m).return_value = mock_query
+        mock_query.do.return_value = {"data": {"Get": {"Paragraph": objs}}}
+        mock_weaviate.query.get.return_value = mock_query
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+
+        data = client.post("/search", json={"query": "test", "top_k": 5}).json()
+
+        assert [r["doc_id"] for r in data["results"]] == ["doc_1", "doc_2"]
+        assert data["results"][0]["score"] == pytest.approx(0.9)
+        assert len(mock_reranker.rerank.call_args.args[1]) == 2
+
+    def test_weaviate_bm25_only_sees_first_windows(self):
+        """Test that Weaviate BM25 filters to window 0 so repeated paragraph text is scored once"""
+        mock_query = MagicMock()
+        for m in ("with_bm25", "with_where", "with_additional", "with_limit"):
+            getattr(mock_query, m).return_value = mock_query
+        mock_query.do.return_value = {"data": {"Get": {"Paragraph": []}}}
+        weaviate = MagicMock()
+        weaviate.query.get.return_value = mock_query
+
+        WeaviateKeywordBackend(lambda: weaviate, "Paragraph", ["doc_id"], where=FIRST_WINDOW).search("dukkha", 5)
+
+        mock_query.with_where.assert_called_once_with({"path": ["window"], "operator": "Equal", "valueInt": 0})
+
+    @pytest.mark.asyncio
+    @patch("services.search.main.WINDOW_POOL", "sum")
+    @patch("services.search.main.KEYWORD_BACKEND", "weaviate")
+    @patch("services.search.main.get_keywords", return_value=None)
+    @patch("services.search.main.client", MagicMock())
+    @patch("services.search.main.weaviate_keywords")
+    async def test_keyword_leg_never_sums_windows(self, mock_backend, _):
+        """Test that sum pooling applies to vector hits only, never to BM25 scores"""
+        mock_backend.search.return_value = [
+            {"doc_id": "doc_1", "window": 0, "_additional": {"score": 2.0}},
+            {"doc_id": "doc_1", "window": 1, "_additional": {"score": 2.0}},
+        ]
+
+        hits = await keyword_leg("dukkha", 5)
+
+        assert len(hits) == 1
+        assert hits[0]["_weaviate_score"] == pytest.approx(2.0)
+
+
+class TestVectorBackend:
+    """Tests for the Weaviate and in-process vector backends"""
+
+    PROPS = ["doc_id", "book_id", "para_id", "pali_paragraph", "translation_paragraph"]
+
+    @pytest.fixture
+    def shard_dir(self, tmp_path):
+        """Two float16 shards of random unit vectors; doc_7 has a second window"""
+        import numpy as np
+        import pandas as pd
+        from services.common.shards import ShardSet
+
+        rng = np.random.default_rng(1)
+        vecs = rng.normal(size=(40, 16)).astype(np.float32)
+        vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+        rows = [{"doc_id": f"doc_{i}", "window": 0, "book_id": "b", "para_id": str(i),
+                 "pali_paragraph": f"pali {i}", "translation_paragraph": None} for i in range(39)]
+        rows.append({**rows[7], "window": 1})
+        shards = ShardSet.create(str(tmp_path), {"dim": 16, "dtype": "float16", "model_id": "m"})
+        shards.write_shard(0, vecs[:25], pd.DataFrame(rows[:25]))
+        shards.write_shard(1, vecs[25:], pd.DataFrame(rows[25:]))
+        return str(tmp_path), vecs
+
+    def test_exact_index_matches_brute_force(self, shard_dir):
+        """Test that exact search across shards returns the true nearest neighbours"""
+        import numpy as np
+        path, vecs = shard_dir
+        index = ExactIndex(ShardVectors(path))
+        q = vecs[30]
+        scores, ids = index.search(q, 5)
+        expected = np.argsort(-(vecs.astype(np.float16).astype(np.float32) @ q))[:5]
+        assert ids.tolist() == expected.tolist()
+        assert scores[0] == pytest.approx(1.0, abs=1e-3)
+
+    def test_ivf_full_probe_equals_exact(self, shard_dir):
+        """Test that IVF probing every list gives the exact result, and is cached on disk"""
+        import os
+        path, vecs = shard_dir
+        vectors = ShardVectors(path)
+        ivf = IvfIndex(vectors, nlist=4, nprobe=4)
+        exact = ExactIndex(vectors)
+        for q in vecs[:5]:
+            assert ivf.search(q, 3)[1].tolist() == exact.search(q, 3)[1].tolist()
+        assert os.path.exists(os.path.join(path, "ivf-4.npz"))
+        again = IvfIndex(vectors, nlist=4, nprobe=1)
+        assert (again.order == ivf.order).all()
+        assert len(again.search(vecs[0], 3)[1]) > 0
+
+    def test_ivf_nlist_clamped_to_corpus_size(self, shard_dir):
+        """Test that asking for more lists than vectors trains one list per vector instead of failing"""
+        path, vecs = shard_dir
+        ivf = IvfIndex(ShardVectors(path), nlist=1024, nprobe=1024, cache=False)
+        assert ivf.nlist == len(vecs)
+        assert ivf.search(vecs[3], 1)[1].tolist() == [3]
+
+    def test_auto_and_unknown_index_kinds(self, shard_dir):
+        """Test that auto picks exact for small corpora and unknown kinds are rejected"""
+        path, _ = shard_dir
+        vectors = ShardVectors(path)
+        assert build_index(vectors, "auto").kind == "exact"
+        assert build_index(vectors, "auto", exact_max=10, nlist=2).kind in ("ivf", "hnsw")
+        with pytest.raises(ValueError):
+            build_index(vectors, "flat")
+
+    def test_local_backend_returns_weaviate_shaped_objects(self, shard_dir):
+        """Test that local hits carry properties, window and _additional.score"""
+        path, vecs = shard_dir
+        backend = LocalVectorBackend(path, self.PROPS, kind="exact")
+        objs = backend.search((vecs[39] * 3).tolist(), 2)  # query need not be normalized
+        assert objs[0]["doc_id"] == "doc_7" and objs[0]["window"] == 1
+        assert objs[0]["translation_paragraph"] is None
+        assert objs[0]["_additional"]["score"] == pytest.approx(1.0, abs=1e-3)
+        assert backend.stats()["vectors"] == 40
+
+    def test_missing_shards_raise(self, tmp_path):
+        """Test that the local backend refuses to start without shards"""
+        with pytest.raises(FileNotFoundError):
+            make_vector_backend("local", None, "Paragraph", self.PROPS, path=str(tmp_path))
+        with pytest.raises(ValueError):
+            make_vector_backend("faiss", None, "Paragraph", self.PROPS)
+
+    def test_backend_without_search_fails_at_construction(self):
+        """Test that a vector backend missing `search` cannot be instantiated"""
+        class Incomplete(VectorBackend):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_weaviate_backend_runs_pure_vector_query(self):
+        """Test that the Weaviate backend sends a nearVector query and scores hits by similarity"""
+        mock_client = MagicMock()
+        mock_query = MagicMock()
+        for m in ("with_near_vector", "with_additional", "with_limit"):
+            getattr(mock_query, m).return_value = mock_query
+        mock_query.do.return_value = {"data": {"Get": {"Paragraph": [
+            {"doc_id": "doc_1", "_additional": {"distance": 0.25}}]}}}
+        mock_client.query.get.return_value = mock_query
+        backend = WeaviateBackend(lambda: mock_client, "Paragraph", self.PROPS)
+        objs = backend.search([0.1] * 4, 10)
+        assert objs[0]["_additional"]["score"] == pytest.approx(0.75)
+        mock_query.with_near_vector.assert_called_once_with({"vector": [0.1] * 4})
+        mock_query.with_additional.assert_called_once_with(["distance"])
+        mock_query.with_limit.assert_called_once_with(10)
+
+    @patch("services.search.main.VECTOR_BACKEND", "local")
+    @patch("services.search.main.client", None)
+    @patch("services.search.main.get_query_vector")
+    @patch("services.search.main.reranker")
+    def test_search_with_local_backend_skips_weaviate(self, mock_reranker, mock_get_vector, client, shard_dir):
+        """Test that /search runs on the local index without a Weaviate client"""
+        path, vecs = shard_dir
+        mock_get_vector.return_value = vecs[39].tolist()
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+        with patch("services.search.main.vectors", LocalVectorBackend(path, self.PROPS, kind="exact")):
+            data = client.post("/search", json={"query": "test", "top_k": 3}).json()
+
+        assert data["results"][0]["doc_id"] == "doc_7"
+        assert data["results"][0]["matched_windows"] == 2
+        assert len({r["doc_id"] for r in data["results"]}) == 3
+        assert data["legs"]["keyword"]["status"] == "unavailable"
+        assert data["alpha"] == 1.0
+
+
+class TestKeywordIndex:
+    """Tests for the local diacritic-folded BM25 index"""
+
+    @pytest.fixture
+    def bm25_dir(self, tmp_path):
+        import pandas as pd
+        df = pd.DataFrame({
+            "doc_id": ["doc_1", "doc_2", "doc_3"],
+            "book_id": ["b1", "b1", "b2"],
+            "para_id": ["p1", "p2", "p3"],
+            "pali_paragraph": ["Sabbadānaṃ dhammadānaṃ jināti", "Sabbe dhammā anattā", "Appamādo amatapadaṃ"],
+            "translation_paragraph": ["The gift of Dhamma surpasses all gifts", "All things are not-self", None],
+        })
+        build_bm25_index(df, str(tmp_path / "normalized.bm25"))
+        return str(tmp_path / "normalized.bm25")
+
+    def test_pali_vocabulary(self, bm25_dir):
+        """Test that the index keeps the folded Pāli-side words apart from the translation's"""
+        terms = KeywordIndex(bm25_dir).pali_terms
+        assert {"dhammadanam", "anatta", "appamado"} <= terms
+        assert "gift" not in terms
+
+    def test_fold_tokens(self):
+        """Test that tokens are lowercased and stripped of diacritics"""
+        assert fold_tokens("Sabbe Dhammā, anattā!") == ["sabbe", "dhamma", "anatta"]
+        assert fold_tokens(None) == []
+
+    def test_folded_query_matches_diacritic_text(self, bm25_dir):
+        """Test that a plain-ASCII query finds Pāli text with diacritics"""
+        index = KeywordIndex(bm25_dir)
+        scores, ids = index.search("dhamma anatta", 10)
+        assert index.objects(ids)[0]["doc_id"] == "doc_2"
+        assert scores[0] > 0
+        assert len(index.search("nibbana", 10)[1]) == 0
+
+    def test_top_k_matches_exhaustive_bm25(self, tmp_path):
+        """Test that block-max pruning returns the exhaustive BM25 top-k"""
+        import numpy as np
+        import pandas as pd
+        rng = np.random.default_rng(0)
+        words = [f"w{i}" for i in range(300)]
+        weights = 1 / np.arange(1, 301)
+        weights /= weights.sum()
+        texts = [" ".join(rng.choice(words, size=rng.integers(5, 40), p=weights)) for _ in range(1500)]
+        build_bm25_index(pd.DataFrame({"doc_id": range(1500), "pali_paragraph": texts}), str(tmp_path / "i"))
+        index = KeywordIndex(str(tmp_path / "i"))
+        for _ in range(30):
+            query = " ".join(rng.choice(words[:120], size=rng.integers(1, 6)))
+            dense = np.zeros(len(index), dtype=np.float32)
+            for t in set(fold_tokens(query)):
+                i = index.terms[t]
+                lo, hi = index.offsets[i], index.offsets[i + 1]
+                dense[index.postings[lo:hi]] += index.impacts[lo:hi]
+            for k in (1, 10):
+                scores, _ = index.search(query, k)
+                assert scores == pytest.approx(np.sort(dense)[::-1][:k], abs=1e-4)
+
+    def test_local_index_reloaded_after_etl_rebuild(self, bm25_dir):
+        """Test that get_keywords picks up an index the ETL rebuilt in place"""
+        import pandas as pd
+        from services.search import main
+        with patch.object(main, "LOCAL_KEYWORD_DIR", bm25_dir), patch.object(main, "keywords", None), \
+                patch.object(main, "keywords_stamp", None):
+            first = main.get_keywords()
+            assert main.get_keywords() is first
+            assert first.search("nibbana", 10) == []
+            build_bm25_index(pd.DataFrame({"doc_id": ["doc_9"], "pali_paragraph": ["Nibbāna paramaṃ sukhaṃ"]}),
+                             bm25_dir)
+            second = main.get_keywords()
+            assert second is not first
+            assert [o["doc_id"] for o in second.search("nibbana", 10)] == ["doc_9"]
+
+    def test_backend_without_search_fails_at_construction(self):
+        """Test that a keyword backend missing `search` cannot be instantiated"""
+        class Incomplete(KeywordBackend):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_reload_in_progress_serves_current_index(self, bm25_dir):
+        """Test that get_keywords does not wait while another thread reloads the index"""
+        from services.search import main
+        current = object()
+        with patch.object(main, "LOCAL_KEYWORD_DIR", bm25_dir), patch.object(main, "keywords", current), \
+                patch.object(main, "keywords_stamp", None):
+            with main.keywords_lock:  # another thread is mid-reload
+                assert main.get_keywords() is current
+            assert main.keywords_stamp is None
+            assert main.get_keywords() is not current
+
+    @pytest.mark.asyncio
+    @patch("services.search.main.KEYWORD_BACKEND", "local")
+    async def test_keyword_leg_checks_index_off_the_event_loop(self):
+        """Test that the stat/reload in get_keywords runs on an io_pool thread"""
+        import threading
+        seen = []
+        local = MagicMock()
+        local.search.return_value = []
+
+        def fake_get_keywords():
+            seen.append(threading.current_thread())
+            return local
+
+        with patch("services.search.main.get_keywords", side_effect=fake_get_keywords):
+            await keyword_leg("dukkha", 5)
+
+        assert seen and threading.main_thread() not in seen
+
+    @pytest.mark.parametrize("fusion", ["relative", "weaviate"])
+    @patch("services.search.main.KEYWORD_BACKEND", "local")
+    @patch("services.search.main.client")
+    @patch("services.search.main.get_query_vector")
+    @patch("services.search.main.reranker")
+    def test_bm25_only_search_sees_rebuilt_index(self, mock_reranker, mock_get_vector, mock_weaviate,
+                                                 fusion, client, bm25_dir):
+        """Test that α=0 queries served from the local index see an ETL rebuild"""
+        import pandas as pd
+        mock_get_vector.return_value = None
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+        with patch("services.search.main.FUSION", fusion), patch("services.search.main.LOCAL_KEYWORD_DIR", bm25_dir), \
+                patch("services.search.main.keywords", None), patch("services.search.main.keywords_stamp", None):
+            before = client.post("/search", json={"query": "nibbana", "alpha": 0.0}).json()
+            build_bm25_index(pd.DataFrame({"doc_id": ["doc_9"], "pali_paragraph": ["Nibbāna paramaṃ sukhaṃ"]}),
+                             bm25_dir)
+            after = client.post("/search", json={"query": "nibbana", "alpha": 0.0, "top_k": 5}).json()
+
+        assert before["results"] == []
+        assert [r["doc_id"] for r in after["results"]] == ["doc_9"]
+        mock_weaviate.query.get.assert_not_called()
+
+    def test_missing_index_raises(self, tmp_path):
+        """Test that loading a missing index raises"""
+        with pytest.raises(FileNotFoundError):
+            KeywordIndex(str(tmp_path))
+
+    @patch("services.search.main.KEYWORD_BACKEND", "local")
+    @patch("services.search.main.client")
+    @patch("services.search.main.get_query_vector")
+    @patch("services.search.main.reranker")
+    def test_keyword_only_search_stays_local(self, mock_reranker, mock_get_vector, mock_weaviate, client, bm25_dir):
+        """Test that BM25-only queries use the local index instead of Weaviate"""
+        mock_get_vector.return_value = None
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+        with patch("services.search.main.keywords", LocalKeywordBackend(bm25_dir)):
+            data = client.post("/search", json={"query": "Sabbe dhammā", "top_k": 3}).json()
+
+        assert data["results"][0]["doc_id"] == "doc_2"
+        assert data["results"][0]["score_type"] == "hybrid"
+        mock_weaviate.query.get.assert_not_called()
+
+    @patch("services.search.main.client")
+    @patch("services.search.main.get_query_vector")
+    @patch("services.search.main.reranker")
+    def test_weaviate_down_falls_back_to_local_bm25(self, mock_reranker, mock_get_vector, mock_weaviate,
+                                                    client, bm25_dir):
+        """Test that a failing Weaviate query is answered from the local BM25 index"""
+        mock_get_vector.return_value = [0.1] * 768
+        mock_weaviate.query.get.side_effect = ConnectionError("weaviate down")
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+        with patch("services.search.main.keywords", LocalKeywordBackend(bm25_dir)):
+            data = client.post("/search", json={"query": "gift of dhamma", "top_k": 3}).json()
+
+        assert data["results"][0]["doc_id"] == "doc_1"
+        assert data["legs"]["keyword"]["status"] == "ok"
+        assert data["legs"]["vector"]["status"] == "error"
+        assert data["alpha"] == 0.0
+
+
+class TestFusion:
+    """Tests for client-side hybrid fusion and the concurrent search legs"""
+
+    KW = [{"doc_id": "a", "_weaviate_score": 8.0}, {"doc_id": "b", "_weaviate_score": 4.0},
+          {"doc_id": "c", "_weaviate_score": 2.0}]
+    VEC = [{"doc_id": "c", "_weaviate_score": 0.9, "matched_windows": 2}, {"doc_id": "d", "_weaviate_score": 0.5}]
+
+    def test_relative_score_fusion(self):
+        """Test that each leg is min-max normalized and weighted by alpha"""
+        fused = fuse(self.KW, self.VEC, alpha=0.5, mode="relative")
+        scores = {h["doc_id"]: h["_weaviate_score"] for h in fused}
+        assert scores == pytest.approx({"a": 0.5, "b": 1 / 6, "c": 0.5, "d": 0.0})
+        assert [h["doc_id"] for h in fused][:2] == ["a", "c"]  # tie keeps keyword order
+        assert fused[1]["matched_windows"] == 2
+
+    def test_rrf_fusion_and_alpha_extremes(self):
+        """Test that RRF rewards docs found by both legs and alpha selects a single leg"""
+        assert fuse(self.KW, self.VEC, alpha=0.5, mode="rrf")[0]["doc_id"] == "c"
+        assert [h["doc_id"] for h in fuse(self.KW, self.VEC, 0.0, "rrf")][:3] == ["a", "b", "c"]
+        assert fuse(self.KW, self.VEC, 1.0, "relative")[0]["doc_id"] == "c"
+        assert fuse(None, None, 0.5) == []
+        with pytest.raises(ValueError):
+            fuse(self.KW, self.VEC, 0.5, mode="dbsf")
+
+    @pytest.mark.parametrize("mode", ["relative", "rrf"])
+    def test_hits_without_doc_id_are_kept_apart(self, mode):
+        """Test that hits lacking a doc_id are fused as separate docs instead of raising"""
+        kw = self.KW + [{"pali_paragraph": "kw orphan", "_weaviate_score": 1.0}]
+        vec = [{"pali_paragraph": "vec orphan", "_weaviate_score": 0.9}] + self.VEC
+        fused = fuse(kw, vec, alpha=0.5, mode=mode)
+        assert len(fused) == 6
+        assert {h.get("pali_paragraph") for h in fused if "doc_id" not in h} == {"kw orphan", "vec orphan"}
+
+    @patch("services.search.main.FUSION", "relative")
+    @patch("services.search.main.vector_leg", new_callable=AsyncMock)
+    @patch("services.search.main.keyword_leg", new_callable=AsyncMock)
+    @patch("services.search.main.reranker")
+    def test_vector_only_query_fails_over_to_bm25(self, mock_reranker, mock_keyword_leg, mock_vector_leg, client):
+        """Test that alpha=1 falls back to the keyword leg when no query vector is available"""
+        mock_vector_leg.return_value = None
+        mock_keyword_leg.return_value = [dict(h) for h in self.KW]
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+        data = client.post("/search", json={"query": "test", "top_k": 5, "alpha": 1.0}).json()
+        assert [r["doc_id"] for r in data["results"]] == ["a", "b", "c"]
+        assert data["alpha"] == 0.0
+        assert data["legs"]["vector"]["status"] == "unavailable"
+        assert data["legs"]["keyword"]["status"] == "ok"
+
+    def test_relative_fusion_keeps_weaviate_vector_ranking(self):
+        """Test that raw Weaviate vector objects keep their ranking through to_hits and fusion"""
+        from services.search.main import to_hits
+
+        class FakeQuery:
+            def __getattr__(self, name):
+                return lambda *a, **kw: self
+            def do(self):
+                objs = [{"doc_id": d, "_additional": {"distance": dist}} for d, dist in (("z", 0.1), ("b", 0.2), ("y", 0.3))]
+                return {"data": {"Get": {"Paragraph": objs}}}
+
+        fake_client = MagicMock()
+        fake_client.query.get.return_value = FakeQuery()
+        vec_hits = to_hits(WeaviateBackend(lambda: fake_client, "Paragraph", ["doc_id"]).search([0.1] * 4, 3))
+        kw_hits = [{"doc_id": "a", "_weaviate_score": 5.0}, {"doc_id": "b", "_weaviate_score": 1.0}]
+        fused = fuse(kw_hits, vec_hits, alpha=0.5, mode="relative")
+        assert [h["doc_id"] for h in fused] == ["a", "z", "b", "y"]
+        assert [h["_weaviate_score"] for h in fused] == pytest.approx([0.5, 0.5, 0.25, 0.0])
+
+    @patch("services.search.main.KEYWORD_TIMEOUT", 0.05)
+    @patch("services.search.main.vector_leg")
+    @patch("services.search.main.keyword_leg")
+    @patch("services.search.main.reranker")
+    def test_slow_leg_times_out_without_blocking(self, mock_reranker, mock_keyword_leg, mock_vector_leg, client):
+        """Test that a leg exceeding its timeout is dropped and the other leg is served"""
+        async def slow(*args):
+            await asyncio.sleep(1)
+            return [dict(h) for h in self.KW]
+
+        async def fast(*args):
+            return [dict(h) for h in self.VEC]
+
+        mock_keyword_leg.side_effect = slow
+        mock_vector_leg.side_effect = fast
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+
+        data = client.post("/search", json={"query": "test", "top_k": 5}).json()
+
+        assert data["legs"]["keyword"]["status"] == "timeout"
+        assert data["legs"]["vector"]["status"] == "ok"
+        assert data["alpha"] == 1.0
+        assert [r["doc_id"] for r in data["results"]] == ["c", "d"]
+
+    @patch("services.search.main.vector_leg")
+    @patch("services.search.main.keyword_leg")
+    @patch("services.search.main.reranker")
+    def test_legs_run_concurrently(self, mock_reranker, mock_keyword_leg, mock_vector_leg, client):
+        """Test that the keyword and vector legs overlap in time"""
+        import time
+
+        async def kw(*args):
+            await asyncio.sleep(0.3)
+            return [dict(h) for h in self.KW]
+
+        async def vec(*args):
+            await asyncio.sleep(0.3)
+            return [dict(h) for h in self.VEC]
+
+        mock_keyword_leg.side_effect = kw
+        mock_vector_leg.side_effect = vec
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+
+        t0 = time.perf_counter()
+        data = client.post("/search", json={"query": "test", "top_k": 5, "alpha": 0.5}).json()
+        assert time.perf_counter() - t0 < 0.55
+        assert {r["doc_id"] for r in data["results"]} == {"a", "b", "c", "d"}
+
+    @patch("services.search.main.get_query_vector")
+    @patch("services.search.main.keyword_leg")
+    @patch("services.search.main.reranker")
+    def test_alpha_zero_skips_embedding(self, mock_reranker, mock_keyword_leg, mock_get_vector, client):
+        """Test that a BM25-only request does not embed the query"""
+        async def kw(*args):
+            return [dict(h) for h in self.KW]
+
+        mock_keyword_leg.side_effect = kw
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+        data = client.post("/search", json={"query": "test", "top_k": 5, "alpha": 0.0}).json()
+        assert [r["doc_id"] for r in data["results"]] == ["a", "b", "c"]
+        assert "vector" not in data["legs"]
+        mock_get_vector.assert_not_called()
+
+
+class TestNonBlockingSearch:
+    """Tests for the bounded pools that keep blocking work off the event loop"""
+
+    @pytest.mark.asyncio
+    async def test_pool_bounds_concurrency(self):
+        """Test that no more than `threads` calls run at once"""
+        import threading
+        import time
+        pool = BoundedPool("test", 2)
+        lock, active, peak = threading.Lock(), [0], [0]
+
+        def work():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+
+        await asyncio.gather(*[pool.run(work) for _ in range(6)])
+        assert peak[0] == 2
+        assert pool.stats() == {"threads": 2, "running": 0, "queued": 0, "completed": 6}
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    @patch("services.search.main.vector_leg")
+    @patch("services.search.main.keyword_leg")
+    @patch("services.search.main.reranker")
+    async def test_slow_rerank_does_not_stall_other_requests(self, mock_reranker, mock_keyword_leg, mock_vector_leg):
+        """Test that /health answers while a search is busy reranking"""
+        import threading
+        import time
+        rerank_threads = []
+
+        async def kw(*args):
+            return [{"doc_id": "a", "_weaviate_score": 1.0}]
+
+        def slow_rerank(query, hits, text_key, top_k):
+            rerank_threads.append(threading.current_thread().name)
+            time.sleep(0.5)
+            return hits[:top_k]
+
+        mock_keyword_leg.side_effect = kw
+        mock_vector_leg.side_effect = kw
+        mock_reranker.rerank.side_effect = slow_rerank
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            search_task = asyncio.create_task(ac.post("/search", json={"query": "test", "top_k": 1}))
+            await asyncio.sleep(0.1)
+            t0 = time.perf_counter()
+            health = await ac.get("/health")
+            assert time.perf_counter() - t0 < 0.2
+            assert health.json() == {"status": "ok"}
+            assert not search_task.done()
+            assert (await search_task).json()["results"][0]["doc_id"] == "a"
+        assert rerank_threads[0].startswith("search-rerank")
+
+
+class TestEmbeddingClient:
+    """Tests for the pooled embedding client and its circuit breaker"""
+
+    def test_breaker_opens_then_probes_after_cooldown(self):
+        """Test closed -> open -> half-open (one probe) -> closed"""
+        now = [0.0]
+        breaker = CircuitBreaker(failures=2, cooldown=10, clock=lambda: now[0])
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+        now[0] = 10.0
+        assert breaker.allow()        # the probe
+        assert not breaker.allow()    # everyone else still skips
+        breaker.record_success()
+        assert breaker.state == "closed" and breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        """Test that a failing half-open probe re-opens the breaker immediately"""
+        now = [0.0]
+        breaker = CircuitBreaker(failures=1, cooldown=5, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 6.0
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open" and breaker.opens == 2
+        assert breaker.stats()["retry_in_sec"] == 5.0
+
+    @pytest.mark.asyncio
+    async def test_pooled_client_and_breaker_skip(self):
+        """Test that calls share one HTTP client and are skipped while the breaker is open"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) <= 2:
+                return httpx.Response(200, json={"vectors": [[0.5, 0.5]]})
+            return httpx.Response(503)
+
+        embedder = EmbeddingClient("http://embedding:8082", breaker=CircuitBreaker(failures=2, cooldown=60))
+        embedder._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        http = embedder.http()
+
+        assert await embedder.embed("a") == [0.5, 0.5]
+        assert await embedder.embed("b") == [0.5, 0.5]
+        assert embedder.http() is http
+        assert await embedder.embed("c") is None
+        assert await embedder.embed("d") is None
+        assert await embedder.embed("e") is None  # breaker open: no request sent
+        assert len(calls) == 4
+
+        stats = embedder.stats()
+        assert stats["breaker"]["state"] == "open"
+        assert (stats["calls"], stats["errors"], stats["skipped"]) == (4, 2, 1)
+        assert stats["latency_ms"]["p50"] is not None
+        await embedder.close()
+
+
+class TestResultCache:
+    """Versioned query-result cache: TTL, LRU, index-version invalidation, and /search wiring."""
+
+    def test_ttl_lru_and_version(self):
+        now = [0.0]
+        cache = TTLCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        cache.put("a", 1, "A")
+        cache.put("b", 1, "B")
+        assert cache.get("a", 1) == "A"
+        cache.put("c", 1, "C")  # evicts b, the least recently used
+        assert cache.get("b", 1) is None and cache.stats()["evictions"] == 1
+        assert cache.get("a", 2) is None  # index moved on
+        now[0] = 11
+        assert cache.get("c", 1) is None  # expired
+        assert len(cache) == 0
+
+    def test_index_version_follows_file(self, tmp_path):
+        path = str(tmp_path / "index_version.json")
+        version = IndexVersion(path, poll=0)
+        assert version.current() == 0
+        v1 = bump_index_version(path, source="test")
+        assert version.current() == v1
+        assert bump_index_version(path, source="test") > v1
+        assert version.current() > v1
+
+    def test_normalize_query(self):
+        assert normalize_query("  dhamma\t\n dāna ") == "dhamma dāna"
+        assert normalize_query("da\u0304na") == "dāna"
+
+    @pytest.fixture
+    def legs(self, tmp_path):
+        kw = [{"doc_id": "d1", "book_id": "b", "para_id": "p1", "pali_paragraph": "dhamma",
+               "translation_paragraph": "teaching", "_weaviate_score": 2.0}]
+        vec = [{**kw[0], "_weaviate_score": 0.9}]
+        version = IndexVersion(str(tmp_path / "index_version.json"), poll=0)
+        with patch("services.search.main.FUSION", "relative"), \
+             patch("services.search.main.index_version", version), \
+             patch("services.search.main.get_query_vector", AsyncMock(return_value=[0.1] * 4)), \
+             patch("services.search.main.keyword_leg", AsyncMock(return_value=kw)) as kw_leg, \
+             patch("services.search.main.vector_leg", AsyncMock(return_value=vec)) as vec_leg, \
+             patch("services.search.main.reranker") as reranker:
+            reranker.rerank.side_effect = lambda q, hits, top_k, **kw: hits[:top_k]
+            yield kw_leg, vec_leg, reranker, version
+
+    def test_repeat_query_is_served_from_cache(self, client, legs):
+        kw_leg, vec_leg, reranker, _ = legs
+        first = client.post("/search", json={"query": "dhamma", "top_k": 5}).json()
+        second = client.post("/search", json={"query": "  dhamma ", "top_k": 5}).json()
+        assert first["cached"] is False and second["cached"] is True
+        assert second["results"] == first["results"]
+        assert kw_leg.call_count == vec_leg.call_count == reranker.rerank.call_count == 1
+        client.post("/search", json={"query": "dhamma", "top_k": 3})  # different key
+        assert reranker.rerank.call_count == 2
+
+    def test_index_version_bump_invalidates(self, client, legs):
+        _, _, reranker, version = legs
+        client.post("/search", json={"query": "dhamma", "top_k": 5})
+        bump_index_version(version.path, source="test")
+        assert client.post("/search", json={"query": "dhamma", "top_k": 5}).json()["cached"] is False
+        assert reranker.rerank.call_count == 2
+
+    def test_degraded_results_are_not_cached(self, client, legs):
+        _, vec_leg, reranker, _ = legs
+        vec_leg.side_effect = RuntimeError("vector index down")
+        for _ in range(2):
+            res = client.post("/search", json={"query": "dhamma", "top_k": 5}).json()
+            assert res["cached"] is False and res["legs"]["vector"]["status"] == "error"
+        assert reranker.rerank.call_count == 2
+
+
+class TestLocalQueryEncoder:
+    """In-process query encoding: lazy load, normalized vectors, vector cache, remote fallback."""
+
+    class FakeModel:
+        def __init__(self):
+            self.calls = []
+
+        def encode(self, texts, normalize_embeddings=False, **kw):
+            import numpy as np
+            self.calls.append((list(texts), normalize_embeddings))
+            return np.array([[3.0, 4.0]] * len(texts), dtype=np.float32) / 5.0
+
+    @pytest.mark.asyncio
+    async def test_loads_on_first_query_and_caches_vectors(self):
+        model, loads = self.FakeModel(), []
+        def loader(name, backend, threads):
+            loads.append((name, backend))
+            return model
+        pool = BoundedPool("encode", 1)
+        encoder = LocalQueryEncoder("labse", pool, backend="int8", loader=loader)
+        assert loads == [] and encoder.stats()["loaded"] is False
+        assert await encoder.embed("dhamma  dāna") == pytest.approx([0.6, 0.8])
+        assert await encoder.embed(" dhamma dāna") == pytest.approx([0.6, 0.8])
+        assert loads == [("labse", "int8")]
+        assert model.calls == [(["dhamma dāna"], True)]
+        stats = encoder.stats()
+        assert stats["loaded"] and stats["calls"] == 1 and stats["cache"]["hits"] == 1
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_remote_when_model_cannot_load(self):
+        def loader(name, backend, threads):
+            raise ImportError("No module named 'sentence_transformers'")
+        remote = Mock(embed=AsyncMock(return_value=[0.1, 0.2]))
+        pool = BoundedPool("encode", 1)
+        encoder = LocalQueryEncoder("labse", pool, loader=loader, fallback=remote)
+        assert await encoder.embed("a") == [0.1, 0.2]
+        assert await encoder.embed("b") == [0.1, 0.2]
+        assert remote.embed.await_count == 2
+        assert "sentence_transformers" in encoder.stats()["load_error"]
+        pool.shutdown()
+
+
+class TestRerankCascade:
+    """Tiered rerank: dedup, first-stage pruning, depth cut, early exit on a decisive margin."""
+
+    class FakeReranker:
+        def __init__(self, scores):
+            self.scores = scores
+            self.batches = []
+
+        def rerank(self, query, candidates, text_key="snippet", top_k=10):
+            self.batches.append([c["doc_id"] for c in candidates])
+            for c in candidates:
+                c["_rerank_score"] = self.scores[c["doc_id"]]
+            return sorted(candidates, key=lambda c: c["_rerank_score"], reverse=True)[:top_k]
+
+    @staticmethod
+    def hits(n):
+        return [{"doc_id": f"d{i}", "snippet": f"text {i}", "_weaviate_score": 1.0 - i / n} for i in range(n)]
+
+    def test_dedup_prune_and_depth(self):
+        hits = self.hits(10)
+        hits.insert(1, {**hits[0], "doc_id": "dup", "snippet": " text  0"})
+        reranker = self.FakeReranker({f"d{i}": i / 10 for i in range(10)})
+        results, stages = rerank_cascade(reranker, "q", hits, top_k=2, depth=4, prune_ratio=0.35)
+        assert stages == {"dedup": {"in": 11, "dropped": 1}, "prune": {"in": 10, "dropped": 3},
+                          "depth": {"in": 7, "dropped": 3}, "rerank": {"in": 4, "dropped": 0}}
+        assert reranker.batches == [["d0", "d1", "d2", "d3"]]
+        assert [r["doc_id"] for r in results] == ["d3", "d2"]
+
+    def test_early_exit_on_decisive_margin(self):
+        scores = {f"d{i}": 0.1 for i in range(30)}
+        scores.update(d0=0.9, d1=0.8)
+        reranker = self.FakeReranker(scores)
+        results, stages = rerank_cascade(reranker, "q", self.hits(30), top_k=2, depth=30, margin=0.5, tier=10)
+        assert [r["doc_id"] for r in results] == ["d0", "d1"]
+        assert len(reranker.batches) == 1 and stages["rerank"] == {"in": 30, "dropped": 20}
+
+        reranker = self.FakeReranker({f"d{i}": 0.5 for i in range(30)})  # never decisive: every tier is scored
+        _, stages = rerank_cascade(reranker, "q", self.hits(30), top_k=2, depth=30, margin=0.5, tier=10)
+        assert len(reranker.batches) == 3 and stages["rerank"]["dropped"] == 0
+
+    def test_no_cross_encoder_keeps_first_stage_order(self):
+        class Passthrough:
+            def rerank(self, query, candidates, text_key="snippet", top_k=10):
+                return candidates[:top_k]
+        results, _ = rerank_cascade(Passthrough(), "q", self.hits(30), top_k=3, depth=30, margin=0.1)
+        assert [r["doc_id"] for r in results] == ["d0", "d1", "d2"]
+
+    @patch("services.search.main.FUSION", "relative")
+    @patch("services.search.main.vector_leg", new_callable=AsyncMock)
+    @patch("services.search.main.keyword_leg", new_callable=AsyncMock)
+    @patch("services.search.main.reranker")
+    def test_per_request_depth(self, mock_reranker, mock_keyword_leg, mock_vector_leg, client):
+        mock_keyword_leg.return_value = self.hits(40)
+        mock_vector_leg.return_value = self.hits(40)
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+        data = client.post("/search", json={"query": "q", "top_k": 3, "rerank_depth": 8, "candidates": 40}).json()
+        assert mock_keyword_leg.call_args.args[1] == 40
+        assert len(mock_reranker.rerank.call_args.args[1]) == 8
+        assert data["cascade"]["depth"] == {"in": 40, "dropped": 32}
+        assert len(data["results"]) == 3
+
+    @patch("services.search.main.FUSION", "relative")
+    @patch("services.search.main.vector_leg", new_callable=AsyncMock)
+    @patch("services.search.main.keyword_leg", new_callable=AsyncMock)
+    @patch("services.search.main.reranker")
+    def test_default_depth_reranks_every_candidate(self, mock_reranker, mock_keyword_leg, mock_vector_leg, client):
+        from services.search.main import CANDIDATES, RERANK_DEPTH
+        assert RERANK_DEPTH == CANDIDATES
+        mock_keyword_leg.return_value = self.hits(CANDIDATES)
+        mock_vector_leg.return_value = self.hits(CANDIDATES)
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+        data = client.post("/search", json={"query": "q", "top_k": 3}).json()
+        assert len(mock_reranker.rerank.call_args.args[1]) == CANDIDATES
+        assert data["cascade"]["depth"]["dropped"] == 0
+
+
+class TestRerankText:
+    """Cross-encoder input: the query-language side, optionally a window around the query terms."""
+
+    HIT = {"pali_paragraph": "Sabbadānaṃ dhammadānaṃ jināti", "translation_paragraph": "The gift of Dhamma surpasses all gifts",
+           "snippet": "Sabbadānaṃ dhammadānaṃ jināti \n The gift of Dhamma surpasses all gifts"}
+
+    def test_picks_the_query_language_side(self):
+        assert rerank_text(self.HIT, "pali") == "Sabbadānaṃ dhammadānaṃ jināti"
+        assert rerank_text(self.HIT, "en") == "The gift of Dhamma surpasses all gifts"
+        assert rerank_text(self.HIT, "ru") == "The gift of Dhamma surpasses all gifts"
+        assert rerank_text({**self.HIT, "translation_paragraph": None}, "en") == "Sabbadānaṃ dhammadānaṃ jināti"
+
+    def test_window_around_query_terms(self):
+        text = " ".join(f"w{i}" for i in range(50)) + " Nibbāna is peace " + " ".join(f"x{i}" for i in range(50))
+        terms = query_terms("What is nibbana?")
+        assert terms == {"nibbana"}
+        window = best_window(text, terms, 5)
+        assert "Nibbāna" in window and len(window.split()) == 5
+        assert best_window(text, set(), 3) == "w0 w1 w2"
+        assert best_window("short text", terms, 5) == "short text"
+
+    def test_ascii_pali_queries_detected(self):
+        assert is_ascii_pali("anicca")
+        assert is_ascii_pali("Sabbe dhamma anatta")
+        assert not is_ascii_pali("gift of dhamma")
+        assert not is_ascii_pali("what is nibbana?")
+        vocab = frozenset({"sabbadanam", "dhammadanam", "jinati", "so", "na", "ca", "te"})
+        assert is_ascii_pali("dhammadanam jinati", vocab)
+        assert not is_ascii_pali("anicca", vocab)  # the index's vocabulary replaces the built-in list
+        assert not is_ascii_pali("so na ca te", vocab)  # short words shared with English decide nothing
+        assert not is_ascii_pali("so te jinati na ca", vocab)
+        assert detect_lang("anicca") == "en"  # query_lang, the keyword query and /answer stay diacritics-based
+
+    @pytest.mark.parametrize("ascii_pali, side", [(True, "pali_paragraph"), (False, "translation_paragraph")])
+    @patch("services.search.main.FUSION", "relative")
+    @patch("services.search.main.RERANK_TEXT", "lang")
+    @patch("services.search.main.get_keywords", return_value=None)
+    @patch("services.search.main.vector_leg", new_callable=AsyncMock)
+    @patch("services.search.main.keyword_leg", new_callable=AsyncMock)
+    @patch("services.search.main.reranker")
+    def test_ascii_pali_query_reads_pali_side(self, mock_reranker, mock_keyword_leg, mock_vector_leg, _, client,
+                                              ascii_pali, side):
+        hit = {**self.HIT, "doc_id": "d1", "_weaviate_score": 1.0}
+        mock_keyword_leg.return_value = [dict(hit)]
+        mock_vector_leg.return_value = [dict(hit)]
+        seen = []
+        def rerank(query, hits, text_key, top_k):
+            seen.extend(h[text_key] for h in hits)
+            return hits[:top_k]
+        mock_reranker.rerank.side_effect = rerank
+        with patch("services.search.main.RERANK_ASCII_PALI", ascii_pali):
+            data = client.post("/search", json={"query": "anicca", "top_k": 5}).json()
+        assert seen == [self.HIT[side]]
+        assert data["query_lang"] == "en"
+        assert mock_keyword_leg.call_args.args[0] == "anicca"
+
+    @patch("services.search.main.FUSION", "relative")
+    @patch("services.search.main.vector_leg", new_callable=AsyncMock)
+    @patch("services.search.main.keyword_leg", new_callable=AsyncMock)
+    @patch("services.search.main.reranker")
+    def test_search_reranks_full_snippet_by_default(self, mock_reranker, mock_keyword_leg, mock_vector_leg, client):
+        hit = {**self.HIT, "doc_id": "d1", "_weaviate_score": 1.0}
+        mock_keyword_leg.return_value = [dict(hit)]
+        mock_vector_leg.return_value = [dict(hit)]
+        mock_reranker.rerank.side_effect = lambda query, hits, text_key, top_k: hits[:top_k]
+        client.post("/search", json={"query": "anicca", "top_k": 5})
+        assert mock_reranker.rerank.call_args.kwargs["text_key"] == "snippet"
+
+    @patch("services.search.main.FUSION", "relative")
+    @patch("services.search.main.RERANK_TEXT", "lang")
+    @patch("services.search.main.RERANK_TEXT_WORDS", 3)
+    @patch("services.search.main.vector_leg", new_callable=AsyncMock)
+    @patch("services.search.main.keyword_leg", new_callable=AsyncMock)
+    @patch("services.search.main.reranker")
+    def test_search_reranks_on_trimmed_text(self, mock_reranker, mock_keyword_leg, mock_vector_leg, client):
+        hit = {**self.HIT, "doc_id": "d1", "_weaviate_score": 1.0}
+        mock_keyword_leg.return_value = [dict(hit)]
+        mock_vector_leg.return_value = [dict(hit)]
+        seen = []
+        def rerank(query, hits, text_key, top_k):
+            seen.extend(h[text_key] for h in hits)
+            return hits[:top_k]
+        mock_reranker.rerank.side_effect = rerank
+        data = client.post("/search", json={"query": "gift of dhamma", "top_k": 5}).json()
+        assert seen == ["gift of Dhamma"]
+        assert data["results"][0]["snippet"] == self.HIT["snippet"] and "_rerank_text" not in data["results"][0]
+
+
+class TestRerankerEngine:
+    """Batched cross-encoder scoring: length-sorted batches, scores back in input order."""
+
+    @pytest.fixture
+    def engine(self):
+        import numpy as np
+        with patch("services.search.reranker.USE_RERANKER", False):
+            rr = Reranker(batch_size=2, max_length=8)
+        batches = []
+
+        def tokenizer(pairs, max_length=None, return_tensors=None, **kw):
+            if return_tensors is None:  # length planning: one token per character
+                return {"input_ids": [[0] * min(len(q) + len(t), max_length) for q, t in pairs]}
+            batches.append([t for _, t in pairs])
+            ids = np.array([[min(len(t), max_length)] for _, t in pairs])
+            return {"input_ids": ids, "attention_mask": np.ones_like(ids)}
+
+        rr.tokenizer = tokenizer
+        rr.onnx = Mock(logits=lambda enc: enc["input_ids"].reshape(-1).astype(np.float32))
+        return rr, batches
+
+    def test_scores_in_input_order(self, engine):
+        rr, batches = engine
+        assert rr.score("q", ["aaa", "a", "aa"], normalize=False).tolist() == [3.0, 1.0, 2.0]
+        assert batches == [["aaa", "aa"], ["a"]]
+        assert rr.stats()["pairs"] == 3 and rr.stats()["batches"] == 2
+        assert rr.score("q", ["x" * 20], normalize=False).tolist() == [8.0]  # truncated to max_length
+
+    def test_rerank_sorts_by_normalized_score(self, engine):
+        rr, _ = engine
+        out = rr.rerank("q", [{"snippet": "a"}, {"snippet": "aaa"}, {"snippet": "aa"}], top_k=2)
+        assert [c["snippet"] for c in out] == ["aaa", "aa"]
+        assert 0.5 < out[1]["_rerank_score"] < out[0]["_rerank_score"] < 1.0
+
+    def test_token_budget_caps_padded_batch(self, engine):
+        rr, batches = engine
+        rr.batch_size, rr.token_budget = 8, 7
+        rr.score("q", ["aaa", "a", "aa", "a"], normalize=False)  # planned lengths 4, 2, 3, 2
+        assert batches == [["aaa"], ["aa", "a"], ["a"]]
+
+    def test_concurrent_requests_share_forward_passes(self, engine):
+        from concurrent.futures import ThreadPoolExecutor
+        from services.common.batcher import MicroBatcher
+        rr, batches = engine
+        rr.batch_size = 64
+        rr.batcher = MicroBatcher(rr._score_requests, max_batch=8, max_wait_ms=200, name="test-rerank-batcher")
+        texts = [["a" * (i + 1), "b" * (i + 2)] for i in range(4)]
+        with ThreadPoolExecutor(4) as ex:
+            results = list(ex.map(lambda t: rr.score("q", t, normalize=False).tolist(), texts))
+        assert results == [[float(i + 1), float(i + 2)] for i in range(4)]
+        assert len(batches) == 1 and len(batches[0]) == 8
+        assert rr.stats()["request_batcher"]["items"] == 4
+
+    def test_score_memo_only_runs_unseen_pairs(self, engine):
+        rr, batches = engine
+        version = [1]
+        rr.memo, rr.version_fn, rr.batch_size = TTLCache(100, 60), lambda: version[0], 8
+        docs = [{"doc_id": f"d{i}", "snippet": "a" * (i + 1)} for i in range(4)]
+        first = rr.rerank("dhamma", [dict(d) for d in docs[:3]], top_k=3)
+        again = rr.rerank(" dhamma ", [dict(d) for d in docs], top_k=4)  # same normalized query, one new doc
+        assert batches == [["aaa", "aa", "a"], ["aaaa"]]
+        assert [c["_rerank_score"] for c in again[1:]] == [c["_rerank_score"] for c in first]
+        assert rr.stats()["score_memo"]["hits"] == 3
+        rr.rerank("other query", [dict(docs[0])], top_k=1)
+        version[0] = 2  # re-indexed: every score is stale
+        rr.rerank("dhamma", [dict(docs[0])], top_k=1)
+        assert batches[2:] == [["a"], ["a"]]
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            Reranker(backend="tpu")
+
+
 class TestHealthEndpoint:
     """Tests for /health endpoint"""
 
@@ -200,6 +1204,8 @@ class TestSearchEndpoint:
         
         mock_query = MagicMock()
         mock_query.with_hybrid.return_value = mock_query
+        mock_query.with_near_vector.return_value = mock_query
+        mock_query.with_additional.return_value = mock_query
         mock_query.with_limit.return_value = mock_query
         mock_query.do.return_value = sample_weaviate_results
         
@@ -237,6 +1243,8 @@ class TestSearchEndpoint:
         
         mock_query = MagicMock()
         mock_query.with_hybrid.return_value = mock_query
+        mock_query.with_near_vector.return_value = mock_query
+        mock_query.with_additional.return_value = mock_query
         mock_query.with_limit.return_value = mock_query
         mock_query.do.return_value = sample_weaviate_results
         
@@ -286,6 +1294,8 @@ class TestSearchEndpoint:
         
         mock_query = MagicMock()
         mock_query.with_hybrid.return_value = mock_query
+        mock_query.with_near_vector.return_value = mock_query
+        mock_query.with_additional.return_value = mock_query
         mock_query.with_limit.return_value = mock_query
         mock_query.do.return_value = sample_weaviate_results
         
@@ -320,6 +1330,8 @@ class TestSearchEndpoint:
         
         mock_query = MagicMock()
         mock_query.with_hybrid.return_value = mock_query
+        mock_query.with_near_vector.return_value = mock_query
+        mock_query.with_additional.return_value = mock_query
         mock_query.with_limit.return_value = mock_query
         mock_query.do.return_value = sample_weaviate_results
         
@@ -354,6 +1366,8 @@ class TestSearchEndpoint:
         
         mock_query = MagicMock()
         mock_query.with_hybrid.return_value = mock_query
+        mock_query.with_near_vector.return_value = mock_query
+        mock_query.with_additional.return_value = mock_query
         mock_query.with_limit.return_value = mock_query
         mock_query.do.return_value = sample_weaviate_results
         
@@ -405,6 +1419,8 @@ class TestSearchEndpoint:
         
         mock_query = MagicMock()
         mock_query.with_hybrid.return_value = mock_query
+        mock_query.with_near_vector.return_value = mock_query
+        mock_query.with_additional.return_value = mock_query
         mock_query.with_limit.return_value = mock_query
         mock_query.do.side_effect = [empty_result, filled_result]
         
@@ -499,6 +1515,8 @@ class TestIntegration:
         
         mock_query = MagicMock()
         mock_query.with_hybrid.return_value = mock_query
+        mock_query.with_near_vector.return_value = mock_query
+        mock_query.with_additional.return_value = mock_query
         mock_query.with_limit.return_value = mock_query
         mock_query.do.return_value = sample_weaviate_results
         
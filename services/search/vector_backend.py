@@ -0,0 +1,76 @@
+# services/search/vector_backend.py
+from abc import ABC, abstractmethod
+import numpy as np
+
+VECTOR_BACKENDS = ("weaviate", "local")
+
+class VectorBackend(ABC):
+    """
+    Nearest-neighbour search over paragraph vectors. `search` returns objects shaped like
+    Weaviate's Get results (requested properties + `_additional.score`, higher is better),
+    so the rest of /search does not care where they came from.
+    """
+    name = "base"
+
+    @abstractmethod
+    def search(self, vector: list[float], limit: int) -> list[dict]:
+        ...
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+class WeaviateBackend(VectorBackend):
+    """
+    Pure-vector (nearVector) queries against the Paragraph class. The cosine distance Weaviate
+    returns is turned into a similarity score, the same scale the local backend reports.
+    """
+    name = "weaviate"
+
+    def __init__(self, get_client, class_name: str, properties: list[str]):
+        self.get_client = get_client  # resolved per call so the client can be swapped (tests, reconnects)
+        self.class_name = class_name
+        self.properties = properties
+
+    def search(self, vector: list[float], limit: int) -> list[dict]:
+        res = self.get_client().query.get(self.class_name, self.properties) \
+                  .with_near_vector({"vector": vector}) \
+                  .with_additional(["distance"]) \
+                  .with_limit(limit).do()
+        objs = res["data"]["Get"][self.class_name]
+        for o in objs:
+            additional = o.get("_additional") or {}
+            if additional.get("distance") is not None:
+                o["_additional"] = {**additional, "score": 1.0 - float(additional["distance"])}
+        return objs
+
+class LocalVectorBackend(VectorBackend):
+    """In-process index over memory-mapped vector shards (see local_index.py); no Weaviate needed."""
+    name = "local"
+
+    def __init__(self, path: str, properties: list[str], kind: str = "auto", **opts):
+        from .local_index import ShardVectors, build_index
+        self.properties = properties
+        self.vectors = ShardVectors(path, columns=properties + ["window"])
+        self.index = build_index(self.vectors, kind, **opts)
+        print(f"[vector-backend] local {self.index.kind} index over {len(self.vectors)} vectors from {path}")
+
+    def search(self, vector: list[float], limit: int) -> list[dict]:
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        scores, ids = self.index.search(q, limit)
+        objs = self.vectors.objects(ids)
+        for o, s in zip(objs, scores):
+            o["_additional"] = {"score": float(s)}
+        return objs
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "vectors": len(self.vectors), "path": self.vectors.path,
+                "model_id": self.vectors.meta.get("model_id"), **self.index.stats()}
+
+def make_vector_backend(name: str, get_client, class_name: str, properties: list[str],
+                        path: str = "data/out/shards", kind: str = "auto", **opts) -> VectorBackend:
+    if name == "weaviate":
+        return WeaviateBackend(get_client, class_name, properties)
+    if name == "local":
+        return LocalVectorBackend(path, properties, kind, **opts)
+    raise ValueError(f"Unknown vector backend {name!r}; expected one of {VECTOR_BACKENDS}")
@@ -3,6 +3,7 @@ set -euo pipefail
 
 echo "WARNING: This will stop and remove all Docker containers, networks, and volumes for this project."
 echo "It will also delete generated data in data/out/ and the persisted Weaviate volume."
+echo "(To come back without re-embedding: python -m services.embedding.snapshot create, see RUNBOOK section 7.)"
 read -p "Are you sure you want to proceed? (Y/N): " confirm
 
 if [[ "$confirm" != "Y" && "$confirm" != "y" ]]; then